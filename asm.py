@@ -1,105 +1,133 @@
+import argparse
 import sys
-from typing import List
-
-from asm_line import AsmLine, Argument, asm_lines_to_machine_code
-from parser import parse_asm_lines
+from typing import List, Optional, Iterable, Iterator, TextIO, Callable, Tuple
+
+from asm_line import AsmLine, Argument, asm_lines_to_machine_code, iter_machine_code
+from parser import parse_asm_lines, iter_numbered_asm_lines, count_parsed
+from passes import PassManager, Program, ADDRESSES
+from source_map import SourceMapEntry, build_source_map
+from symbol_table import SymbolTable
+from tracing import span, count
 from util import split_list
 
+ASSEMBLER_VERSION = '1'
+OUTPUT_FORMATS = ('hex', 'bin', 'ihex')
+INTEL_HEX_DATA = 0x00
+INTEL_HEX_END = 0x01
+
 
 class AssemblyError(Exception):
     pass
 
 
-def remove_comments(lines: List[str]) -> List[str]:
-    return list(filter(lambda line: not line.startswith('#'), lines))
+def iter_code_lines(lines: Iterable[str]) -> Iterator[Tuple[int, str]]:
+    for line_number, line in enumerate(lines, 1):
+        if line != '' and not line.startswith('#'):
+            yield line_number, line
 
 
-def remove_empty(lines: List[str]) -> List[str]:
-    return list(filter(lambda line: line != '', lines))
+def strip_lines(lines: Iterable[str]) -> Iterator[str]:
+    for line in lines:
+        yield line.strip()
 
 
-def read_file_lines(filepath: str) -> List[str]:
+def iter_file_lines(filepath: str) -> Iterator[str]:
     with open(filepath, 'r') as file:
-        lines = [line.strip() for line in file]
-    return lines
+        yield from strip_lines(file)
 
 
-def write_file(filepath: str, lines: List[str]) -> None:
+def read_file_lines(filepath: str) -> List[str]:
+    return list(iter_file_lines(filepath))
+
+
+def write_lines(file: TextIO, lines: Iterable[str]) -> None:
+    for line in lines:
+        file.write(f"{line}\n")
+
+
+def write_file(filepath: str, lines: Iterable[str]) -> None:
     with open(filepath, 'w') as file:
-        for line in lines:
-            file.write(f"{line}\n")
+        write_lines(file, lines)
+
 
+def fits_four_bits(value: int) -> bool:
+    return 0 <= value <= 0xF
+
+
+def find_references(asm_lines: List[AsmLine]) -> List[int]:
+    result = []
 
-def find_label_index(asm_lines: List[AsmLine], label: str) -> int:
     for i in range(len(asm_lines)):
         asm_line = asm_lines[i]
-        if asm_line.label == label:
-            return i
 
+        if asm_line.is_data or asm_line.argument is None or not asm_line.argument.is_label():
+            continue
 
-def prefix_non_relative_branch(asm_lines: List[AsmLine]) -> List[AsmLine]:
-    result = asm_lines.copy()
+        if asm_line.is_prefix():
+            raise AssemblyError(f'Unsupported PFIX with label argument at line number {i + 1}.')
 
-    i = 0
+        if asm_line.is_non_relative_branch() or asm_line.is_relative_branch():
+            result.append(i)
 
-    while i < len(result):
-        asm_line = result[i]
+    return result
 
-        if asm_line.is_non_relative_branch() and asm_line.argument.is_label():
-            if asm_line.is_prefix():
-                raise AssemblyError(f'Unsupported PFIX with label argument at line number {i + 1}.')
 
-            label_index = find_label_index(result, asm_line.argument.label)
-            if label_index > 0xF:
-                argument = Argument.from_immediate(0)
-                pfix = AsmLine.from_instruction('PFIX', argument)
-                result.insert(i, pfix)
-                i += 1
+def compute_addresses(prefixed: bytearray) -> List[int]:
+    result = []
+    address = 0
 
-        i += 1
+    for is_prefixed in prefixed:
+        result.append(address)
+        address += 1 + is_prefixed
 
     return result
 
 
-def prefix_positive_relative_branch(asm_lines: List[AsmLine]) -> List[AsmLine]:
-    result = asm_lines.copy()
+def relax_prefixes(asm_lines: List[AsmLine], symbol_table: Optional[SymbolTable] = None) -> List[AsmLine]:
+    if symbol_table is None:
+        symbol_table = SymbolTable.from_asm_lines(asm_lines)
 
-    i = len(result) - 1
+    references = find_references(asm_lines)
+    prefixed = bytearray(len(asm_lines))
+    changed = True
 
-    while i >= 0:
-        asm_line = result[i]
+    while changed:
+        changed = False
+        addresses = compute_addresses(prefixed)
 
-        if asm_line.is_relative_branch() and asm_line.argument.is_label():
-            label_index = find_label_index(result, asm_line.argument.label)
-            offset = label_index - i
-            if offset > 16:
-                argument = Argument.from_immediate(0)
-                pfix = AsmLine.from_instruction('PFIX', argument)
-                result.insert(i, pfix)
+        for i in references:
+            if prefixed[i]:
+                continue
 
-        i -= 1
+            asm_line = asm_lines[i]
+            label_address = addresses[symbol_table.index_of(asm_line.argument.label)]
 
-    return result
+            if asm_line.is_relative_branch():
+                value = label_address - (addresses[i] + 1)
+            else:
+                value = label_address + asm_line.argument.offset
 
+            if not fits_four_bits(value):
+                prefixed[i] = 1
+                changed = True
 
-def prefix_negative_relative_branch(asm_lines: List[AsmLine]) -> List[AsmLine]:
-    result = asm_lines.copy()
+    result = []
 
-    i = 0
+    for i in range(len(asm_lines)):
+        asm_line = asm_lines[i]
 
-    while i < len(result):
-        asm_line = result[i]
+        if prefixed[i]:
+            pfix = AsmLine.from_instruction('PFIX', Argument.from_immediate(0))
+            pfix.source_line = asm_line.source_line
+            pfix.synthetic = True
+            pfix.label = asm_line.label
+            asm_line.label = None
+            result.append(pfix)
 
-        if asm_line.is_relative_branch() and asm_line.argument.is_label():
-            label_index = find_label_index(result, asm_line.argument.label)
-            offset = label_index - i
-            if offset < 0:
-                argument = Argument.from_immediate(0)
-                pfix = AsmLine.from_instruction('PFIX', argument)
-                result.insert(i, pfix)
-                i += 1
+        result.append(asm_line)
 
-        i += 1
+    symbol_table.remap(addresses)
+    count('pfix_inserted', len(result) - len(asm_lines))
 
     return result
 
@@ -113,7 +141,7 @@ def low_four_bits(offset: int) -> int:
 
 
 def fill_addresses(asm_lines: List[AsmLine]) -> List[AsmLine]:
-    result = asm_lines.copy()
+    result = asm_lines
 
     for i in range(len(result)):
         asm_line = result[i]
@@ -122,8 +150,11 @@ def fill_addresses(asm_lines: List[AsmLine]) -> List[AsmLine]:
     return result
 
 
-def fill_absolute_immediates(asm_lines: List[AsmLine]) -> List[AsmLine]:
-    result = asm_lines.copy()
+def fill_absolute_immediates(asm_lines: List[AsmLine], symbol_table: Optional[SymbolTable] = None) -> List[AsmLine]:
+    result = asm_lines
+
+    if symbol_table is None:
+        symbol_table = SymbolTable.from_asm_lines(result)
 
     i = 0
 
@@ -131,7 +162,7 @@ def fill_absolute_immediates(asm_lines: List[AsmLine]) -> List[AsmLine]:
         asm_line = result[i]
 
         if asm_line.is_non_relative_branch() and asm_line.argument.is_label():
-            label_index = find_label_index(result, asm_line.argument.label)
+            label_index = symbol_table.index_of(asm_line.argument.label)
             label_address = label_index + asm_line.argument.offset
 
             if label_address > 255:
@@ -143,22 +174,23 @@ def fill_absolute_immediates(asm_lines: List[AsmLine]) -> List[AsmLine]:
                 prefix_line = result[i - 1]
                 if prefix_line.mnemonic != 'PFIX':
                     raise AssemblyError(f'Line {prefix_line} before line {asm_line} with number {asm_line.address + 1} should be PFIX.')
-                prefix_arg = Argument.from_immediate(high_four_bits(label_address))
-                prefix_line.argument = prefix_arg
+                prefix_line.argument.resolve(prefix_arg_immediate)
 
             instruction_arg_immediate = low_four_bits(label_address)
-            instruction_arg = Argument.from_immediate(instruction_arg_immediate)
-            asm_line.argument = instruction_arg
+            asm_line.argument.resolve(instruction_arg_immediate)
 
         i += 1
 
     return result
 
 
-def fill_relative_immediates(asm_lines: List[AsmLine]) -> List[AsmLine]:
+def fill_relative_immediates(asm_lines: List[AsmLine], symbol_table: Optional[SymbolTable] = None) -> List[AsmLine]:
     max_offset = (1 << 7) - 1
     min_offset = -(1 << 7)
-    result = asm_lines.copy()
+    result = asm_lines
+
+    if symbol_table is None:
+        symbol_table = SymbolTable.from_asm_lines(result)
 
     i = 0
 
@@ -166,7 +198,7 @@ def fill_relative_immediates(asm_lines: List[AsmLine]) -> List[AsmLine]:
         asm_line = result[i]
 
         if asm_line.is_relative_branch() and asm_line.argument.is_label():
-            label_index = find_label_index(result, asm_line.argument.label)
+            label_index = symbol_table.index_of(asm_line.argument.label)
             offset = label_index - (i + 1)
 
             if offset < min_offset:
@@ -181,20 +213,21 @@ def fill_relative_immediates(asm_lines: List[AsmLine]) -> List[AsmLine]:
                 prefix_line = result[i - 1]
                 if prefix_line.mnemonic != 'PFIX':
                     raise AssemblyError(f'Line {prefix_line} before line {asm_line} with number {asm_line.address + 1} should be PFIX.')
-                prefix_arg = Argument.from_immediate(high_four_bits(offset))
-                prefix_line.argument = prefix_arg
+                prefix_line.argument.resolve(prefix_arg_immediate)
 
             branch_arg_immediate = low_four_bits(offset)
-            branch_arg = Argument.from_immediate(branch_arg_immediate)
-            asm_line.argument = branch_arg
+            asm_line.argument.resolve(branch_arg_immediate)
 
         i += 1
 
     return result
 
 
-def fill_data_immediates(asm_lines: List[AsmLine]) -> List[AsmLine]:
-    result = asm_lines.copy()
+def fill_data_immediates(asm_lines: List[AsmLine], symbol_table: Optional[SymbolTable] = None) -> List[AsmLine]:
+    result = asm_lines
+
+    if symbol_table is None:
+        symbol_table = SymbolTable.from_asm_lines(result)
 
     i = 0
 
@@ -202,33 +235,95 @@ def fill_data_immediates(asm_lines: List[AsmLine]) -> List[AsmLine]:
         asm_line = result[i]
 
         if asm_line.is_data and asm_line.argument.is_label():
-            label_index = find_label_index(result, asm_line.argument.label)
+            label_index = symbol_table.index_of(asm_line.argument.label)
             label_address = label_index + asm_line.argument.offset
 
             if label_address > 255:
                 raise AssemblyError(f'Error in line {i + 1}: {asm_line}. Only 0-255 addresses are supported in 8-bit BCPU architecture.')
 
-            instruction_arg = Argument.from_immediate(label_address)
-            asm_line.argument = instruction_arg
+            asm_line.argument.resolve(label_address)
 
         i += 1
 
     return result
 
 
-def assemble(asm_code: List[str]) -> List[int]:
-    lines = remove_comments(asm_code)
-    lines = remove_empty(lines)
-    asm_lines = parse_asm_lines(lines)
-    prefixed_asm_lines = prefix_non_relative_branch(asm_lines)
-    prefixed_asm_lines = prefix_negative_relative_branch(prefixed_asm_lines)
-    prefixed_asm_lines = prefix_positive_relative_branch(prefixed_asm_lines)
-    addressed_asm_lines = fill_addresses(prefixed_asm_lines)
-    argumented_asm_lines = fill_absolute_immediates(addressed_asm_lines)
-    argumented_asm_lines = fill_relative_immediates(argumented_asm_lines)
-    argumented_asm_lines = fill_data_immediates(argumented_asm_lines)
+def count_label_arguments(asm_lines: List[AsmLine]) -> int:
+    return sum(1 for asm_line in asm_lines if asm_line.argument is not None and asm_line.argument.is_label())
+
+
+def require_addresses(program: Program) -> None:
+    if not program.addressed:
+        raise AssemblyError('Addresses must be filled before immediates.')
+
+
+def check_symbols_pass(program: Program) -> int:
+    program.symbol_table.check_references(program.asm_lines)
+    return 0
+
 
-    return asm_lines_to_machine_code(argumented_asm_lines)
+def relax_prefixes_pass(program: Program) -> int:
+    lines_count = len(program.asm_lines)
+    program.asm_lines = relax_prefixes(program.asm_lines, program.symbol_table)
+    return len(program.asm_lines) - lines_count
+
+
+def fill_addresses_pass(program: Program) -> int:
+    fill_addresses(program.asm_lines)
+    program.addressed = True
+    return len(program.asm_lines)
+
+
+def fill_pass(fill: Callable[[List[AsmLine], SymbolTable], List[AsmLine]]) -> Callable[[Program], int]:
+    def run(program: Program) -> int:
+        require_addresses(program)
+        label_arguments_count = count_label_arguments(program.asm_lines)
+        fill(program.asm_lines, program.symbol_table)
+        return label_arguments_count - count_label_arguments(program.asm_lines)
+
+    return run
+
+
+def default_pipeline(trace_allocations: bool = False) -> PassManager:
+    pipeline = PassManager(trace_allocations)
+    pipeline.add('check_symbols', check_symbols_pass)
+    pipeline.add('relax_prefixes', relax_prefixes_pass, invalidates=[ADDRESSES])
+    pipeline.add('fill_addresses', fill_addresses_pass)
+    pipeline.add('fill_absolute_immediates', fill_pass(fill_absolute_immediates))
+    pipeline.add('fill_relative_immediates', fill_pass(fill_relative_immediates))
+    pipeline.add('fill_data_immediates', fill_pass(fill_data_immediates))
+    return pipeline
+
+
+def assemble_asm_lines(asm_code: Iterable[str], pipeline: Optional[PassManager] = None) -> List[AsmLine]:
+    if pipeline is None:
+        pipeline = default_pipeline()
+
+    with span('parse_asm_lines', 'parse'):
+        program = Program(list(iter_numbered_asm_lines(iter_code_lines(asm_code))))
+
+    count_parsed(program.asm_lines)
+    pipeline.run(program)
+
+    return program.asm_lines
+
+
+def iter_assemble(asm_code: Iterable[str], pipeline: Optional[PassManager] = None) -> Iterator[int]:
+    yield from iter_machine_code(assemble_asm_lines(asm_code, pipeline))
+
+
+def assemble(asm_code: Iterable[str], pipeline: Optional[PassManager] = None) -> List[int]:
+    return asm_lines_to_machine_code(assemble_asm_lines(asm_code, pipeline))
+
+
+def assemble_bytes(asm_code: Iterable[str], pipeline: Optional[PassManager] = None) -> bytes:
+    return bytes(asm_lines_to_machine_code(assemble_asm_lines(asm_code, pipeline)))
+
+
+def assemble_with_source_map(asm_code: Iterable[str], filename: Optional[str] = None,
+                             pipeline: Optional[PassManager] = None) -> Tuple[List[int], List[SourceMapEntry]]:
+    asm_lines = assemble_asm_lines(asm_code, pipeline)
+    return asm_lines_to_machine_code(asm_lines), build_source_map(asm_lines, filename)
 
 
 def to_hex(machine_code: List[int]) -> List[str]:
@@ -240,10 +335,60 @@ def group_code(str_list: List[str], group_size: int = 16) -> List[str]:
     return [' '.join(group) for group in groups]
 
 
+def iter_hex_groups(machine_code: Iterable[int], group_size: int = 16) -> Iterator[str]:
+    group = []
+
+    for code in machine_code:
+        group.append(f'{code:02X}')
+
+        if len(group) == group_size:
+            yield ' '.join(group)
+            group = []
+
+    if group:
+        yield ' '.join(group)
+
+
+def intel_hex_record(address: int, record_type: int, data: bytes) -> str:
+    fields = bytes([len(data), (address >> 8) & 0xFF, address & 0xFF, record_type]) + data
+    checksum = -sum(fields) & 0xFF
+    return f':{fields.hex().upper()}{checksum:02X}'
+
+
+def iter_intel_hex(image: bytes, record_size: int = 16) -> Iterator[str]:
+    for address in range(0, len(image), record_size):
+        yield intel_hex_record(address, INTEL_HEX_DATA, image[address:address + record_size])
+
+    yield intel_hex_record(0, INTEL_HEX_END, b'')
+
+
+def write_output(filepath: str, image: bytes, output_format: str = 'hex') -> None:
+    if output_format not in OUTPUT_FORMATS:
+        raise AssemblyError(f'Unknown output format {output_format}, expected one of {", ".join(OUTPUT_FORMATS)}.')
+
+    if output_format == 'bin':
+        if filepath == '-':
+            sys.stdout.buffer.write(image)
+        else:
+            with open(filepath, 'wb') as file:
+                file.write(image)
+        return
+
+    lines = iter_hex_groups(image) if output_format == 'hex' else iter_intel_hex(image)
+
+    if filepath == '-':
+        write_lines(sys.stdout, lines)
+    else:
+        write_file(filepath, lines)
+
+
 if __name__ == '__main__':
-    asm_filepath = sys.argv[1]
-    asm_code = read_file_lines(asm_filepath)
-    machine_code = assemble(asm_code)
-    hex_code = to_hex(machine_code)
-    grouped_code = group_code(hex_code)
-    write_file('out.txt', grouped_code)
+    argument_parser = argparse.ArgumentParser(description='Assemble a BCPU programme.')
+    argument_parser.add_argument('source', help='assembly file, or - for stdin')
+    argument_parser.add_argument('output', nargs='?', default='out.txt', help='output file, or - for stdout')
+    argument_parser.add_argument('-f', '--format', choices=OUTPUT_FORMATS, default='hex',
+                                 help='grouped hex text, raw binary or Intel HEX')
+    arguments = argument_parser.parse_args()
+
+    asm_code = strip_lines(sys.stdin) if arguments.source == '-' else iter_file_lines(arguments.source)
+    write_output(arguments.output, assemble_bytes(asm_code), arguments.format)
@@ -1,12 +1,20 @@
-from typing import Optional, List
+from typing import Optional, List, Iterable, Iterator
 
 import instructions
+from tracing import span
 
 
 class Argument:
-    label: str = None
-    immediate: int = None
-    offset: int = None
+    __slots__ = ('label', 'immediate', 'offset')
+
+    label: Optional[str]
+    immediate: Optional[int]
+    offset: Optional[int]
+
+    def __init__(self):
+        self.label = None
+        self.immediate = None
+        self.offset = None
 
     @classmethod
     def from_label(cls, label: str, offset: int = 0):
@@ -24,12 +32,17 @@ class Argument:
     def is_label(self) -> bool:
         return self.label is not None
 
+    def resolve(self, immediate: int) -> None:
+        self.label = None
+        self.immediate = immediate
+        self.offset = None
+
     def __repr__(self) -> str:
         if self.is_label():
             suffix = ''
             if self.offset != 0:
                 sign = '+' if self.offset > 0 else '-'
-                suffix = f'{sign}{self.offset}'
+                suffix = f' {sign} {abs(self.offset)}'
             return f'{self.label}{suffix}'
         else:
             return str(self.immediate)
@@ -39,28 +52,30 @@ class Argument:
 
 
 class AsmLine:
-    is_data: bool = False
-    mnemonic: str = None
-    argument: Argument = None
-    address: int = None
-    label: str = None
+    __slots__ = ('is_data', 'mnemonic', 'argument', 'address', 'label', 'source_line', 'synthetic')
+
+    is_data: bool
+    mnemonic: Optional[str]
+    argument: Optional[Argument]
+    address: Optional[int]
+    label: Optional[str]
+    source_line: Optional[int]
+    synthetic: bool
+
+    def __init__(self):
+        self.is_data = False
+        self.mnemonic = None
+        self.argument = None
+        self.address = None
+        self.label = None
+        self.source_line = None
+        self.synthetic = False
 
     def is_relative_branch(self) -> bool:
-        return self.mnemonic in ['BR', 'BRZ', 'BRN']
+        return self.mnemonic in instructions.RELATIVE_BRANCHES
 
     def is_non_relative_branch(self) -> bool:
-        return self.mnemonic in [
-            'LDAM',
-            'LDBM',
-            'STAM',
-            'LDAC',
-            'LDBC',
-            'LDAP',
-            'LDAI',
-            'LDBI',
-            'STAI',
-            'BRB',
-        ]
+        return self.mnemonic in instructions.ABSOLUTE_OPERANDS
 
     @classmethod
     def from_instruction(cls, mnemonic: str, argument: Argument):
@@ -97,12 +112,14 @@ class AsmLine:
                self.label == other.label
 
     def __copy__(self):
-        result = Argument()
+        result = AsmLine()
         result.is_data = self.is_data
         result.mnemonic = self.mnemonic
         result.argument = self.argument
         result.address = self.address
         result.label = self.label
+        result.source_line = self.source_line
+        result.synthetic = self.synthetic
 
         return result
 
@@ -110,7 +127,7 @@ class AsmLine:
         if self.is_data:
             return self.argument.immediate
         else:
-            opcode = instructions.MNEMONICS.index(self.mnemonic)
+            opcode = instructions.OPCODES[self.mnemonic]
             argument = 0 if self.argument is None else self.argument.immediate
             instruction = (opcode << 4) + argument
             return instruction
@@ -120,4 +137,10 @@ class AsmLine:
 
 
 def asm_lines_to_machine_code(asm_lines: List[AsmLine]) -> List[int]:
-    return [asm_line.to_int() for asm_line in asm_lines]
+    with span('asm_lines_to_machine_code', 'encode'):
+        return [asm_line.to_int() for asm_line in asm_lines]
+
+
+def iter_machine_code(asm_lines: Iterable[AsmLine]) -> Iterator[int]:
+    for asm_line in asm_lines:
+        yield asm_line.to_int()
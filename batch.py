@@ -0,0 +1,162 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Optional, Tuple, Any
+
+from asm import assemble_bytes, read_file_lines, write_output, write_lines, OUTPUT_FORMATS
+from tracing import TRACER, trace_to
+
+SOURCE_EXTENSION = '.s'
+OUTPUT_EXTENSIONS = {'hex': '.txt', 'bin': '.bin', 'ihex': '.hex'}
+DEFAULT_MANIFEST = 'manifest.json'
+DEFAULT_MIRROR = 'build'
+CHUNK_SIZE = 8
+
+Job = Tuple[str, str, str]
+
+
+def glob_root(pattern: str) -> str:
+    parts = []
+
+    for part in pattern.split(os.sep):
+        if glob.has_magic(part):
+            break
+        parts.append(part)
+
+    return os.sep.join(parts)
+
+
+def collect_sources(paths: List[str]) -> List[Tuple[str, str]]:
+    result = {}
+
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, filenames in os.walk(path):
+                for filename in filenames:
+                    if filename.endswith(SOURCE_EXTENSION):
+                        result.setdefault(os.path.join(root, filename), path)
+        elif glob.has_magic(path):
+            for filepath in glob.glob(path, recursive=True):
+                result.setdefault(filepath, glob_root(path))
+        else:
+            result.setdefault(path, os.path.dirname(path))
+
+    if not result:
+        return []
+
+    common_root = os.path.commonpath([os.path.abspath(root) for root in result.values()])
+    return [(source, common_root) for source in sorted(result)]
+
+
+def output_path(source: str, root: str, output_format: str, mirror: Optional[str] = None) -> str:
+    base, _ = os.path.splitext(source)
+    filepath = base + OUTPUT_EXTENSIONS[output_format]
+
+    if mirror is None:
+        return filepath
+
+    return os.path.join(mirror, os.path.relpath(filepath, root or '.'))
+
+
+def assemble_job(job: Job) -> Dict[str, Any]:
+    source, output, output_format = job
+    start = time.perf_counter()
+    result = {'source': source, 'output': output, 'size': None, 'seconds': None, 'error': None}
+
+    try:
+        image = assemble_bytes(read_file_lines(source))
+        os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+        write_output(output, image, output_format)
+        result['size'] = len(image)
+    except Exception as error:
+        result['error'] = f'{type(error).__name__}: {error}'
+
+    result['seconds'] = time.perf_counter() - start
+
+    if TRACER.enabled:
+        result['trace'] = TRACER.take_events()
+
+    return result
+
+
+def clash_result(job: Job, sources: List[str]) -> Dict[str, Any]:
+    source, output, _ = job
+    others = ', '.join(other for other in sources if other != source)
+    return {'source': source, 'output': output, 'size': None, 'seconds': 0.0,
+            'error': f'OutputClash: {output} is also the output of {others}'}
+
+
+def assemble_batch(sources: List[Tuple[str, str]], output_format: str = 'hex',
+                   mirror: Optional[str] = DEFAULT_MIRROR, workers: Optional[int] = None) -> List[Dict[str, Any]]:
+    jobs = [(source, output_path(source, root, output_format, mirror), output_format) for source, root in sources]
+    writers = {}
+
+    for source, output, _ in jobs:
+        writers.setdefault(os.path.abspath(output), []).append(source)
+
+    runnable = [job for job in jobs if len(writers[os.path.abspath(job[1])]) == 1]
+
+    if workers == 1 or len(runnable) <= 1:
+        assembled = [assemble_job(job) for job in runnable]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            assembled = list(executor.map(assemble_job, runnable, chunksize=CHUNK_SIZE))
+
+    for result in assembled:
+        TRACER.merge(result.pop('trace', []))
+
+    assembled_results = iter(assembled)
+    results = []
+
+    for job in jobs:
+        job_writers = writers[os.path.abspath(job[1])]
+        results.append(next(assembled_results) if len(job_writers) == 1 else clash_result(job, job_writers))
+
+    return results
+
+
+def build_manifest(results: List[Dict[str, Any]], seconds: float) -> Dict[str, Any]:
+    return {
+        'files': results,
+        'assembled': sum(1 for result in results if result['error'] is None),
+        'failed': sum(1 for result in results if result['error'] is not None),
+        'bytes': sum(result['size'] for result in results if result['size'] is not None),
+        'seconds': seconds,
+    }
+
+
+def write_manifest(filepath: str, manifest: Dict[str, Any]) -> None:
+    with open(filepath, 'w') as file:
+        json.dump(manifest, file, indent=1)
+
+
+if __name__ == '__main__':
+    argument_parser = argparse.ArgumentParser(description='Assemble every BCPU programme under directories or globs.')
+    argument_parser.add_argument('paths', nargs='+', help='directories, globs or .s files')
+    argument_parser.add_argument('-f', '--format', choices=OUTPUT_FORMATS, default='hex')
+    argument_parser.add_argument('--mirror', default=DEFAULT_MIRROR, help='write outputs into this tree')
+    argument_parser.add_argument('--in-place', action='store_true', help='write outputs next to the sources')
+    argument_parser.add_argument('--manifest', default=DEFAULT_MANIFEST)
+    argument_parser.add_argument('-j', '--jobs', type=int, help='worker processes, defaults to the number of cores')
+    argument_parser.add_argument('--trace', help='write spans and counters to this .json (Chrome) or .jsonl file')
+    arguments = argument_parser.parse_args()
+
+    if arguments.trace is not None:
+        trace_to(arguments.trace)
+
+    batch_start = time.perf_counter()
+    batch_mirror = None if arguments.in_place else arguments.mirror
+    batch_results = assemble_batch(collect_sources(arguments.paths), arguments.format, batch_mirror, arguments.jobs)
+    batch_manifest = build_manifest(batch_results, time.perf_counter() - batch_start)
+    write_manifest(arguments.manifest, batch_manifest)
+
+    write_lines(sys.stderr, [f'{result["source"]}: {result["error"]}' for result in batch_results if result['error']])
+    write_lines(sys.stdout, [f'{batch_manifest["assembled"]} assembled, {batch_manifest["failed"]} failed, '
+                             f'{batch_manifest["bytes"]} bytes in {batch_manifest["seconds"]:.2f} s'])
+
+    if batch_manifest['failed']:
+        sys.exit(1)
@@ -0,0 +1,131 @@
+import sys
+from typing import List, Dict, Iterable, Tuple
+
+import numpy as np
+
+from asm import write_lines
+from sim import MEMORY_SIZE, DEFAULT_MAX_CYCLES, load_image, SimulationError, \
+    LDAM, LDBM, STAM, LDAC, LDBC, LDAP, LDAI, LDBI, STAI, BR, BRZ, BRN, BRB, ADD, SUB, PFIX
+
+
+class BatchMachine:
+    memory: np.ndarray
+    a: np.ndarray
+    b: np.ndarray
+    oreg: np.ndarray
+    pc: np.ndarray
+    start: np.ndarray
+    cycles: np.ndarray
+    halted: np.ndarray
+
+    def __init__(self, machine_code: Iterable[int], patches: List[Dict[int, int]]):
+        machine_code = bytes(machine_code)
+
+        if len(machine_code) > MEMORY_SIZE:
+            raise SimulationError(f'Image of {len(machine_code)} bytes does not fit in {MEMORY_SIZE} bytes of memory.')
+
+        image = np.zeros(MEMORY_SIZE, dtype=np.uint8)
+        image[:len(machine_code)] = np.frombuffer(machine_code, dtype=np.uint8)
+        lanes = len(patches)
+
+        self.memory = np.tile(image, (lanes, 1))
+        for lane, patch in enumerate(patches):
+            for address, value in patch.items():
+                self.memory[lane, address] = value
+
+        self.a = np.zeros(lanes, dtype=np.int32)
+        self.b = np.zeros(lanes, dtype=np.int32)
+        self.oreg = np.zeros(lanes, dtype=np.int32)
+        self.pc = np.zeros(lanes, dtype=np.int32)
+        self.start = np.zeros(lanes, dtype=np.int32)
+        self.cycles = np.zeros(lanes, dtype=np.int64)
+        self.halted = np.zeros(lanes, dtype=bool)
+
+    def step(self) -> int:
+        lanes = np.flatnonzero(~self.halted)
+
+        if len(lanes) == 0:
+            return 0
+
+        memory = self.memory
+        a = self.a[lanes]
+        b = self.b[lanes]
+        pc = self.pc[lanes]
+        byte = memory[lanes, pc].astype(np.int32)
+        opcode = byte >> 4
+        operand = self.oreg[lanes] | (byte & 0xF)
+        next_pc = (pc + 1) & 0xFF
+        new_pc = next_pc.copy()
+        branch = np.zeros(len(lanes), dtype=bool)
+
+        for op in np.flatnonzero(np.bincount(opcode, minlength=16)):
+            mask = opcode == op
+
+            if op == LDAM:
+                a[mask] = memory[lanes[mask], operand[mask]]
+            elif op == LDBM:
+                b[mask] = memory[lanes[mask], operand[mask]]
+            elif op == STAM:
+                memory[lanes[mask], operand[mask]] = a[mask]
+            elif op == LDAC:
+                a[mask] = operand[mask]
+            elif op == LDBC:
+                b[mask] = operand[mask]
+            elif op == LDAP:
+                a[mask] = (next_pc[mask] + operand[mask]) & 0xFF
+            elif op == LDAI:
+                a[mask] = memory[lanes[mask], (a[mask] + operand[mask]) & 0xFF]
+            elif op == LDBI:
+                b[mask] = memory[lanes[mask], (b[mask] + operand[mask]) & 0xFF]
+            elif op == STAI:
+                memory[lanes[mask], (b[mask] + operand[mask]) & 0xFF] = a[mask]
+            elif op == ADD:
+                a[mask] = (a[mask] + b[mask]) & 0xFF
+            elif op == SUB:
+                a[mask] = (a[mask] - b[mask]) & 0xFF
+            elif op == BRB:
+                new_pc[mask] = b[mask]
+                branch |= mask
+            elif op != PFIX:
+                if op == BRZ:
+                    mask &= a == 0
+                elif op == BRN:
+                    mask &= (a & 0x80) != 0
+                new_pc[mask] = (next_pc[mask] + operand[mask]) & 0xFF
+                branch |= mask
+
+        prefix = opcode == PFIX
+        start = self.start[lanes]
+
+        self.a[lanes] = a
+        self.b[lanes] = b
+        self.pc[lanes] = new_pc
+        self.oreg[lanes] = np.where(prefix, (operand << 4) & 0xFF, 0)
+        self.start[lanes] = np.where(prefix, start, new_pc)
+        self.halted[lanes] = branch & (new_pc == start)
+        self.cycles[lanes] += 1
+
+        return len(lanes)
+
+    def run(self, max_cycles: int = DEFAULT_MAX_CYCLES) -> int:
+        steps = 0
+
+        while steps < max_cycles and self.step():
+            steps += 1
+
+        return steps
+
+
+def run_batch(machine_code: Iterable[int], patches: List[Dict[int, int]],
+              max_cycles: int = DEFAULT_MAX_CYCLES) -> Tuple[np.ndarray, np.ndarray]:
+    machine = BatchMachine(machine_code, patches)
+    machine.run(max_cycles)
+    return machine.memory, machine.cycles
+
+
+if __name__ == '__main__':
+    machine_code = load_image(sys.argv[1])
+    lanes = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    machine = BatchMachine(machine_code, [{}] * lanes)
+    machine.run()
+    write_lines(sys.stdout, [f'lanes={lanes} halted={int(machine.halted.sum())} max_cycles={int(machine.cycles.max())}'])
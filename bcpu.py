@@ -0,0 +1,101 @@
+import argparse
+import sys
+from typing import List, Optional
+
+OUTPUT_FORMATS = ('hex', 'bin', 'ihex')
+DEFAULT_MAX_CYCLES = 10_000_000
+
+
+def run_asm(arguments: argparse.Namespace) -> int:
+    from asm import assemble_bytes, iter_file_lines, strip_lines, write_output
+
+    asm_code = strip_lines(sys.stdin) if arguments.source == '-' else iter_file_lines(arguments.source)
+    write_output(arguments.output, assemble_bytes(asm_code), arguments.format)
+    return 0
+
+
+def run_disasm(arguments: argparse.Namespace) -> int:
+    from asm import write_lines
+    from disasm import disassemble_to_source
+    from sim import load_image
+
+    write_lines(sys.stdout, disassemble_to_source(load_image(arguments.image)))
+    return 0
+
+
+def run_sim(arguments: argparse.Namespace) -> int:
+    from asm import write_lines
+    from sim import Machine, load_image
+
+    machine = Machine(load_image(arguments.image))
+    machine.run(arguments.max_cycles)
+    write_lines(sys.stdout, machine.dump())
+    return 0 if machine.halted else 1
+
+
+def run_schem(arguments: argparse.Namespace) -> int:
+    from cache import BuildCache, cached_schem
+    from sim import load_image
+
+    build_cache = None if arguments.no_cache else BuildCache()
+    print(cached_schem(bytes(load_image(arguments.image)), arguments.name, build_cache))
+    return 0
+
+
+def run_bench(arguments: argparse.Namespace) -> int:
+    import bench
+
+    return bench.main(arguments.extra)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    argument_parser = argparse.ArgumentParser(prog='bcpu', description='BCPU assembler toolchain.')
+    argument_parser.add_argument('--trace', help='write spans and counters to this .json (Chrome) or .jsonl file')
+    subparsers = argument_parser.add_subparsers(dest='command', required=True)
+
+    asm_parser = subparsers.add_parser('asm', help='assemble a programme')
+    asm_parser.add_argument('source', help='assembly file, or - for stdin')
+    asm_parser.add_argument('output', nargs='?', default='out.txt', help='output file, or - for stdout')
+    asm_parser.add_argument('-f', '--format', choices=OUTPUT_FORMATS, default='hex')
+    asm_parser.set_defaults(run=run_asm)
+
+    disasm_parser = subparsers.add_parser('disasm', help='disassemble an image back to source')
+    disasm_parser.add_argument('image', help='.s, .bin, grouped hex or Intel HEX file')
+    disasm_parser.set_defaults(run=run_disasm)
+
+    sim_parser = subparsers.add_parser('sim', help='run an image until it halts')
+    sim_parser.add_argument('image', help='.s, .bin, grouped hex or Intel HEX file')
+    sim_parser.add_argument('--max-cycles', type=int, default=DEFAULT_MAX_CYCLES)
+    sim_parser.set_defaults(run=run_sim)
+
+    schem_parser = subparsers.add_parser('schem', help='build the ROM schematic for an image')
+    schem_parser.add_argument('image', help='.s, .bin, grouped hex or Intel HEX file')
+    schem_parser.add_argument('--name', default='modified', help='schematic name under schems/')
+    schem_parser.add_argument('--no-cache', action='store_true', help='rebuild without the build cache')
+    schem_parser.set_defaults(run=run_schem)
+
+    bench_parser = subparsers.add_parser('bench', add_help=False, help='benchmark the assembler, see bcpu bench -h')
+    bench_parser.set_defaults(run=run_bench)
+
+    return argument_parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    argument_parser = build_parser()
+    arguments, extra = argument_parser.parse_known_args(argv)
+
+    if extra and arguments.command != 'bench':
+        argument_parser.error(f'unrecognized arguments: {" ".join(extra)}')
+
+    arguments.extra = extra
+
+    if arguments.trace is not None:
+        from tracing import trace_to
+
+        trace_to(arguments.trace)
+
+    return arguments.run(arguments)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
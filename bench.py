@@ -0,0 +1,222 @@
+import argparse
+import json
+import math
+import random
+import sys
+import tempfile
+import time
+from typing import List, Dict, Optional, Callable, Tuple
+
+from asm import default_pipeline, iter_code_lines, write_lines
+from asm_line import asm_lines_to_machine_code
+from parser import iter_numbered_asm_lines
+from passes import Program
+
+DEFAULT_BASELINE = 'bench_baseline.json'
+DEFAULT_SIZES = (64, 128, 256, 512, 1024)
+DEFAULT_REPEATS = 5
+DEFAULT_THRESHOLD = 0.5
+DEFAULT_MAX_EXPONENT = 1.5
+NOISE_SECONDS = 0.0005
+ROM_BYTES = 32
+BRANCH_REACH = 24
+TABLE_SIZE = 32
+
+PHASES = ('parse', 'prefix', 'fills', 'encode', 'schem')
+PREFIX_PASSES = frozenset(['check_symbols', 'relax_prefixes', 'fill_addresses'])
+FILL_PASSES = frozenset(['fill_absolute_immediates', 'fill_relative_immediates', 'fill_data_immediates'])
+
+
+def generate_programme(lines: int, label_density: float = 0.25, table_size: int = TABLE_SIZE,
+                       seed: int = 0) -> List[str]:
+    generator = random.Random(seed)
+    result = ['BR .code_0']
+
+    for i in range(table_size):
+        result += [f'.table_{i}', f'DATA .table_{generator.randrange(table_size)}' if i % 2 else f'DATA {i}']
+
+    labels = [i for i in range(lines) if i == 0 or generator.random() < label_density]
+    label_set = set(labels)
+
+    for i in range(lines):
+        if i in label_set:
+            result.append(f'.code_{i}')
+
+        choice = generator.random()
+        nearby = [label for label in labels if abs(label - i) <= BRANCH_REACH and label != i + 1]
+
+        if choice < 0.3 and nearby:
+            mnemonic = generator.choice(['BR', 'BRZ', 'BRN'])
+            result.append(f'{mnemonic} .code_{generator.choice(nearby)}')
+        elif choice < 0.6:
+            mnemonic = generator.choice(['LDAM', 'LDBM', 'STAM'])
+            result.append(f'{mnemonic} .table_{generator.randrange(table_size)}')
+        elif choice < 0.8:
+            result.append(f'{generator.choice(["LDAC", "LDBC"])} {generator.randrange(16)}')
+        else:
+            result.append(generator.choice(['ADD', 'SUB']))
+
+    result.append('HALT')
+    return result
+
+
+def suite(sizes: Tuple[int, ...] = DEFAULT_SIZES) -> Dict[str, List[str]]:
+    result = {}
+
+    for size in sizes:
+        result[f'sparse_{size}'] = generate_programme(size, label_density=0.1, seed=size)
+        result[f'dense_{size}'] = generate_programme(size, label_density=0.5, seed=size)
+
+    return result
+
+
+def build_rom(image: bytes) -> Optional[float]:
+    try:
+        from schem import BCPURomBuilder
+        builder_start = time.perf_counter()
+        builder = BCPURomBuilder()
+    except ImportError:
+        return None
+
+    builder.write_image(image[:ROM_BYTES])
+
+    with tempfile.TemporaryDirectory() as directory:
+        builder.save('bench', directory)
+
+    return time.perf_counter() - builder_start
+
+
+def time_phases(asm_code: List[str], schem: bool = True) -> Dict[str, float]:
+    start = time.perf_counter()
+    program = Program(list(iter_numbered_asm_lines(iter_code_lines(asm_code))))
+    phases = {'parse': time.perf_counter() - start}
+
+    pipeline = default_pipeline()
+    pipeline.run(program)
+    phases['prefix'] = sum(each.seconds for each in pipeline.statistics if each.name in PREFIX_PASSES)
+    phases['fills'] = sum(each.seconds for each in pipeline.statistics if each.name in FILL_PASSES)
+
+    start = time.perf_counter()
+    image = bytes(asm_lines_to_machine_code(program.asm_lines))
+    phases['encode'] = time.perf_counter() - start
+
+    if schem:
+        rom_seconds = build_rom(image)
+        if rom_seconds is not None:
+            phases['schem'] = rom_seconds
+
+    phases['total'] = sum(phases.values())
+    return phases
+
+
+def best_of(measure: Callable[[], Dict[str, float]], repeats: int) -> Dict[str, float]:
+    result = {}
+
+    for _ in range(repeats):
+        for phase, seconds in measure().items():
+            result[phase] = min(seconds, result.get(phase, seconds))
+
+    return result
+
+
+def run_suite(programmes: Dict[str, List[str]], repeats: int = DEFAULT_REPEATS,
+              schem: bool = True) -> Dict[str, Dict[str, float]]:
+    return {name: best_of(lambda: time_phases(asm_code, schem), repeats) for name, asm_code in programmes.items()}
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            threshold: float = DEFAULT_THRESHOLD) -> List[str]:
+    regressions = []
+
+    for name, phases in results.items():
+        for phase, seconds in phases.items():
+            expected = baseline.get(name, {}).get(phase)
+
+            if expected is None:
+                continue
+
+            if seconds > expected * (1 + threshold) and seconds - expected > NOISE_SECONDS:
+                regressions.append(f'{name} {phase}: {seconds * 1000:.3f} ms, baseline {expected * 1000:.3f} ms')
+
+    return regressions
+
+
+def scaling_exponent(results: Dict[str, Dict[str, float]], prefix: str) -> Optional[float]:
+    points = [(math.log(int(name[len(prefix):])), math.log(phases['total'] - phases.get('schem', 0.0)))
+              for name, phases in results.items() if name.startswith(prefix)]
+
+    if len(points) < 2:
+        return None
+
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    variance = sum((x - mean_x) ** 2 for x, _ in points)
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / variance
+
+
+def report(results: Dict[str, Dict[str, float]]) -> List[str]:
+    columns = [phase for phase in (*PHASES, 'total') if any(phase in phases for phases in results.values())]
+    result = [f'{"case":<14}' + ''.join(f'{phase:>10}' for phase in columns)]
+
+    for name, phases in results.items():
+        result.append(f'{name:<14}' + ''.join(f'{phases.get(phase, 0.0) * 1000:>10.3f}' for phase in columns))
+
+    for prefix in ('sparse_', 'dense_'):
+        exponent = scaling_exponent(results, prefix)
+        if exponent is not None:
+            result.append(f'{prefix[:-1]} scaling exponent: {exponent:.2f}')
+
+    return result
+
+
+def read_baseline(filepath: str) -> Dict[str, Dict[str, float]]:
+    with open(filepath, 'r') as file:
+        return json.load(file)
+
+
+def write_baseline(filepath: str, results: Dict[str, Dict[str, float]]) -> None:
+    with open(filepath, 'w') as file:
+        json.dump(results, file, indent=1)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    argument_parser = argparse.ArgumentParser(description='Benchmark the assembler phases on generated programmes.')
+    argument_parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES))
+    argument_parser.add_argument('--repeats', type=int, default=DEFAULT_REPEATS)
+    argument_parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    argument_parser.add_argument('--save-baseline', action='store_true', help='overwrite the baseline with this run')
+    argument_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                                 help='allowed slowdown per phase, 0.5 means 50%%')
+    argument_parser.add_argument('--max-exponent', type=float, default=DEFAULT_MAX_EXPONENT,
+                                 help='fail if time grows faster than lines to this power')
+    argument_parser.add_argument('--no-schem', action='store_true', help='skip the schematic phase')
+    return argument_parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    arguments = build_parser().parse_args(argv)
+    results = run_suite(suite(tuple(arguments.sizes)), arguments.repeats, not arguments.no_schem)
+    write_lines(sys.stdout, report(results))
+    failures = []
+    missing_baseline = False
+
+    for prefix in ('sparse_', 'dense_'):
+        exponent = scaling_exponent(results, prefix)
+        if exponent is not None and exponent > arguments.max_exponent:
+            failures.append(f'{prefix[:-1]} scaling exponent {exponent:.2f} exceeds {arguments.max_exponent}')
+
+    if arguments.save_baseline:
+        write_baseline(arguments.baseline, results)
+    else:
+        try:
+            failures += compare(results, read_baseline(arguments.baseline), arguments.threshold)
+        except FileNotFoundError:
+            write_lines(sys.stderr, [f'no baseline at {arguments.baseline}, run with --save-baseline'])
+            missing_baseline = True
+
+    write_lines(sys.stdout, [f'REGRESSION {failure}' for failure in failures])
+    return 1 if failures or missing_baseline else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,280 @@
+import sys
+from typing import Callable, Dict, List, Tuple
+
+from asm import write_lines
+from sim import Machine, load_image, DEFAULT_MAX_CYCLES, OPCODE_TABLE, OPERAND_TABLE, \
+    LDAM, LDBM, STAM, LDAC, LDBC, LDAP, LDAI, LDBI, STAI, BR, BRZ, BRN, BRB, ADD, SUB, PFIX
+
+MAX_BLOCK_SIZE = 64
+HOT_THRESHOLD = 32
+
+Block = Callable[[bytearray, int, int, int], Tuple[int, int, int, int, bool]]
+BlockResult = Tuple[int, int, int, int, bool]
+
+
+def exit_line(pc: str, cycles: int, halted: str = 'False') -> str:
+    return f'return {pc}, a, b, cycles + {cycles}, {halted}'
+
+
+def loop_lines(entry: int, cycles: int) -> List[str]:
+    return [
+        f'cycles += {cycles}',
+        'if cycles >= budget:',
+        f'    return {entry}, a, b, cycles, False',
+        'continue',
+    ]
+
+
+def store_lines(address: str, next_pc: int, cycles: int) -> List[str]:
+    return [
+        f'memory[{address}] = a',
+        f'if covered[{address}]:',
+        f'    invalidate({address})',
+        f'    {exit_line(str(next_pc), cycles)}',
+    ]
+
+
+def branch_lines(condition: str, target: int, entry: int, start: int, cycles: int) -> List[str]:
+    if target == entry and target != start:
+        return [f'if {condition}:', *[f'    {line}' for line in loop_lines(entry, cycles)]]
+
+    return [
+        f'if {condition}:',
+        f'    {exit_line(str(target), cycles, str(target == start))}',
+    ]
+
+
+def translate_block(memory: bytearray, entry: int) -> Tuple[List[str], List[int]]:
+    body = []
+    addresses = []
+    address = entry
+    start = entry
+    oreg = 0
+
+    while True:
+        addresses.append(address)
+        byte = memory[address]
+        opcode = OPCODE_TABLE[byte]
+        operand = oreg | OPERAND_TABLE[byte]
+        address = (address + 1) & 0xFF
+        cycles = len(addresses)
+
+        if opcode == PFIX:
+            oreg = (operand << 4) & 0xFF
+            continue
+
+        oreg = 0
+
+        if opcode == LDAM:
+            body.append(f'a = memory[{operand}]')
+        elif opcode == LDBM:
+            body.append(f'b = memory[{operand}]')
+        elif opcode == STAM:
+            body.extend(store_lines(str(operand), address, cycles))
+        elif opcode == LDAC:
+            body.append(f'a = {operand}')
+        elif opcode == LDBC:
+            body.append(f'b = {operand}')
+        elif opcode == LDAP:
+            body.append(f'a = {(address + operand) & 0xFF}')
+        elif opcode == LDAI:
+            body.append(f'a = memory[(a + {operand}) & 0xFF]')
+        elif opcode == LDBI:
+            body.append(f'b = memory[(b + {operand}) & 0xFF]')
+        elif opcode == STAI:
+            body.append(f'address = (b + {operand}) & 0xFF')
+            body.extend(store_lines('address', address, cycles))
+        elif opcode == ADD:
+            body.append('a = (a + b) & 0xFF')
+        elif opcode == SUB:
+            body.append('a = (a - b) & 0xFF')
+        elif opcode == BR:
+            target = (address + operand) & 0xFF
+            if target == start:
+                body.append(exit_line(str(target), cycles, 'True'))
+                return body, addresses
+            if target == entry:
+                body.extend(loop_lines(entry, cycles))
+                return body, addresses
+            if target in addresses or cycles >= MAX_BLOCK_SIZE:
+                body.append(exit_line(str(target), cycles))
+                return body, addresses
+            address = target
+        elif opcode == BRZ:
+            body.extend(branch_lines('a == 0', (address + operand) & 0xFF, entry, start, cycles))
+        elif opcode == BRN:
+            body.extend(branch_lines('a & 0x80', (address + operand) & 0xFF, entry, start, cycles))
+        elif opcode == BRB:
+            body.append(exit_line('b', cycles, f'b == {start}'))
+            return body, addresses
+
+        start = address
+
+        if address in addresses or cycles >= MAX_BLOCK_SIZE:
+            body.append(exit_line(str(address), cycles))
+            return body, addresses
+
+
+class BlockMachine(Machine):
+    blocks: Dict[int, Block]
+    block_addresses: Dict[int, List[int]]
+    sources: Dict[int, str]
+    covered: bytearray
+    entries: List[int]
+    hot_threshold: int
+
+    def __init__(self, machine_code=(), hot_threshold: int = HOT_THRESHOLD):
+        super().__init__(machine_code)
+        self.blocks = {}
+        self.block_addresses = {}
+        self.sources = {}
+        self.covered = bytearray(len(self.memory))
+        self.entries = [0] * len(self.memory)
+        self.hot_threshold = hot_threshold
+        self.translations = 0
+        self.invalidations = 0
+
+    def interpret(self, pc: int, a: int, b: int, budget: int) -> BlockResult:
+        memory = self.memory
+        covered = self.covered
+        opcodes = OPCODE_TABLE
+        operands = OPERAND_TABLE
+        oreg = 0
+        start = pc
+        cycles = 0
+
+        while cycles < budget or oreg:
+            byte = memory[pc]
+            opcode = opcodes[byte]
+            operand = oreg | operands[byte]
+            pc = (pc + 1) & 0xFF
+            cycles += 1
+
+            if opcode == PFIX:
+                oreg = (operand << 4) & 0xFF
+                continue
+
+            oreg = 0
+
+            if opcode < BR:
+                if opcode == LDAM:
+                    a = memory[operand]
+                elif opcode == LDBM:
+                    b = memory[operand]
+                elif opcode == LDAC:
+                    a = operand
+                elif opcode == LDBC:
+                    b = operand
+                elif opcode == LDAP:
+                    a = (pc + operand) & 0xFF
+                elif opcode == LDAI:
+                    a = memory[(a + operand) & 0xFF]
+                elif opcode == LDBI:
+                    b = memory[(b + operand) & 0xFF]
+                else:
+                    address = operand if opcode == STAM else (b + operand) & 0xFF
+                    memory[address] = a
+                    if covered[address]:
+                        self.invalidate(address)
+            elif opcode == ADD:
+                a = (a + b) & 0xFF
+            elif opcode == SUB:
+                a = (a - b) & 0xFF
+            else:
+                if opcode == BR or (opcode == BRZ and a == 0) or (opcode == BRN and a & 0x80):
+                    target = (pc + operand) & 0xFF
+                elif opcode == BRB:
+                    target = b
+                else:
+                    target = pc
+
+                return target, a, b, cycles, target == start
+
+            start = pc
+
+        return pc, a, b, cycles, False
+
+    def translate(self, pc: int) -> Block:
+        body, addresses = translate_block(self.memory, pc)
+        source = '\n'.join([
+            f'def block_{pc:02X}(memory, a, b, budget):',
+            '    cycles = 0',
+            '    while True:',
+            *[f'        {line}' for line in body],
+        ])
+        namespace = {'covered': self.covered, 'invalidate': self.invalidate}
+        exec(compile(source, f'<block {pc:02X}>', 'exec'), namespace)
+        block = namespace[f'block_{pc:02X}']
+
+        for address in addresses:
+            self.covered[address] += 1
+
+        self.blocks[pc] = block
+        self.block_addresses[pc] = addresses
+        self.sources[pc] = source
+        self.translations += 1
+
+        return block
+
+    def invalidate(self, address: int) -> None:
+        for pc, addresses in list(self.block_addresses.items()):
+            if address in addresses:
+                self.drop_block(pc)
+
+    def invalidate_all(self) -> None:
+        for pc in list(self.block_addresses):
+            self.drop_block(pc)
+
+    def drop_block(self, pc: int) -> None:
+        for address in self.block_addresses.pop(pc):
+            self.covered[address] -= 1
+        del self.blocks[pc]
+        del self.sources[pc]
+        self.invalidations += 1
+
+    def run(self, max_cycles: int = DEFAULT_MAX_CYCLES) -> int:
+        prefix_cycles = 0
+
+        while self.oreg and prefix_cycles < max_cycles and not self.halted:
+            prefix_cycles += super().run(1)
+
+        cycles = prefix_cycles
+        memory = self.memory
+        blocks = self.blocks
+        entries = self.entries
+        hot_threshold = self.hot_threshold
+        a = self.a
+        b = self.b
+        pc = self.pc
+        halted = self.halted
+
+        while cycles < max_cycles and not halted:
+            block = blocks.get(pc)
+
+            if block is None:
+                entries[pc] += 1
+
+                if entries[pc] < hot_threshold:
+                    pc, a, b, executed, halted = self.interpret(pc, a, b, max_cycles - cycles)
+                    cycles += executed
+                    continue
+
+                block = self.translate(pc)
+
+            pc, a, b, executed, halted = block(memory, a, b, max_cycles - cycles)
+            cycles += executed
+
+        self.a = a
+        self.b = b
+        self.pc = pc
+        self.start = pc
+        self.halted = halted
+        self.cycles += cycles - prefix_cycles
+
+        return cycles
+
+
+if __name__ == '__main__':
+    machine = BlockMachine(load_image(sys.argv[1]))
+    machine.run()
+    write_lines(sys.stdout, machine.dump())
@@ -0,0 +1,239 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+from typing import List, Optional, Tuple
+
+from asm import ASSEMBLER_VERSION, assemble_with_source_map, default_pipeline, strip_lines, write_output, \
+    write_lines, OUTPUT_FORMATS
+from passes import PassManager
+from source_map import SourceMapEntry, write_source_map
+
+DEFAULT_DIRECTORY = '.bcpu_cache'
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+SCHEM_DIRECTORY = 'schems'
+ASSEMBLER_MODULES = ('asm', 'asm_line', 'disasm', 'instructions', 'layout', 'parser', 'passes', 'peephole',
+                     'placement', 'profiler', 'schem', 'sim', 'source_map', 'superopt', 'symbol_table', 'util')
+
+IMAGE = 'image'
+SOURCE_MAP = 'map'
+SCHEM = 'schem'
+
+
+def assembler_version() -> str:
+    digest = hashlib.sha256(ASSEMBLER_VERSION.encode())
+    directory = os.path.dirname(os.path.abspath(__file__))
+
+    for module in ASSEMBLER_MODULES:
+        with open(os.path.join(directory, f'{module}.py'), 'rb') as file:
+            digest.update(file.read())
+
+    return digest.hexdigest()
+
+
+class BuildCache:
+    directory: str
+    max_bytes: int
+    version: str
+    total: Optional[int]
+    hits: int
+    misses: int
+
+    def __init__(self, directory: str = DEFAULT_DIRECTORY, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.version = assembler_version()
+        self.total = None
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, content: bytes, *parts: str) -> str:
+        digest = hashlib.sha256()
+
+        for part in (self.version, *parts):
+            digest.update(part.encode())
+            digest.update(b'\0')
+
+        digest.update(content)
+        return digest.hexdigest()
+
+    def path(self, key: str, kind: str) -> str:
+        return os.path.join(self.directory, key[:2], f'{key}.{kind}')
+
+    def get(self, key: str, kind: str) -> Optional[bytes]:
+        path = self.path(key, kind)
+
+        try:
+            with open(path, 'rb') as file:
+                data = file.read()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+
+        os.utime(path)
+        self.hits += 1
+        return data
+
+    def put(self, key: str, kind: str, data: bytes) -> None:
+        path = self.path(key, kind)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        previous = os.path.getsize(path) if os.path.exists(path) else 0
+
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), suffix='.tmp', delete=False) as file:
+            file.write(data)
+
+        os.replace(file.name, path)
+
+        if self.total is None:
+            self.total = self.size()
+        else:
+            self.total += len(data) - previous
+
+        if self.total > self.max_bytes:
+            self.evict()
+
+    def entries(self) -> List[Tuple[float, int, str]]:
+        result = []
+
+        for root, _, filenames in os.walk(self.directory):
+            for filename in filenames:
+                if filename.endswith('.tmp'):
+                    continue
+
+                path = os.path.join(root, filename)
+
+                try:
+                    status = os.stat(path)
+                except FileNotFoundError:
+                    continue
+
+                result.append((status.st_mtime, status.st_size, path))
+
+        return result
+
+    def size(self) -> int:
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self) -> int:
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+
+        self.total = total
+        return removed
+
+    def clear(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self.total = None
+
+
+def pipeline_key(pipeline: Optional[PassManager]) -> str:
+    if pipeline is None:
+        pipeline = default_pipeline()
+    return ','.join(f'{each.name}:{each.config}' if each.config else each.name for each in pipeline.passes)
+
+
+def file_digest(filepath: str) -> str:
+    with open(filepath, 'rb') as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def assemble_source(source: bytes, filename: Optional[str] = None,
+                    pipeline: Optional[PassManager] = None) -> Tuple[bytes, List[SourceMapEntry]]:
+    machine_code, source_map = assemble_with_source_map(strip_lines(source.decode().splitlines()), filename, pipeline)
+    return bytes(machine_code), source_map
+
+
+def cached_assemble(filepath: str, cache: Optional[BuildCache] = None,
+                    pipeline: Optional[PassManager] = None) -> Tuple[bytes, List[SourceMapEntry]]:
+    with open(filepath, 'rb') as file:
+        source = file.read()
+
+    if cache is None:
+        return assemble_source(source, filepath, pipeline)
+
+    key = cache.key(source, IMAGE, pipeline_key(pipeline))
+    image = cache.get(key, IMAGE)
+    source_map = cache.get(key, SOURCE_MAP)
+
+    if image is not None and source_map is not None:
+        entries = [SourceMapEntry.from_dict(entry) for entry in json.loads(source_map)]
+    else:
+        image, entries = assemble_source(source, None, pipeline)
+        cache.put(key, IMAGE, image)
+        cache.put(key, SOURCE_MAP, json.dumps([entry.to_dict() for entry in entries]).encode())
+
+    for entry in entries:
+        entry.file = filepath
+
+    return image, entries
+
+
+def cached_schem(image: bytes, filename: str = 'modified', cache: Optional[BuildCache] = None,
+                 directory: str = SCHEM_DIRECTORY) -> str:
+    from schem import build_schem, TEMPLATE_PATH
+
+    path = os.path.join(directory, f'{filename}.schem')
+    key = None
+    os.makedirs(directory, exist_ok=True)
+
+    if cache is not None:
+        key = cache.key(image, SCHEM, file_digest(TEMPLATE_PATH))
+        schem = cache.get(key, SCHEM)
+
+        if schem is not None:
+            with open(path, 'wb') as file:
+                file.write(schem)
+            return path
+
+    build_schem(image, filename, directory)
+
+    if key is not None:
+        with open(path, 'rb') as file:
+            cache.put(key, SCHEM, file.read())
+
+    return path
+
+
+if __name__ == '__main__':
+    argument_parser = argparse.ArgumentParser(description='Assemble a BCPU programme through the on-disk build cache.')
+    argument_parser.add_argument('source')
+    argument_parser.add_argument('output', nargs='?', default='out.txt', help='output file, or - for stdout')
+    argument_parser.add_argument('-f', '--format', choices=OUTPUT_FORMATS, default='hex')
+    argument_parser.add_argument('--source-map', help='also write the source map to this file')
+    argument_parser.add_argument('--schem', help='also build the ROM schematic under this name')
+    argument_parser.add_argument('--cache-dir', default=DEFAULT_DIRECTORY)
+    argument_parser.add_argument('--max-bytes', type=int, default=DEFAULT_MAX_BYTES)
+    argument_parser.add_argument('--no-cache', action='store_true', help='always rebuild and leave the cache alone')
+    argument_parser.add_argument('--clear', action='store_true', help='empty the cache before building')
+    arguments = argument_parser.parse_args()
+
+    build_cache = None if arguments.no_cache else BuildCache(arguments.cache_dir, arguments.max_bytes)
+
+    if arguments.clear and build_cache is not None:
+        build_cache.clear()
+
+    built_image, built_source_map = cached_assemble(arguments.source, build_cache)
+    write_output(arguments.output, built_image, arguments.format)
+
+    if arguments.source_map is not None:
+        write_source_map(arguments.source_map, built_source_map)
+
+    if arguments.schem is not None:
+        cached_schem(built_image, arguments.schem, build_cache)
+
+    if build_cache is not None and arguments.output != '-':
+        write_lines(sys.stdout, [f'cache: {build_cache.hits} hits, {build_cache.misses} misses'])
@@ -0,0 +1,190 @@
+from typing import List, Dict, Optional, Set, Tuple
+
+import instructions
+from disasm import find_code
+
+PFIX = instructions.OPCODES['PFIX']
+
+
+class Instruction:
+    address: int
+    size: int
+    mnemonic: str
+    operand: int
+    flags: int
+
+    def __init__(self, address: int, size: int, mnemonic: str, operand: int, flags: int):
+        self.address = address
+        self.size = size
+        self.mnemonic = mnemonic
+        self.operand = operand
+        self.flags = flags
+
+    def next_address(self) -> int:
+        return (self.address + self.size) & 0xFF
+
+    def target(self) -> Optional[int]:
+        if self.flags & instructions.RELATIVE:
+            return (self.next_address() + self.operand) & 0xFF
+        return None
+
+    def is_halt(self) -> bool:
+        return self.mnemonic == 'BR' and self.target() == self.address
+
+    def __repr__(self) -> str:
+        return f'{self.address:02X} {self.mnemonic} {self.operand}'
+
+
+class BasicBlock:
+    start: int
+    instructions: List[Instruction]
+    successors: List[int]
+    taken: Optional[int]
+
+    def __init__(self, start: int):
+        self.start = start
+        self.instructions = []
+        self.successors = []
+        self.taken = None
+
+    def last(self) -> Instruction:
+        return self.instructions[-1]
+
+    def __repr__(self) -> str:
+        return f'block {self.start:02X} -> {[f"{successor:02X}" for successor in self.successors]}'
+
+
+class Loop:
+    header: int
+    latches: List[int]
+    body: Set[int]
+
+    def __init__(self, header: int):
+        self.header = header
+        self.latches = []
+        self.body = {header}
+
+    def __repr__(self) -> str:
+        return f'loop {self.header:02X} ({len(self.body)} blocks)'
+
+
+def decode_instructions(machine_code: List[int]) -> List[Instruction]:
+    code = find_code(machine_code)
+    result = []
+    address = 0
+
+    while address < len(machine_code):
+        if not code[address]:
+            address += 1
+            continue
+
+        start = address
+        operand = 0
+
+        while True:
+            decoded = instructions.DECODE_TABLE[machine_code[address]]
+            operand = ((operand << 4) | decoded.operand) & 0xFF
+            address += 1
+            if decoded.opcode != PFIX or address >= len(machine_code) or not code[address]:
+                break
+
+        result.append(Instruction(start, address - start, decoded.mnemonic, operand, decoded.flags))
+
+    return result
+
+
+def find_leaders(decoded_instructions: List[Instruction]) -> Set[int]:
+    result = {0}
+
+    for instruction in decoded_instructions:
+        if instruction.flags & instructions.BRANCH:
+            result.add(instruction.next_address())
+            target = instruction.target()
+            if target is not None:
+                result.add(target)
+
+    return result
+
+
+def build_cfg(machine_code: List[int]) -> Dict[int, BasicBlock]:
+    decoded_instructions = decode_instructions(machine_code)
+    starts = {instruction.address for instruction in decoded_instructions}
+    leaders = find_leaders(decoded_instructions) & starts
+    blocks = {}
+    block = None
+
+    for instruction in decoded_instructions:
+        if instruction.address in leaders or block is None:
+            block = BasicBlock(instruction.address)
+            blocks[block.start] = block
+        block.instructions.append(instruction)
+
+    for block in blocks.values():
+        last = block.last()
+        fallthrough = last.next_address()
+
+        if last.is_halt() or last.mnemonic == 'BRB':
+            continue
+
+        if last.flags & instructions.RELATIVE:
+            block.taken = last.target()
+            if block.taken in blocks:
+                block.successors.append(block.taken)
+            if not last.flags & instructions.CONDITIONAL:
+                continue
+
+        if fallthrough in blocks:
+            block.successors.append(fallthrough)
+
+    return blocks
+
+
+def find_back_edges(blocks: Dict[int, BasicBlock]) -> List[Tuple[int, int]]:
+    result = []
+    state = {}
+
+    def visit(start: int) -> None:
+        state[start] = 'active'
+        for successor in blocks[start].successors:
+            if state.get(successor) == 'active':
+                result.append((start, successor))
+            elif successor not in state:
+                visit(successor)
+        state[start] = 'done'
+
+    if 0 in blocks:
+        visit(0)
+
+    return result
+
+
+def find_loops(blocks: Dict[int, BasicBlock]) -> List[Loop]:
+    predecessors = {start: [] for start in blocks}
+
+    for block in blocks.values():
+        for successor in block.successors:
+            predecessors[successor].append(block.start)
+
+    result = {}
+
+    for latch, header in find_back_edges(blocks):
+        loop = result.get(header)
+
+        if loop is None:
+            loop = Loop(header)
+            result[header] = loop
+
+        loop.latches.append(latch)
+        loop.body.add(latch)
+        pending = [latch]
+
+        while pending:
+            start = pending.pop()
+            if start == header:
+                continue
+            for predecessor in predecessors[start]:
+                if predecessor not in loop.body:
+                    loop.body.add(predecessor)
+                    pending.append(predecessor)
+
+    return list(result.values())
@@ -0,0 +1,223 @@
+import sys
+from typing import List, Dict, Optional
+
+import instructions
+from asm import assemble, write_lines
+from asm_line import AsmLine, Argument
+from util import parse_hex, parse_intel_hex
+
+HALT_PREFIX = 0xFF
+HALT_BRANCH = 0x9E
+DATA_REFERENCES = frozenset(['LDAM', 'LDBM', 'STAM'])
+
+
+class DisassemblyError(Exception):
+    pass
+
+
+def read_hex_file(filepath: str) -> List[int]:
+    with open(filepath, 'r') as file:
+        text = file.read()
+
+    if text.lstrip().startswith(':'):
+        return parse_intel_hex(text)
+
+    return parse_hex(text)
+
+
+def is_halt(machine_code: List[int], address: int) -> bool:
+    return machine_code[address] == HALT_PREFIX and \
+        address + 1 < len(machine_code) and machine_code[address + 1] == HALT_BRANCH
+
+
+def find_code(machine_code: List[int]) -> bytearray:
+    code = bytearray(len(machine_code))
+    pending = [0] if machine_code else []
+
+    while pending:
+        address = pending.pop()
+        start = address
+        operand = 0
+
+        while address < len(machine_code) and not code[address]:
+            code[address] = 1
+            decoded = instructions.DECODE_TABLE[machine_code[address]]
+            operand = ((operand << 4) | decoded.operand) & 0xFF
+            address += 1
+
+            if decoded.flags & instructions.PREFIX:
+                continue
+
+            if decoded.flags & instructions.RELATIVE:
+                target = (address + operand) & 0xFF
+                if target != start:
+                    pending.append(target)
+                if not decoded.flags & instructions.CONDITIONAL:
+                    break
+            elif decoded.flags & instructions.BRANCH:
+                break
+
+            start = address
+            operand = 0
+
+    return code
+
+
+def reference_value(machine_code: List[int], code: bytearray, address: int) -> int:
+    decoded = instructions.DECODE_TABLE[machine_code[address]]
+    operand = decoded.operand
+
+    if is_prefixed(machine_code, code, address):
+        operand |= (machine_code[address - 1] & 0xF) << 4
+
+    if decoded.flags & instructions.RELATIVE:
+        return (address + 1 + operand) & 0xFF
+
+    return operand
+
+
+def is_prefixed(machine_code: List[int], code: bytearray, address: int) -> bool:
+    return address > 0 and code[address - 1] and machine_code[address - 1] >> 4 == instructions.OPCODES['PFIX']
+
+
+def is_reference(decoded: instructions.Decoded) -> bool:
+    return bool(decoded.flags & instructions.RELATIVE) or decoded.mnemonic in DATA_REFERENCES
+
+
+def find_targets(machine_code: List[int], code: bytearray) -> Dict[int, str]:
+    result = {}
+
+    for address in range(len(machine_code)):
+        if not code[address]:
+            continue
+
+        decoded = instructions.DECODE_TABLE[machine_code[address]]
+
+        if not is_reference(decoded) or (address > 0 and is_halt(machine_code, address - 1)):
+            continue
+
+        target = reference_value(machine_code, code, address)
+
+        if target < len(machine_code) and target not in result:
+            kind = 'label' if decoded.flags & instructions.RELATIVE else 'data'
+            result[target] = f'.{kind}_{target:02X}'
+
+    return result
+
+
+def needs_prefix(machine_code: List[int], address: int, target: int) -> bool:
+    decoded = instructions.DECODE_TABLE[machine_code[address]]
+
+    if decoded.flags & instructions.RELATIVE:
+        value = target - (address + 1)
+    else:
+        value = target
+
+    return not 0 <= value <= 0xF
+
+
+def decode_line(machine_code: List[int], address: int, argument: Argument) -> AsmLine:
+    decoded = instructions.DECODE_TABLE[machine_code[address]]
+
+    if decoded.operand == 0 and not decoded.flags & (instructions.ABSOLUTE | instructions.RELATIVE | instructions.PREFIX):
+        argument = None
+
+    return AsmLine.from_instruction(decoded.mnemonic, argument)
+
+
+def disassemble(machine_code: List[int], fold_prefixes: bool = True) -> List[AsmLine]:
+    code = find_code(machine_code)
+    targets = find_targets(machine_code, code)
+    result = []
+    address = 0
+
+    while address < len(machine_code):
+        label = targets.get(address)
+        byte = machine_code[address]
+        decoded = instructions.DECODE_TABLE[byte]
+        size = 1
+
+        if not code[address]:
+            asm_line = AsmLine.from_data(Argument.from_immediate(byte))
+        elif is_halt(machine_code, address) and code[address + 1] and address + 1 not in targets:
+            asm_line = AsmLine.from_instruction('HALT', None)
+            size = 2
+        else:
+            asm_line = None
+            if fold_prefixes and decoded.flags & instructions.PREFIX:
+                asm_line = fold_prefix(machine_code, code, address, targets)
+            if asm_line is None:
+                asm_line = decode_argument(machine_code, code, address, targets)
+            else:
+                size = 2
+
+        asm_line.label = label
+        result.append(asm_line)
+        address += size
+
+    return result
+
+
+def fold_prefix(machine_code: List[int], code: bytearray, address: int, targets: Dict[int, str]) -> Optional[AsmLine]:
+    if address + 1 >= len(machine_code) or not code[address + 1] or address + 1 in targets:
+        return None
+
+    next_decoded = instructions.DECODE_TABLE[machine_code[address + 1]]
+
+    if not is_reference(next_decoded):
+        return None
+
+    target = reference_value(machine_code, code, address + 1)
+
+    if target not in targets or not needs_prefix(machine_code, address + 1, target):
+        return None
+
+    return AsmLine.from_instruction(next_decoded.mnemonic, Argument.from_label(targets[target]))
+
+
+def decode_argument(machine_code: List[int], code: bytearray, address: int, targets: Dict[int, str]) -> AsmLine:
+    decoded = instructions.DECODE_TABLE[machine_code[address]]
+
+    if is_reference(decoded) and not is_prefixed(machine_code, code, address):
+        target = reference_value(machine_code, code, address)
+        if target in targets:
+            return decode_line(machine_code, address, Argument.from_label(targets[target]))
+
+    return decode_line(machine_code, address, Argument.from_immediate(decoded.operand))
+
+
+def format_asm_line(asm_line: AsmLine) -> str:
+    mnemonic = 'DATA' if asm_line.is_data else asm_line.mnemonic
+
+    if asm_line.argument is None:
+        return mnemonic
+
+    return f'{mnemonic} {asm_line.argument}'
+
+
+def to_source(asm_lines: List[AsmLine]) -> List[str]:
+    result = []
+
+    for asm_line in asm_lines:
+        if asm_line.label is not None:
+            result.append(asm_line.label)
+        result.append(format_asm_line(asm_line))
+
+    return result
+
+
+def disassemble_to_source(machine_code: List[int]) -> List[str]:
+    source = to_source(disassemble(machine_code))
+
+    if assemble(source) != list(machine_code):
+        source = to_source(disassemble(machine_code, fold_prefixes=False))
+
+    if assemble(source) != list(machine_code):
+        raise DisassemblyError('Disassembled source does not reassemble to the same machine code.')
+
+    return source
+
+
+if __name__ == '__main__':
+    machine_code = read_hex_file(sys.argv[1])
+    write_lines(sys.stdout, disassemble_to_source(machine_code))
@@ -1,22 +1,63 @@
-MNEMONICS = [
-    'LDAM',
-    'LDBM',
-    'STAM',
-    'LDAC',
-    'LDBC',
-    'LDAP',
-    'LDAI',
-    'LDBI',
-    'STAI',
-    'BR',
-    'BRZ',
-    'BRN',
-    'BRB',
-    'ADD',
-    'SUB',
-    'PFIX',
+from typing import List, NamedTuple
+
+ABSOLUTE = 1 << 0
+RELATIVE = 1 << 1
+PREFIX = 1 << 2
+MEMORY = 1 << 3
+STORE = 1 << 4
+BRANCH = 1 << 5
+CONDITIONAL = 1 << 6
+
+SPEC = [
+    ('LDAM', ABSOLUTE | MEMORY),
+    ('LDBM', ABSOLUTE | MEMORY),
+    ('STAM', ABSOLUTE | MEMORY | STORE),
+    ('LDAC', ABSOLUTE),
+    ('LDBC', ABSOLUTE),
+    ('LDAP', ABSOLUTE),
+    ('LDAI', ABSOLUTE | MEMORY),
+    ('LDBI', ABSOLUTE | MEMORY),
+    ('STAI', ABSOLUTE | MEMORY | STORE),
+    ('BR', RELATIVE | BRANCH),
+    ('BRZ', RELATIVE | BRANCH | CONDITIONAL),
+    ('BRN', RELATIVE | BRANCH | CONDITIONAL),
+    ('BRB', ABSOLUTE | BRANCH),
+    ('ADD', 0),
+    ('SUB', 0),
+    ('PFIX', PREFIX),
 ]
 
+MNEMONICS = [mnemonic for mnemonic, _ in SPEC]
+
+OPCODES = {mnemonic: opcode for opcode, (mnemonic, _) in enumerate(SPEC)}
+
+FLAGS = {mnemonic: flags for mnemonic, flags in SPEC}
+
+RELATIVE_BRANCHES = frozenset(mnemonic for mnemonic, flags in SPEC if flags & RELATIVE)
+
+ABSOLUTE_OPERANDS = frozenset(mnemonic for mnemonic, flags in SPEC if flags & ABSOLUTE)
+
 ALIASES = {
     'HALT': ['PFIX 0xF', 'BR 0xE']
 }
+
+
+class Decoded(NamedTuple):
+    opcode: int
+    operand: int
+    mnemonic: str
+    flags: int
+
+
+def build_decode_table() -> List[Decoded]:
+    result = []
+
+    for byte in range(256):
+        opcode = byte >> 4
+        mnemonic, flags = SPEC[opcode]
+        result.append(Decoded(opcode, byte & 0xF, mnemonic, flags))
+
+    return result
+
+
+DECODE_TABLE = build_decode_table()
@@ -0,0 +1,421 @@
+import argparse
+import sys
+from typing import List, Dict, Optional, Iterable, Tuple, Set
+
+from asm import assemble_asm_lines, iter_code_lines, read_file_lines, write_lines, write_file
+from asm_line import AsmLine, Argument, asm_lines_to_machine_code
+from disasm import to_source
+from parser import iter_numbered_asm_lines
+from passes import Program
+from peephole import iter_pinned_spans
+from sim import Machine, DEFAULT_MAX_CYCLES, OPCODE_TABLE, PFIX
+from symbol_table import SymbolTable
+
+BRANCHES = frozenset(['BR', 'BRZ', 'BRN', 'BRB'])
+UNCONDITIONAL = frozenset(['BR', 'BRB'])
+LOOP_WEIGHT = 8
+LABEL_PREFIX = '.layout_'
+
+Edges = Dict[Tuple[int, int], float]
+
+
+class LayoutBlock:
+    index: int
+    segment: int
+    first: int
+    last: int
+    fallthrough: Optional[int]
+    jump: Optional[int]
+    target: Optional[int]
+
+    def __init__(self, index: int, segment: int, first: int):
+        self.index = index
+        self.segment = segment
+        self.first = first
+        self.last = first
+        self.fallthrough = None
+        self.jump = None
+        self.target = None
+
+    def __repr__(self) -> str:
+        return f'block {self.index} lines {self.first}-{self.last}'
+
+
+class LayoutStatistics:
+    moved: int
+    removed_branches: int
+    added_branches: int
+    fixed_segments: int
+    kept_original: bool
+
+    def __init__(self):
+        self.moved = 0
+        self.removed_branches = 0
+        self.added_branches = 0
+        self.fixed_segments = 0
+        self.kept_original = False
+
+    def revert(self) -> None:
+        self.moved = 0
+        self.removed_branches = 0
+        self.added_branches = 0
+        self.kept_original = True
+
+    def __repr__(self) -> str:
+        if self.kept_original:
+            return 'layout: no faster order found, original layout kept'
+        return f'layout: {self.moved} blocks moved, {self.removed_branches} branches removed, ' \
+               f'{self.added_branches} branches added, {self.fixed_segments} segments kept in place'
+
+
+def parse_source(asm_code: Iterable[str]) -> List[AsmLine]:
+    return list(iter_numbered_asm_lines(iter_code_lines(asm_code)))
+
+
+def ends_block(asm_line: AsmLine) -> bool:
+    return not asm_line.is_data and asm_line.mnemonic in BRANCHES
+
+
+def label_target(asm_line: AsmLine, symbol_table: SymbolTable) -> Optional[int]:
+    argument = asm_line.argument
+    if argument is None or not argument.is_label() or argument.offset != 0:
+        return None
+    return symbol_table.index_of(argument.label)
+
+
+def split_blocks(asm_lines: List[AsmLine]) -> Tuple[List[LayoutBlock], Set[int]]:
+    blocks = []
+    fixed = set()
+    segment = -1
+    block = None
+
+    for i, asm_line in enumerate(asm_lines):
+        if asm_line.is_data:
+            block = None
+            continue
+
+        prefixed = i > 0 and asm_lines[i - 1].is_prefix()
+
+        if block is None:
+            segment += 1
+
+        if prefixed and asm_line.label is not None:
+            fixed.add(segment)
+
+        if block is None or (asm_line.label is not None and not prefixed) or ends_block(asm_lines[i - 1]):
+            block = LayoutBlock(len(blocks), segment, i)
+            blocks.append(block)
+        else:
+            block.last = i
+
+    return blocks, fixed
+
+
+def link_blocks(asm_lines: List[AsmLine], blocks: List[LayoutBlock], fixed: Set[int],
+                symbol_table: SymbolTable) -> None:
+    block_at = {block.first: block.index for block in blocks}
+
+    for block in blocks:
+        last = asm_lines[block.last]
+        target = label_target(last, symbol_table) if last.is_relative_branch() else None
+
+        if target is not None and target in block_at and blocks[block_at[target]].segment == block.segment:
+            block.target = block_at[target]
+            if last.mnemonic == 'BR':
+                block.jump = block.target
+
+        if last.mnemonic in UNCONDITIONAL:
+            continue
+
+        following = block_at.get(block.last + 1)
+
+        if following is None or blocks[following].segment != block.segment:
+            fixed.add(block.segment)
+        else:
+            block.fallthrough = following
+
+
+def fix_pinned_segments(asm_lines: List[AsmLine], blocks: List[LayoutBlock], fixed: Set[int],
+                        symbol_table: SymbolTable) -> None:
+    segment_heads = {block.index for block in blocks if block.index == 0 or blocks[block.index - 1].segment != block.segment}
+
+    for first, last in iter_pinned_spans(asm_lines, symbol_table):
+        first, last = min(first, last), max(first, last)
+
+        for block in blocks:
+            overlaps = block.first <= last and first <= block.last
+            contained = block.first <= first and last <= block.last
+            if overlaps and not contained and block.index not in segment_heads:
+                fixed.add(block.segment)
+
+
+def analyse_blocks(asm_lines: List[AsmLine]) -> Tuple[List[LayoutBlock], Set[int]]:
+    symbol_table = SymbolTable.from_asm_lines(asm_lines)
+    blocks, fixed = split_blocks(asm_lines)
+    link_blocks(asm_lines, blocks, fixed, symbol_table)
+    fix_pinned_segments(asm_lines, blocks, fixed, symbol_table)
+    return blocks, fixed
+
+
+def static_edges(blocks: List[LayoutBlock]) -> Edges:
+    back_edges = [(blocks[block.target].first, block.last) for block in blocks
+                  if block.target is not None and blocks[block.target].first <= block.first]
+    result = {}
+
+    for block in blocks:
+        depth = sum(1 for first, last in back_edges if first <= block.first <= last)
+        successors = [successor for successor in (block.fallthrough, block.target) if successor is not None]
+
+        for successor in successors:
+            result[(block.index, successor)] = LOOP_WEIGHT ** depth / len(successors)
+
+    return result
+
+
+def source_indices(assembled: List[AsmLine]) -> Dict[int, int]:
+    result = {}
+    index = 0
+
+    for asm_line in assembled:
+        result[asm_line.address] = index
+        if not asm_line.synthetic:
+            index += 1
+
+    return result
+
+
+def profile_edges(asm_code: Iterable[str], blocks: List[LayoutBlock],
+                  max_cycles: int = DEFAULT_MAX_CYCLES) -> Edges:
+    assembled = assemble_asm_lines(asm_code)
+    line_of = source_indices(assembled)
+    first_of = {block.first: block.index for block in blocks}
+    last_of = {block.last: block.index for block in blocks}
+    machine = Machine(asm_lines_to_machine_code(assembled))
+    result = {}
+
+    while not machine.halted and machine.cycles < max_cycles:
+        start = machine.start
+        prefix = OPCODE_TABLE[machine.memory[machine.pc]] == PFIX
+        machine.step()
+
+        if prefix:
+            continue
+
+        source = last_of.get(line_of.get(start))
+        destination = first_of.get(line_of.get(machine.pc))
+
+        if source is not None and destination is not None:
+            result[(source, destination)] = result.get((source, destination), 0) + 1
+
+    return result
+
+
+def chain_segment(blocks: List[LayoutBlock], segment: List[int], edges: Edges) -> List[int]:
+    members = set(segment)
+    chains = {index: [index] for index in segment}
+    heat = {index: 0.0 for index in segment}
+
+    for (source, destination), weight in edges.items():
+        if destination in heat:
+            heat[destination] += weight
+
+    for (source, destination), weight in sorted(edges.items(), key=lambda edge: (-edge[1], edge[0])):
+        if source not in members or destination not in members or destination == segment[0]:
+            continue
+
+        block = blocks[source]
+
+        if destination not in (block.fallthrough, block.jump):
+            continue
+
+        source_chain = chains[source]
+        destination_chain = chains[destination]
+
+        if source_chain is destination_chain or source_chain[-1] != source or destination_chain[0] != destination:
+            continue
+
+        source_chain.extend(destination_chain)
+        for index in destination_chain:
+            chains[index] = source_chain
+
+    result = []
+    seen = set()
+    ordered_chains = []
+
+    for index in segment:
+        chain = chains[index]
+        if id(chain) not in seen:
+            seen.add(id(chain))
+            ordered_chains.append(chain)
+
+    ordered_chains.sort(key=lambda chain: (chain[0] != segment[0], -max(heat[index] for index in chain)))
+
+    for chain in ordered_chains:
+        result.extend(chain)
+
+    return result
+
+
+class LabelAllocator:
+    symbol_table: SymbolTable
+    prefix: str
+    count: int
+
+    def __init__(self, symbol_table: SymbolTable, prefix: str = LABEL_PREFIX):
+        self.symbol_table = symbol_table
+        self.prefix = prefix
+        self.count = 0
+
+    def label_of(self, asm_line: AsmLine) -> str:
+        while asm_line.label is None:
+            label = f'{self.prefix}{self.count}'
+            self.count += 1
+            if label not in self.symbol_table:
+                asm_line.label = label
+        return asm_line.label
+
+
+def emit_segment(asm_lines: List[AsmLine], blocks: List[LayoutBlock], segment: List[int], order: List[int],
+                 labels: LabelAllocator, statistics: LayoutStatistics) -> List[AsmLine]:
+    following_of = {index: following for index, following in zip(order, order[1:] + [None])}
+    dropped = set()
+
+    for index in order:
+        block = blocks[index]
+        if block.jump is not None and block.jump == following_of[index] and \
+                (asm_lines[block.last].label is None or block.first < block.last):
+            dropped.add(index)
+
+    def entry_line(index: int) -> AsmLine:
+        while index in dropped and blocks[index].first == blocks[index].last:
+            index = blocks[index].jump
+        return asm_lines[blocks[index].first]
+
+    result = []
+
+    for position, index in enumerate(order):
+        block = blocks[index]
+        block_lines = asm_lines[block.first:block.last + 1]
+        last = block_lines[-1]
+
+        if index != segment[position]:
+            statistics.moved += 1
+
+        if index in dropped:
+            block_lines = block_lines[:-1]
+            statistics.removed_branches += 1
+        elif block.fallthrough is not None and block.fallthrough != following_of[index]:
+            branch = AsmLine.from_instruction('BR', Argument.from_label(labels.label_of(entry_line(block.fallthrough))))
+            branch.source_line = last.source_line
+            block_lines = block_lines + [branch]
+            statistics.added_branches += 1
+
+        result.extend(block_lines)
+
+    return result
+
+
+def layout(asm_lines: List[AsmLine], edges: Optional[Edges] = None,
+           statistics: Optional[LayoutStatistics] = None) -> List[AsmLine]:
+    if statistics is None:
+        statistics = LayoutStatistics()
+
+    blocks, fixed = analyse_blocks(asm_lines)
+
+    if edges is None:
+        edges = static_edges(blocks)
+
+    labels = LabelAllocator(SymbolTable.from_asm_lines(asm_lines))
+    segments = {}
+    segment_at = {}
+
+    for block in blocks:
+        segments.setdefault(block.segment, []).append(block.index)
+        segment_at[block.first] = block.segment
+
+    statistics.fixed_segments = len(fixed)
+    result = []
+    i = 0
+
+    while i < len(asm_lines):
+        if asm_lines[i].is_data:
+            result.append(asm_lines[i])
+            i += 1
+            continue
+
+        segment = segments[segment_at[i]]
+        end = blocks[segment[-1]].last + 1
+
+        if segment_at[i] in fixed:
+            result.extend(asm_lines[i:end])
+        else:
+            order = chain_segment(blocks, segment, edges)
+            result.extend(emit_segment(asm_lines, blocks, segment, order, labels, statistics))
+
+        i = end
+
+    return result
+
+
+def layout_pass(program: Program) -> int:
+    statistics = LayoutStatistics()
+    program.asm_lines = layout(program.asm_lines, statistics=statistics)
+    return statistics.moved
+
+
+def profile_guided_layout(asm_code: List[str],
+                          max_cycles: int = DEFAULT_MAX_CYCLES) -> Tuple[List[AsmLine], LayoutStatistics]:
+    blocks, _ = analyse_blocks(parse_source(asm_code))
+    best_cycles = run_cycles(asm_code, max_cycles)[1]
+    result = parse_source(asm_code)
+    statistics = LayoutStatistics()
+    statistics.revert()
+
+    for edges in (profile_edges(asm_code, blocks, max_cycles), static_edges(blocks)):
+        candidate_statistics = LayoutStatistics()
+        candidate = layout(parse_source(asm_code), edges, candidate_statistics)
+        cycles = run_cycles(to_source(candidate), max_cycles)[1]
+
+        if cycles < best_cycles:
+            best_cycles = cycles
+            result = candidate
+            statistics = candidate_statistics
+
+    return result, statistics
+
+
+def run_cycles(asm_code: List[str], max_cycles: int = DEFAULT_MAX_CYCLES) -> Tuple[int, int]:
+    machine_code = asm_lines_to_machine_code(assemble_asm_lines(asm_code))
+    machine = Machine(machine_code)
+    machine.run(max_cycles)
+    return len(machine_code), machine.cycles
+
+
+if __name__ == '__main__':
+    argument_parser = argparse.ArgumentParser(description='Reorder basic blocks so hot paths fall through.')
+    argument_parser.add_argument('source')
+    argument_parser.add_argument('-o', '--output', help='write the reordered source to this file')
+    argument_parser.add_argument('--static', action='store_true', help='use loop-depth heuristics instead of a profile run')
+    argument_parser.add_argument('--max-cycles', type=int, default=DEFAULT_MAX_CYCLES)
+    arguments = argument_parser.parse_args()
+
+    asm_code = read_file_lines(arguments.source)
+
+    if arguments.static:
+        layout_statistics = LayoutStatistics()
+        laid_out = layout(parse_source(asm_code), statistics=layout_statistics)
+    else:
+        laid_out, layout_statistics = profile_guided_layout(asm_code, arguments.max_cycles)
+
+    source = to_source(laid_out)
+    size_before, cycles_before = run_cycles(asm_code, arguments.max_cycles)
+    size_after, cycles_after = run_cycles(source, arguments.max_cycles)
+
+    write_lines(sys.stdout, [
+        repr(layout_statistics),
+        f'size: {size_before} -> {size_after} bytes',
+        f'cycles: {cycles_before} -> {cycles_after}',
+    ])
+
+    if arguments.output is not None:
+        write_file(arguments.output, source)
@@ -1,7 +1,9 @@
-from typing import List, Optional
+import sys
+from typing import List, Optional, Iterable, Iterator, Tuple
 
 import instructions
 from asm_line import Argument, AsmLine
+from tracing import TRACER, span, count
 
 
 class ParseError(Exception):
@@ -20,14 +22,14 @@ def parse_argument(line: str) -> Optional[Argument]:
     elif len(split_line) == 2:
         argument = split_line[1]
         if is_label(argument):
-            return Argument.from_label(argument)
+            return Argument.from_label(sys.intern(argument))
         else:
             if is_hex(argument):
                 return Argument.from_immediate(int(argument[2:], 16))
             else:
                 return Argument.from_immediate(int(argument, 10))
     elif len(split_line) == 4:
-        label = split_line[1]
+        label = sys.intern(split_line[1])
         if not is_label(label):
             raise ParseError(f'Token {label} is not a valid label.')
         sign = split_line[2]
@@ -49,7 +51,7 @@ def is_data(line: str) -> bool:
 
 
 def is_instruction(line: str) -> bool:
-    return line.split(' ')[0] in instructions.MNEMONICS
+    return parse_mnemonic(line) in instructions.OPCODES
 
 
 def is_alias(line: str) -> bool:
@@ -57,41 +59,64 @@ def is_alias(line: str) -> bool:
 
 
 def parse_mnemonic(instruction: str) -> str:
-    return instruction.split(' ')[0]
+    return instruction.partition(' ')[0]
 
 
 def is_relative_branch(mnemonic: str) -> bool:
-    return mnemonic in ['BR', 'BRZ', 'BRN']
+    return mnemonic in instructions.RELATIVE_BRANCHES
 
 
-def parse_asm_lines(lines: List[str]) -> List[AsmLine]:
-    result = []
+def iter_numbered_asm_lines(numbered_lines: Iterable[Tuple[int, str]]) -> Iterator[AsmLine]:
     label = None
 
-    for line in lines:
-        if is_instruction(line):
-            mnemonic = parse_mnemonic(line)
+    for line_number, line in numbered_lines:
+        mnemonic = parse_mnemonic(line)
+
+        if mnemonic in instructions.OPCODES:
             argument = parse_argument(line)
             asm_line = AsmLine.from_instruction(mnemonic, argument)
+            asm_line.source_line = line_number
             if label is not None:
                 asm_line.label = label
-            result.append(asm_line)
+            yield asm_line
             label = None
         elif is_data(line):
             asm_line = AsmLine.from_data(parse_argument(line))
+            asm_line.source_line = line_number
             if label is not None:
                 asm_line.label = label
-            result.append(asm_line)
+            yield asm_line
             label = None
         elif is_label(line):
-            label = line
+            label = sys.intern(line)
         elif is_alias(line):
             alias_lines = instructions.ALIASES[line]
-            alias_asm_lines = parse_asm_lines(alias_lines)
+            alias_asm_lines = list(iter_asm_lines(alias_lines))
             if label is not None:
                 alias_asm_lines[0].label = label
-            result.extend(alias_asm_lines)
+            for asm_line in alias_asm_lines:
+                asm_line.source_line = line_number
+            yield from alias_asm_lines
+            label = None
         else:
             raise ParseError(f'Unrecognized line {line}')
 
-    return result
\ No newline at end of file
+
+def iter_asm_lines(lines: Iterable[str]) -> Iterator[AsmLine]:
+    return iter_numbered_asm_lines(enumerate(lines, 1))
+
+
+def parse_asm_lines(lines: Iterable[str]) -> List[AsmLine]:
+    with span('parse_asm_lines', 'parse'):
+        result = list(iter_asm_lines(lines))
+
+    count_parsed(result)
+    return result
+
+
+def count_parsed(asm_lines: List[AsmLine]) -> None:
+    if not TRACER.enabled:
+        return
+
+    count('lines', len(asm_lines))
+    count('labels', sum(1 for asm_line in asm_lines if asm_line.label is not None))
@@ -0,0 +1,154 @@
+import time
+import tracemalloc
+from typing import Callable, List, Optional, Iterable
+
+from asm_line import AsmLine
+from symbol_table import SymbolTable
+from tracing import span
+
+ADDRESSES = 'addresses'
+SYMBOLS = 'symbols'
+
+
+class PassError(Exception):
+    pass
+
+
+class Program:
+    asm_lines: List[AsmLine]
+
+    def __init__(self, asm_lines: List[AsmLine]):
+        self.asm_lines = asm_lines
+        self._symbol_table = None
+        self.addressed = False
+
+    @property
+    def symbol_table(self) -> SymbolTable:
+        if self._symbol_table is None:
+            self._symbol_table = SymbolTable.from_asm_lines(self.asm_lines)
+        return self._symbol_table
+
+    def invalidate(self, analyses: Iterable[str]) -> None:
+        for analysis in analyses:
+            if analysis == SYMBOLS:
+                self._symbol_table = None
+            elif analysis == ADDRESSES:
+                self.addressed = False
+            else:
+                raise PassError(f'Unknown analysis {analysis}.')
+
+
+class Pass:
+    name: str
+    function: Callable[[Program], Optional[int]]
+    invalidates: List[str]
+    config: str
+
+    def __init__(self, name: str, function: Callable[[Program], Optional[int]], invalidates: Iterable[str] = (),
+                 config: str = ''):
+        self.name = name
+        self.function = function
+        self.invalidates = list(invalidates)
+        self.config = config
+
+
+class PassStatistics:
+    name: str
+    seconds: float
+    lines: int
+    touched: Optional[int]
+    allocated_bytes: Optional[int]
+    peak_bytes: Optional[int]
+
+    def __init__(self, name: str, seconds: float, lines: int, touched: Optional[int],
+                 allocated_bytes: Optional[int] = None, peak_bytes: Optional[int] = None):
+        self.name = name
+        self.seconds = seconds
+        self.lines = lines
+        self.touched = touched
+        self.allocated_bytes = allocated_bytes
+        self.peak_bytes = peak_bytes
+
+    def __repr__(self) -> str:
+        touched = '-' if self.touched is None else self.touched
+        result = f'{self.name}: {self.seconds * 1000:.3f} ms, {self.lines} lines, {touched} touched'
+        if self.allocated_bytes is not None:
+            result += f', {self.allocated_bytes} B allocated, {self.peak_bytes} B peak'
+        return result
+
+
+class PassManager:
+    passes: List[Pass]
+    statistics: List[PassStatistics]
+
+    def __init__(self, trace_allocations: bool = False):
+        self.passes = []
+        self.statistics = []
+        self.trace_allocations = trace_allocations
+
+    def names(self) -> List[str]:
+        return [pass_.name for pass_ in self.passes]
+
+    def index_of(self, name: str) -> int:
+        for i, pass_ in enumerate(self.passes):
+            if pass_.name == name:
+                return i
+        raise PassError(f'Unknown pass {name}.')
+
+    def add(self, name: str, function: Callable[[Program], Optional[int]], invalidates: Iterable[str] = (),
+            before: Optional[str] = None, after: Optional[str] = None, config: str = '') -> None:
+        if name in self.names():
+            raise PassError(f'Pass {name} is already registered.')
+
+        pass_ = Pass(name, function, invalidates, config)
+
+        if before is not None:
+            self.passes.insert(self.index_of(before), pass_)
+        elif after is not None:
+            self.passes.insert(self.index_of(after) + 1, pass_)
+        else:
+            self.passes.append(pass_)
+
+    def remove(self, name: str) -> None:
+        del self.passes[self.index_of(name)]
+
+    def run(self, program: Program) -> Program:
+        self.statistics = []
+        started_tracing = self.trace_allocations and not tracemalloc.is_tracing()
+
+        if started_tracing:
+            tracemalloc.start()
+
+        try:
+            for pass_ in self.passes:
+                self.statistics.append(self.run_pass(pass_, program))
+        finally:
+            if started_tracing:
+                tracemalloc.stop()
+
+        return program
+
+    def run_pass(self, pass_: Pass, program: Program) -> PassStatistics:
+        allocated_bytes = None
+        peak_bytes = None
+
+        if self.trace_allocations:
+            tracemalloc.reset_peak()
+            memory_before, _ = tracemalloc.get_traced_memory()
+
+        start = time.perf_counter()
+        with span(pass_.name, 'pass'):
+            touched = pass_.function(program)
+        seconds = time.perf_counter() - start
+
+        if self.trace_allocations:
+            memory_after, peak = tracemalloc.get_traced_memory()
+            allocated_bytes = memory_after - memory_before
+            peak_bytes = peak - memory_before
+
+        program.invalidate(pass_.invalidates)
+
+        return PassStatistics(pass_.name, seconds, len(program.asm_lines), touched, allocated_bytes, peak_bytes)
+
+    def report(self) -> List[str]:
+        return [repr(statistics) for statistics in self.statistics]
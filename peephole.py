@@ -0,0 +1,302 @@
+import sys
+from typing import List, Dict, Optional, Callable, Tuple, Iterator
+
+from asm import default_pipeline, assemble, read_file_lines, write_lines, fits_four_bits
+from asm_line import AsmLine, Argument
+from passes import PassManager, Program, SYMBOLS
+from sim import Machine
+from symbol_table import SymbolTable
+
+LOADS_A = frozenset(['LDAM', 'LDAC', 'LDAP', 'LDAI'])
+OVERWRITES_A = frozenset(['LDAM', 'LDAC', 'LDAP'])
+LOADS_B = frozenset(['LDBM', 'LDBC', 'LDBI'])
+OVERWRITES_B = frozenset(['LDBM', 'LDBC'])
+FIXED_ADDRESSES = frozenset(['LDAM', 'LDBM', 'STAM', 'BRB'])
+RELATIVE_OPERANDS = frozenset(['BR', 'BRZ', 'BRN', 'LDAP'])
+
+
+class PeepholeContext:
+    asm_lines: List[AsmLine]
+    symbol_table: SymbolTable
+    pinned: bytearray
+
+    def __init__(self, asm_lines: List[AsmLine]):
+        self.asm_lines = asm_lines
+        self.symbol_table = SymbolTable.from_asm_lines(asm_lines)
+        self.pinned = find_pinned(asm_lines, self.symbol_table)
+
+    def line(self, i: int) -> Optional[AsmLine]:
+        if 0 <= i < len(self.asm_lines):
+            return self.asm_lines[i]
+        return None
+
+    def is_prefixed(self, i: int) -> bool:
+        previous = self.line(i - 1)
+        return previous is not None and previous.is_prefix()
+
+    def is_plain(self, i: int, mnemonics: frozenset) -> bool:
+        asm_line = self.line(i)
+        return asm_line is not None and not asm_line.is_data and asm_line.mnemonic in mnemonics and \
+            not self.pinned[i] and not self.is_prefixed(i)
+
+    def can_remove(self, i: int) -> bool:
+        asm_line = self.asm_lines[i]
+
+        if asm_line.label is None:
+            return True
+
+        following = self.line(i + 1)
+        return following is not None and following.label is None and not self.pinned[i + 1]
+
+    def remove(self, i: int) -> None:
+        asm_line = self.asm_lines.pop(i)
+        if asm_line.label is not None:
+            self.asm_lines[i].label = asm_line.label
+
+    def target_index(self, asm_line: AsmLine) -> Optional[int]:
+        argument = asm_line.argument
+        if argument is None or not argument.is_label() or argument.offset != 0:
+            return None
+        return self.symbol_table.index_of(argument.label)
+
+
+def pin(pinned: bytearray, first: int, last: int) -> None:
+    for i in range(max(min(first, last), 0), min(max(first, last) + 1, len(pinned))):
+        pinned[i] = 1
+
+
+def signed_byte(value: int) -> int:
+    return value - 0x100 if value & 0x80 else value
+
+
+def iter_pinned_spans(asm_lines: List[AsmLine], symbol_table: SymbolTable) -> Iterator[Tuple[int, int]]:
+    for i, asm_line in enumerate(asm_lines):
+        argument = asm_line.argument
+
+        if argument is None:
+            continue
+
+        if argument.is_label():
+            label_index = symbol_table.index_of(argument.label)
+            if argument.offset != 0:
+                yield label_index, label_index + argument.offset
+            if asm_line.is_data or not asm_line.is_relative_branch():
+                yield label_index, label_index
+        elif asm_line.mnemonic in FIXED_ADDRESSES:
+            yield 0, argument.immediate
+        elif asm_line.mnemonic in RELATIVE_OPERANDS:
+            value = argument.immediate
+            if i > 0 and asm_lines[i - 1].is_prefix() and not asm_lines[i - 1].argument.is_label():
+                value = signed_byte(((asm_lines[i - 1].argument.immediate << 4) | value) & 0xFF)
+            yield i - 1, i + 1 + value
+
+
+def find_pinned(asm_lines: List[AsmLine], symbol_table: SymbolTable) -> bytearray:
+    result = bytearray(len(asm_lines))
+
+    for first, last in iter_pinned_spans(asm_lines, symbol_table):
+        pin(result, first, last)
+
+    return result
+
+
+def remove_redundant_store(context: PeepholeContext, i: int) -> Optional[int]:
+    store = context.line(i + 1)
+
+    if not context.is_plain(i, frozenset(['LDAM'])) or not context.is_plain(i + 1, frozenset(['STAM'])):
+        return None
+
+    if store.label is not None or store.argument != context.asm_lines[i].argument:
+        return None
+
+    context.remove(i + 1)
+    return 1
+
+
+def remove_redundant_load(context: PeepholeContext, i: int) -> Optional[int]:
+    load = context.line(i + 1)
+
+    if not context.is_plain(i, frozenset(['STAM'])) or not context.is_plain(i + 1, frozenset(['LDAM'])):
+        return None
+
+    if load.label is not None or load.argument != context.asm_lines[i].argument:
+        return None
+
+    context.remove(i + 1)
+    return 1
+
+
+def remove_dead_load(context: PeepholeContext, i: int) -> Optional[int]:
+    following = context.line(i + 1)
+
+    if following is None or following.label is not None:
+        return None
+
+    dead_a = context.is_plain(i, LOADS_A) and context.is_plain(i + 1, OVERWRITES_A)
+    dead_b = context.is_plain(i, LOADS_B) and context.is_plain(i + 1, OVERWRITES_B)
+
+    if not (dead_a or dead_b) or not context.can_remove(i):
+        return None
+
+    context.remove(i)
+    return 1
+
+
+def remove_branch_to_next(context: PeepholeContext, i: int) -> Optional[int]:
+    if not context.is_plain(i, RELATIVE_OPERANDS - {'LDAP'}):
+        return None
+
+    if context.target_index(context.asm_lines[i]) != i + 1 or not context.can_remove(i):
+        return None
+
+    context.remove(i)
+    return 1
+
+
+def final_target(context: PeepholeContext, label: str) -> Optional[str]:
+    visited = {label}
+
+    while True:
+        target = context.symbol_table.index_of(label)
+
+        if not context.is_plain(target, frozenset(['BR'])) or context.target_index(context.asm_lines[target]) is None:
+            return label
+
+        label = context.asm_lines[target].argument.label
+
+        if label in visited:
+            return None
+
+        visited.add(label)
+
+
+def thread_jump(context: PeepholeContext, i: int) -> Optional[int]:
+    asm_line = context.asm_lines[i]
+
+    if not context.is_plain(i, RELATIVE_OPERANDS - {'LDAP'}) or context.target_index(asm_line) is None:
+        return None
+
+    label = final_target(context, asm_line.argument.label)
+
+    if label is None or label == asm_line.argument.label or label == asm_line.label:
+        return None
+
+    old_displacement = context.target_index(asm_line) - (i + 1)
+    new_displacement = context.symbol_table.index_of(label) - (i + 1)
+
+    if not fits_four_bits(new_displacement) and \
+            (fits_four_bits(old_displacement) or abs(new_displacement) > abs(old_displacement)):
+        return None
+
+    asm_line.argument = Argument.from_label(label)
+    return 0
+
+
+def remove_zero_prefix(context: PeepholeContext, i: int) -> Optional[int]:
+    asm_line = context.asm_lines[i]
+
+    if not context.is_plain(i, frozenset(['PFIX'])) or asm_line.argument.is_label() or asm_line.argument.immediate != 0:
+        return None
+
+    if not context.can_remove(i):
+        return None
+
+    context.remove(i)
+    return 1
+
+
+Rule = Callable[[PeepholeContext, int], Optional[int]]
+
+RULES: List[Tuple[str, Rule]] = [
+    ('redundant_store', remove_redundant_store),
+    ('redundant_load', remove_redundant_load),
+    ('dead_load', remove_dead_load),
+    ('branch_to_next', remove_branch_to_next),
+    ('thread_jump', thread_jump),
+    ('zero_prefix', remove_zero_prefix),
+]
+
+
+class PeepholeStatistics:
+    applied: Dict[str, int]
+    bytes_saved: int
+    cycles_saved: int
+
+    def __init__(self):
+        self.applied = {}
+        self.bytes_saved = 0
+        self.cycles_saved = 0
+
+    def record(self, name: str, removed: int) -> None:
+        self.applied[name] = self.applied.get(name, 0) + 1
+        self.bytes_saved += removed
+        self.cycles_saved += max(removed, 1)
+
+    def __repr__(self) -> str:
+        rules = ', '.join(f'{name} x{count}' for name, count in self.applied.items())
+        return f'peephole: {self.bytes_saved} bytes, ~{self.cycles_saved} cycles saved ({rules or "nothing applied"})'
+
+
+def apply_first_rule(context: PeepholeContext, rules: List[Tuple[str, Rule]],
+                     statistics: PeepholeStatistics) -> bool:
+    for i in range(len(context.asm_lines)):
+        for name, rule in rules:
+            removed = rule(context, i)
+            if removed is not None:
+                statistics.record(name, removed)
+                return True
+    return False
+
+
+def optimise(asm_lines: List[AsmLine], rules: Optional[List[Tuple[str, Rule]]] = None,
+             statistics: Optional[PeepholeStatistics] = None) -> List[AsmLine]:
+    if rules is None:
+        rules = RULES
+
+    if statistics is None:
+        statistics = PeepholeStatistics()
+
+    while apply_first_rule(PeepholeContext(asm_lines), rules, statistics):
+        pass
+
+    return asm_lines
+
+
+class PeepholePass:
+    rules: List[Tuple[str, Rule]]
+    statistics: PeepholeStatistics
+
+    def __init__(self, rules: Optional[List[Tuple[str, Rule]]] = None):
+        self.rules = RULES if rules is None else rules
+        self.statistics = PeepholeStatistics()
+
+    def __call__(self, program: Program) -> int:
+        self.statistics = PeepholeStatistics()
+        optimise(program.asm_lines, self.rules, self.statistics)
+        return self.statistics.bytes_saved
+
+
+def optimising_pipeline(trace_allocations: bool = False) -> PassManager:
+    pipeline = default_pipeline(trace_allocations)
+    pipeline.add('peephole', PeepholePass(), invalidates=[SYMBOLS], before='relax_prefixes')
+    return pipeline
+
+
+def run_cycles(machine_code: List[int]) -> int:
+    machine = Machine(machine_code)
+    machine.run()
+    return machine.cycles
+
+
+if __name__ == '__main__':
+    asm_code = read_file_lines(sys.argv[1])
+    pipeline = optimising_pipeline()
+    original = assemble(asm_code)
+    optimised = assemble(asm_code, pipeline)
+    peephole = pipeline.passes[pipeline.index_of('peephole')].function
+
+    write_lines(sys.stdout, [
+        repr(peephole.statistics),
+        f'size: {len(original)} -> {len(optimised)} bytes',
+        f'cycles: {run_cycles(original)} -> {run_cycles(optimised)}',
+    ])
@@ -0,0 +1,338 @@
+import argparse
+import sys
+from typing import List, Dict, Optional, Iterable, Tuple
+
+import instructions
+from asm import assemble_asm_lines, read_file_lines, write_lines, write_file
+from asm_line import AsmLine, Argument, asm_lines_to_machine_code
+from disasm import to_source
+from layout import parse_source, source_indices, run_cycles, LabelAllocator, LOOP_WEIGHT, UNCONDITIONAL
+from passes import Program
+from peephole import iter_pinned_spans, FIXED_ADDRESSES
+from profiler import profile
+from sim import DEFAULT_MAX_CYCLES
+from symbol_table import SymbolTable
+
+PREFIX_FREE_END = 0xF
+DIRECT = frozenset(['LDAM', 'LDBM', 'STAM'])
+ENTRY_PREFIX = '.entry_'
+
+
+class DataUnit:
+    first: int
+    last: int
+    weight: float
+    pinned: bool
+
+    def __init__(self, first: int, last: int):
+        self.first = first
+        self.last = last
+        self.weight = 0.0
+        self.pinned = False
+
+    def size(self) -> int:
+        return self.last - self.first + 1
+
+    def indices(self) -> range:
+        return range(self.first, self.last + 1)
+
+    def __repr__(self) -> str:
+        return f'data {self.first}-{self.last} weight {self.weight}{" pinned" if self.pinned else ""}'
+
+
+class PlacementStatistics:
+    hot_lines: int
+    moved_lines: int
+    cost_before: float
+    cost_after: float
+    changed: bool
+
+    def __init__(self):
+        self.hot_lines = 0
+        self.moved_lines = 0
+        self.cost_before = 0.0
+        self.cost_after = 0.0
+        self.changed = False
+
+    def __repr__(self) -> str:
+        if not self.changed:
+            return f'placement: data kept in place (weighted prefix cost {self.cost_before:g})'
+        return f'placement: {self.hot_lines} hot data lines below 0x10, {self.moved_lines} lines moved, ' \
+               f'weighted prefix cost {self.cost_before:g} -> {self.cost_after:g}'
+
+
+def loop_depths(asm_lines: List[AsmLine], symbol_table: SymbolTable) -> List[int]:
+    result = [0] * len(asm_lines)
+
+    for i, asm_line in enumerate(asm_lines):
+        argument = asm_line.argument
+
+        if not asm_line.is_relative_branch() or argument is None or not argument.is_label():
+            continue
+
+        target = symbol_table.index_of(argument.label) + argument.offset
+
+        for j in range(max(target, 0), i + 1):
+            result[j] += 1
+
+    return result
+
+
+def static_line_weights(asm_lines: List[AsmLine]) -> List[float]:
+    return [LOOP_WEIGHT ** depth for depth in loop_depths(asm_lines, SymbolTable.from_asm_lines(asm_lines))]
+
+
+def profile_line_weights(asm_code: Iterable[str], max_cycles: int = DEFAULT_MAX_CYCLES) -> List[float]:
+    assembled = assemble_asm_lines(asm_code)
+    line_of = source_indices(assembled)
+    result = [0.0] * (max(line_of.values(), default=-1) + 1)
+    executed = profile(asm_lines_to_machine_code(assembled), [], max_cycles).instructions
+
+    for address, count in enumerate(executed):
+        if count and address in line_of:
+            result[line_of[address]] += count
+
+    return result
+
+
+def is_label_reference(asm_line: AsmLine) -> bool:
+    return asm_line.argument is not None and asm_line.argument.is_label()
+
+
+def is_address_operand(asm_line: AsmLine) -> bool:
+    return not asm_line.is_data and asm_line.mnemonic in instructions.ABSOLUTE_OPERANDS and is_label_reference(asm_line)
+
+
+def find_pointer_labels(asm_lines: List[AsmLine]) -> set:
+    result = set()
+
+    for asm_line in asm_lines:
+        if not is_label_reference(asm_line) or asm_line.is_relative_branch():
+            continue
+        if asm_line.is_data or asm_line.mnemonic not in DIRECT or asm_line.argument.offset != 0:
+            result.add(asm_line.argument.label)
+
+    return result
+
+
+def falls_into(asm_lines: List[AsmLine], i: int) -> bool:
+    if i == 0:
+        return True
+    previous = asm_lines[i - 1]
+    return not previous.is_data and previous.mnemonic not in UNCONDITIONAL
+
+
+def find_units(asm_lines: List[AsmLine], symbol_table: SymbolTable) -> List[DataUnit]:
+    groups = []
+
+    for i, asm_line in enumerate(asm_lines):
+        if not asm_line.is_data:
+            continue
+        if groups and groups[-1].last == i - 1 and asm_line.label is None:
+            groups[-1].last = i
+        else:
+            groups.append(DataUnit(i, i))
+
+    group_of = {i: group for group in groups for i in group.indices()}
+    tied = set()
+
+    for group in groups:
+        if falls_into(asm_lines, group.first) or asm_lines[group.first].label is None:
+            group.pinned = True
+
+    for label in find_pointer_labels(asm_lines):
+        group = group_of.get(symbol_table.index_of(label))
+        if group is None:
+            continue
+        tied.add(group.first)
+        tied.add(group.last + 1)
+        if group.first - 1 not in group_of or group.last + 1 not in group_of:
+            group.pinned = True
+
+    for first, last in iter_pinned_spans(asm_lines, symbol_table):
+        first, last = min(first, last), max(first, last)
+        overlapped = [group_of[i] for i in range(max(first, 0), min(last + 1, len(asm_lines))) if i in group_of]
+        touches_code = any(not asm_lines[i].is_data for i in range(max(first, 0), min(last + 1, len(asm_lines))))
+
+        for group in overlapped:
+            group.pinned |= touches_code
+        for group in overlapped[1:]:
+            tied.add(group.first)
+
+    result = []
+
+    for group in groups:
+        if result and result[-1].last == group.first - 1 and group.first in tied:
+            result[-1].last = group.last
+            result[-1].pinned |= group.pinned
+        else:
+            result.append(group)
+
+    return result
+
+
+def find_entry(asm_lines: List[AsmLine], symbol_table: SymbolTable) -> Optional[int]:
+    if not asm_lines or asm_lines[0].is_data or asm_lines[0].mnemonic != 'BR':
+        return None
+
+    argument = asm_lines[0].argument
+
+    if argument is None or not argument.is_label() or argument.offset != 0:
+        return None
+
+    target = symbol_table.index_of(argument.label)
+
+    if target < 1 or not all(asm_line.is_data for asm_line in asm_lines[1:target]):
+        return None
+
+    return target
+
+
+def placement_cost(asm_lines: List[AsmLine], weights: Dict[int, float], base: int = 0) -> float:
+    symbol_table = SymbolTable.from_asm_lines(asm_lines)
+    result = 0.0
+
+    for asm_line in asm_lines:
+        if is_address_operand(asm_line):
+            address = base + symbol_table.index_of(asm_line.argument.label) + asm_line.argument.offset
+            if address > PREFIX_FREE_END:
+                result += weights.get(id(asm_line), 0.0)
+
+    return result
+
+
+def choose_hot(units: List[DataUnit], capacity: int) -> List[DataUnit]:
+    result = []
+    size = 0
+
+    for unit in sorted(units, key=lambda unit: (-unit.weight / unit.size(), unit.first)):
+        if unit.weight > 0 and size + unit.size() <= capacity:
+            result.append(unit)
+            size += unit.size()
+
+    return result
+
+
+def arrange(asm_lines: List[AsmLine], units: List[DataUnit], hot: List[DataUnit], skip: Optional[int],
+            can_append: bool) -> List[AsmLine]:
+    hot_indices = {i for unit in hot for i in unit.indices()}
+    cold_indices = set()
+
+    if can_append:
+        cold_indices = {i for unit in units if not unit.pinned and unit not in hot for i in unit.indices()}
+
+    rest = [asm_line for i, asm_line in enumerate(asm_lines)
+            if i != skip and i not in hot_indices and i not in cold_indices]
+
+    return [asm_lines[i] for unit in hot for i in unit.indices()] + rest + \
+        [asm_line for i, asm_line in enumerate(asm_lines) if i in cold_indices]
+
+
+def place_data(asm_lines: List[AsmLine], weights: Optional[List[float]] = None,
+               statistics: Optional[PlacementStatistics] = None) -> List[AsmLine]:
+    if statistics is None:
+        statistics = PlacementStatistics()
+
+    if weights is None:
+        weights = static_line_weights(asm_lines)
+
+    weight_of = {id(asm_line): weight for asm_line, weight in zip(asm_lines, weights)}
+    statistics.cost_before = placement_cost(asm_lines, weight_of)
+
+    if not asm_lines or any(not asm_line.is_data and asm_line.mnemonic in FIXED_ADDRESSES and
+                            asm_line.argument is not None and not asm_line.argument.is_label()
+                            for asm_line in asm_lines):
+        return asm_lines
+
+    symbol_table = SymbolTable.from_asm_lines(asm_lines)
+    units = find_units(asm_lines, symbol_table)
+    reference_weights = {}
+
+    for asm_line in asm_lines:
+        if is_address_operand(asm_line):
+            target = symbol_table.index_of(asm_line.argument.label) + asm_line.argument.offset
+            reference_weights[target] = reference_weights.get(target, 0.0) + weight_of.get(id(asm_line), 0.0)
+
+    for unit in units:
+        unit.weight = sum(reference_weights.get(i, 0.0) for i in unit.indices())
+
+    entry = find_entry(asm_lines, symbol_table)
+    skip = 0 if entry is not None else None
+    entry_line = asm_lines[0 if entry is None else entry]
+    movable = [unit for unit in units if not unit.pinned]
+    can_append = asm_lines[-1].mnemonic in UNCONDITIONAL if not asm_lines[-1].is_data else not units[-1].pinned
+    best = None
+
+    for capacity in (PREFIX_FREE_END, PREFIX_FREE_END - 1):
+        hot = choose_hot(movable, capacity)
+        arranged = arrange(asm_lines, units, hot, skip, can_append)
+        base = 1 if arranged.index(entry_line) <= PREFIX_FREE_END else 2
+        cost = placement_cost(arranged, weight_of, base) + (1 if entry is None else 0)
+
+        if best is None or cost < best[0]:
+            best = (cost, hot, arranged)
+
+    cost, hot, arranged = best
+
+    if cost >= statistics.cost_before:
+        return asm_lines
+
+    jump = AsmLine.from_instruction('BR', Argument.from_label(LabelAllocator(symbol_table, ENTRY_PREFIX).label_of(entry_line)))
+    if entry is not None:
+        jump.label = asm_lines[0].label
+        jump.source_line = asm_lines[0].source_line
+    else:
+        jump.source_line = entry_line.source_line
+    result = [jump] + arranged
+
+    statistics.cost_after = cost
+    statistics.hot_lines = sum(unit.size() for unit in hot)
+    original_index = {id(asm_line): i for i, asm_line in enumerate(asm_lines)}
+    statistics.moved_lines = sum(1 for i, asm_line in enumerate(result)
+                                 if asm_line.is_data and original_index[id(asm_line)] != i)
+    statistics.changed = True
+
+    return result
+
+
+def placement_pass(program: Program) -> int:
+    statistics = PlacementStatistics()
+    program.asm_lines = place_data(program.asm_lines, statistics=statistics)
+    return statistics.moved_lines
+
+
+def profile_guided_placement(asm_code: List[str],
+                             max_cycles: int = DEFAULT_MAX_CYCLES) -> Tuple[List[AsmLine], PlacementStatistics]:
+    statistics = PlacementStatistics()
+    result = place_data(parse_source(asm_code), profile_line_weights(asm_code, max_cycles), statistics)
+    return result, statistics
+
+
+if __name__ == '__main__':
+    argument_parser = argparse.ArgumentParser(description='Move the hottest DATA into prefix-free addresses.')
+    argument_parser.add_argument('source')
+    argument_parser.add_argument('-o', '--output', help='write the rearranged source to this file')
+    argument_parser.add_argument('--static', action='store_true', help='weight references by loop depth instead of a profile run')
+    argument_parser.add_argument('--max-cycles', type=int, default=DEFAULT_MAX_CYCLES)
+    arguments = argument_parser.parse_args()
+
+    asm_code = read_file_lines(arguments.source)
+
+    if arguments.static:
+        placement_statistics = PlacementStatistics()
+        placed = place_data(parse_source(asm_code), statistics=placement_statistics)
+    else:
+        placed, placement_statistics = profile_guided_placement(asm_code, arguments.max_cycles)
+
+    source = to_source(placed)
+    size_before, cycles_before = run_cycles(asm_code, arguments.max_cycles)
+    size_after, cycles_after = run_cycles(source, arguments.max_cycles)
+
+    write_lines(sys.stdout, [
+        repr(placement_statistics),
+        f'size: {size_before} -> {size_after} bytes',
+        f'cycles: {cycles_before} -> {cycles_after}',
+    ])
+
+    if arguments.output is not None:
+        write_file(arguments.output, source)
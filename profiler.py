@@ -0,0 +1,154 @@
+import argparse
+import json
+import sys
+from typing import List, Dict, Optional, Any
+
+import instructions
+from asm import assemble_with_source_map, read_file_lines, write_lines
+from sim import Machine, MEMORY_SIZE, DEFAULT_MAX_CYCLES
+from source_map import SourceMapEntry
+
+PFIX = instructions.OPCODES['PFIX']
+UNMAPPED = '?'
+
+
+class ProfileRow:
+    key: str
+    cycles: int
+    instructions: int
+    addresses: List[int]
+
+    def __init__(self, key: str):
+        self.key = key
+        self.cycles = 0
+        self.instructions = 0
+        self.addresses = []
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'key': self.key,
+            'cycles': self.cycles,
+            'instructions': self.instructions,
+            'addresses': self.addresses,
+        }
+
+
+class Profile:
+    source_map: List[SourceMapEntry]
+    cycles: List[int]
+    instructions: List[int]
+    halted: bool
+
+    def __init__(self, source_map: List[SourceMapEntry], cycles: List[int], instructions: List[int], halted: bool):
+        self.source_map = source_map
+        self.cycles = cycles
+        self.instructions = instructions
+        self.halted = halted
+
+    def total_cycles(self) -> int:
+        return sum(self.cycles)
+
+    def line_key(self, address: int) -> str:
+        if address >= len(self.source_map):
+            return UNMAPPED
+        entry = self.source_map[address]
+        return f'{entry.file}:{entry.line}'
+
+    def label_key(self, address: int) -> str:
+        if address >= len(self.source_map) or self.source_map[address].label is None:
+            return UNMAPPED
+        return self.source_map[address].label
+
+    def aggregate(self, key_function) -> List[ProfileRow]:
+        rows = {}
+
+        for address in range(MEMORY_SIZE):
+            if not self.cycles[address]:
+                continue
+
+            key = key_function(address)
+            row = rows.get(key)
+
+            if row is None:
+                row = ProfileRow(key)
+                rows[key] = row
+
+            row.cycles += self.cycles[address]
+            row.instructions += self.instructions[address]
+            row.addresses.append(address)
+
+        return sorted(rows.values(), key=lambda row: row.cycles, reverse=True)
+
+    def by_line(self) -> List[ProfileRow]:
+        return self.aggregate(self.line_key)
+
+    def by_label(self) -> List[ProfileRow]:
+        return self.aggregate(self.label_key)
+
+    def report(self, source_lines: Optional[List[str]] = None, limit: int = 20) -> List[str]:
+        total = max(self.total_cycles(), 1)
+        result = [f'{"cycles":>8} {"share":>6} {"instrs":>8}  location']
+
+        for row in self.by_line()[:limit]:
+            label = self.label_key(row.addresses[0])
+            text = ''
+            if source_lines is not None and row.key != UNMAPPED:
+                text = source_lines[int(row.key.rsplit(':', 1)[1]) - 1]
+            result.append(f'{row.cycles:>8} {row.cycles / total:>6.1%} {row.instructions:>8}  {row.key} {label} {text}'.rstrip())
+
+        result.append('')
+        result.append(f'{"cycles":>8} {"share":>6} {"instrs":>8}  label')
+
+        for row in self.by_label()[:limit]:
+            result.append(f'{row.cycles:>8} {row.cycles / total:>6.1%} {row.instructions:>8}  {row.key}')
+
+        return result
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'halted': self.halted,
+            'total_cycles': self.total_cycles(),
+            'addresses': [
+                {'address': address, 'cycles': self.cycles[address], 'instructions': self.instructions[address]}
+                for address in range(MEMORY_SIZE) if self.cycles[address]
+            ],
+            'lines': [row.to_dict() for row in self.by_line()],
+            'labels': [row.to_dict() for row in self.by_label()],
+        }
+
+
+def profile(machine_code: List[int], source_map: List[SourceMapEntry], max_cycles: int = DEFAULT_MAX_CYCLES) -> Profile:
+    machine = Machine(machine_code)
+    memory = machine.memory
+    cycles = [0] * MEMORY_SIZE
+    executed_instructions = [0] * MEMORY_SIZE
+
+    while not machine.halted and machine.cycles < max_cycles:
+        pc = machine.pc
+        cycles[pc] += 1
+        if memory[pc] >> 4 != PFIX:
+            executed_instructions[pc] += 1
+        machine.step()
+
+    return Profile(source_map, cycles, executed_instructions, machine.halted)
+
+
+def profile_file(filepath: str, max_cycles: int = DEFAULT_MAX_CYCLES) -> Profile:
+    machine_code, source_map = assemble_with_source_map(read_file_lines(filepath), filepath)
+    return profile(machine_code, source_map, max_cycles)
+
+
+if __name__ == '__main__':
+    argument_parser = argparse.ArgumentParser(description='Profile a BCPU programme by source line and label.')
+    argument_parser.add_argument('source')
+    argument_parser.add_argument('--json', help='write the machine-readable profile to this file')
+    argument_parser.add_argument('--limit', type=int, default=20)
+    argument_parser.add_argument('--max-cycles', type=int, default=DEFAULT_MAX_CYCLES)
+    arguments = argument_parser.parse_args()
+
+    result = profile_file(arguments.source, arguments.max_cycles)
+    write_lines(sys.stdout, result.report(read_file_lines(arguments.source), arguments.limit))
+
+    if arguments.json is not None:
+        with open(arguments.json, 'w') as json_file:
+            json.dump(result.to_dict(), json_file, indent=1)
@@ -1,35 +1,87 @@
-import mcschematic
+import sys
+from typing import List, Dict, Tuple
 
+from sim import load_image
+from tracing import span, count
 from util import is_bit_set
 
 BARREL_15 = 'minecraft:barrel{Items: [{Slot: 0b, id: "minecraft:redstone", Count: 64b}, {Count: 64b, Slot: 1b, id: "minecraft:redstone"}, {Slot: 2b, Count: 64b, id: "minecraft:redstone"}, {id: "minecraft:redstone", Slot: 3b, Count: 64b}, {Count: 64b, Slot: 4b, id: "minecraft:redstone"}, {Count: 64b, Slot: 5b, id: "minecraft:redstone"}, {id: "minecraft:redstone", Slot: 6b, Count: 64b}, {id: "minecraft:redstone", Slot: 7b, Count: 64b}, {Count: 64b, id: "minecraft:redstone", Slot: 8b}, {id: "minecraft:redstone", Slot: 9b, Count: 64b}, {Slot: 10b, Count: 64b, id: "minecraft:redstone"}, {id: "minecraft:redstone", Slot: 11b, Count: 64b}, {Slot: 12b, Count: 64b, id: "minecraft:redstone"}, {Count: 64b, Slot: 13b, id: "minecraft:redstone"}, {id: "minecraft:redstone", Count: 64b, Slot: 14b}, {id: "minecraft:redstone", Slot: 15b, Count: 64b}, {id: "minecraft:redstone", Count: 64b, Slot: 16b}, {Count: 64b, id: "minecraft:redstone", Slot: 17b}, {Slot: 18b, id: "minecraft:redstone", Count: 64b}, {id: "minecraft:redstone", Count: 64b, Slot: 19b}, {Count: 64b, id: "minecraft:redstone", Slot: 20b}, {Count: 64b, id: "minecraft:redstone", Slot: 21b}, {id: "minecraft:redstone", Slot: 22b, Count: 64b}, {Count: 64b, id: "minecraft:redstone", Slot: 23b}, {id: "minecraft:redstone", Slot: 24b, Count: 64b}, {Count: 64b, id: "minecraft:redstone", Slot: 25b}, {Slot: 26b, Count: 64b, id: "minecraft:redstone"}], id: "minecraft:barrel"}'
 
+TEMPLATE_PATH = 'template/rom.schem'
+ROM_BYTES = 32
+
+Position = Tuple[int, int, int]
+
+TEMPLATES: Dict[str, 'mcschematic.MCSchematic'] = {}
+
+POSITIONS: List[Position] = [((address & 0b1111) * 2, bit * 2 - 14 + address % 2, -1 if address > 0xF else -7)
+                              for address in range(ROM_BYTES) for bit in range(8)]
+
+
+def load_template(filepath: str = TEMPLATE_PATH) -> 'mcschematic.MCSchematic':
+    if filepath not in TEMPLATES:
+        import mcschematic
+
+        with span('load_template', 'schem'):
+            TEMPLATES[filepath] = mcschematic.MCSchematic(filepath)
+
+    return TEMPLATES[filepath]
+
+
+def set_blocks(rom: 'mcschematic.MCSchematic', positions: List[Position], block_data: str = BARREL_15) -> None:
+    if not positions:
+        return
+
+    structure = rom.getStructure()
+
+    if not hasattr(structure, '_blockStates') or not hasattr(structure, '_blockEntities'):
+        for position in positions:
+            structure.setBlock(position, block_data)
+        return
+
+    # setBlock registers the block state once, the remaining positions share its palette id and NBT string
+    structure.setBlock(positions[0], block_data)
+    block_state = structure._blockStates[positions[0]]
+    structure._blockStates.update(dict.fromkeys(positions, block_state))
+    structure._blockEntities.update(dict.fromkeys(positions, block_data))
+
 
 class BCPURomBuilder:
-    rom: mcschematic.MCSchematic
+    rom: 'mcschematic.MCSchematic'
 
-    def __init__(self):
-        self.rom = mcschematic.MCSchematic('template/rom.schem')
+    def __init__(self, template: str = TEMPLATE_PATH):
+        with span('clone_template', 'schem'):
+            self.rom = load_template(template).makeCopy()
 
-    def save(self, filename: str) -> None:
-        self.rom.save('schems', filename, mcschematic.Version.JE_1_18_2)
+    def save(self, filename: str, directory: str = 'schems') -> None:
+        import mcschematic
+
+        with span('save', 'schem', {'filename': filename}):
+            self.rom.save(directory, filename, mcschematic.Version.JE_1_18_2)
 
     def write_byte(self, byte: int, address: int) -> None:
         if address > 31:
             raise Exception(f'Byte address is {address} but only 0-31 byte addresses are supported')
 
-        z = -7
+        positions = [POSITIONS[address * 8 + i] for i in range(8) if is_bit_set(byte, i)]
+
+        with span('write_byte', 'schem'):
+            set_blocks(self.rom, positions)
+
+        count('blocks_set', len(positions))
+
+    def write_image(self, image: bytes) -> None:
+        if len(image) > ROM_BYTES:
+            raise Exception(f'Image is {len(image)} bytes but only {ROM_BYTES} bytes are supported')
 
-        if address > 0xF:
-            z = -1
+        import numpy as np
 
-        x = (address & 0b1111) * 2
-        y_offset = address % 2
+        with span('write_image', 'schem'):
+            bits = np.unpackbits(np.frombuffer(bytes(image), dtype=np.uint8), bitorder='little')
+            positions = [POSITIONS[i] for i in np.flatnonzero(bits).tolist()]
+            set_blocks(self.rom, positions)
 
-        for i in range(8):
-            if is_bit_set(byte, i):
-                y = (i * 2 - 14) + y_offset
-                self.rom.setBlock((x, y, z), BARREL_15)
+        count('blocks_set', len(positions))
 
     def inspect(self):
         for x in range(31):
@@ -45,18 +97,15 @@ class BCPURomBuilder:
                 print(x, y, z, block_data)
 
 
-def generate_schem(filepath: str):
-    file_handle = open(filepath, 'r')
-    file = file_handle.read()
-    bytes_str = file.strip().replace('\n', ' ').split(' ')
-    bytes_int = list(map(lambda x: int(x, 16), bytes_str))
+def build_schem(image: bytes, filename: str = 'modified', directory: str = 'schems') -> None:
     builder = BCPURomBuilder()
+    builder.write_image(image)
+    builder.save(filename, directory)
 
-    for i in range(len(bytes_int)):
-        builder.write_byte(bytes_int[i], i)
 
-    builder.save('modified')
+def generate_schem(filepath: str, filename: str = 'modified') -> None:
+    build_schem(bytes(load_image(filepath)), filename)
 
 
 if __name__ == '__main__':
-    generate_schem('schems/input.txt')
+    generate_schem(sys.argv[1] if len(sys.argv) > 1 else 'schems/input.txt')
@@ -0,0 +1,248 @@
+import argparse
+import json
+import os
+import socketserver
+import stat
+import sys
+from collections import OrderedDict
+from typing import List, Dict, Optional, Any, Callable, TextIO
+
+from asm import read_file_lines, strip_lines, iter_hex_groups, iter_intel_hex, AssemblyError
+from cache import BuildCache, cached_schem
+from disasm import disassemble_to_source, DisassemblyError
+from parser import ParseError
+from source_map import build_source_map
+from symbol_table import SymbolError
+from watch import IncrementalAssembler
+
+MAX_DOCUMENTS = 64
+TEXT_DOCUMENT = '<text>'
+
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+
+DIAGNOSED_ERRORS = (ParseError, AssemblyError, SymbolError, DisassemblyError, ValueError)
+
+
+class RpcError(Exception):
+    code: int
+
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+
+
+def require(params: Dict[str, Any], name: str, kind: type) -> Any:
+    value = params.get(name)
+
+    if not isinstance(value, kind):
+        raise RpcError(INVALID_PARAMS, f'Parameter {name} must be a {kind.__name__}.')
+
+    return value
+
+
+def read_image(params: Dict[str, Any]) -> bytes:
+    if 'hex' in params:
+        return bytes.fromhex(require(params, 'hex', str))
+
+    machine_code = require(params, 'machine_code', list)
+
+    try:
+        return bytes(machine_code)
+    except (TypeError, ValueError):
+        raise RpcError(INVALID_PARAMS, 'Parameter machine_code must be a list of bytes.')
+
+
+def schem_name(params: Dict[str, Any]) -> str:
+    name = params.get('name', 'modified')
+
+    if not isinstance(name, str) or name in ('', '.', '..') or os.path.isabs(name) or \
+            any(separator in name for separator in ('/', '\\')):
+        raise RpcError(INVALID_PARAMS, 'Parameter name must be a plain file name.')
+
+    return name
+
+
+def format_image(image: bytes, output_format: str) -> Any:
+    if output_format == 'hex':
+        return '\n'.join(iter_hex_groups(image))
+    if output_format == 'ihex':
+        return '\n'.join(iter_intel_hex(image))
+    if output_format == 'list':
+        return list(image)
+    raise RpcError(INVALID_PARAMS, f'Unknown format {output_format}, expected list, hex or ihex.')
+
+
+def diagnostic(error: Exception) -> Dict[str, str]:
+    return {'severity': 'error', 'kind': type(error).__name__, 'message': str(error)}
+
+
+class Server:
+    documents: 'OrderedDict[str, IncrementalAssembler]'
+    max_documents: int
+    build_cache: Optional[BuildCache]
+    methods: Dict[str, Callable[[Dict[str, Any]], Any]]
+
+    def __init__(self, max_documents: int = MAX_DOCUMENTS, build_cache: Optional[BuildCache] = None):
+        self.documents = OrderedDict()
+        self.max_documents = max_documents
+        self.build_cache = build_cache
+        self.methods = {
+            'assemble': self.assemble,
+            'assemble_file': self.assemble_file,
+            'disassemble': self.disassemble,
+            'schem': self.schem,
+        }
+
+    def document(self, name: str) -> IncrementalAssembler:
+        assembler = self.documents.pop(name, None)
+
+        if assembler is None:
+            assembler = IncrementalAssembler()
+
+        self.documents[name] = assembler
+
+        while len(self.documents) > self.max_documents:
+            self.documents.popitem(last=False)
+
+        return assembler
+
+    def assemble_lines(self, lines: List[str], name: str, output_format: str) -> Dict[str, Any]:
+        assembler = self.document(name)
+
+        try:
+            image = assembler.update(lines)
+        except DIAGNOSED_ERRORS as error:
+            return {'machine_code': None, 'source_map': None, 'diagnostics': [diagnostic(error)]}
+
+        filename = None if name == TEXT_DOCUMENT else name
+
+        return {
+            'machine_code': format_image(image, output_format),
+            'source_map': [entry.to_dict() for entry in build_source_map(assembler.asm_lines, filename)],
+            'diagnostics': [],
+        }
+
+    def assemble(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        lines = list(strip_lines(require(params, 'source', str).splitlines()))
+        return self.assemble_lines(lines, params.get('filename') or TEXT_DOCUMENT, params.get('format', 'list'))
+
+    def assemble_file(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        filepath = require(params, 'path', str)
+
+        try:
+            lines = read_file_lines(filepath)
+        except OSError as error:
+            return {'machine_code': None, 'source_map': None, 'diagnostics': [diagnostic(error)]}
+
+        return self.assemble_lines(lines, os.path.abspath(filepath), params.get('format', 'list'))
+
+    def disassemble(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            return {'source': disassemble_to_source(list(read_image(params))), 'diagnostics': []}
+        except DIAGNOSED_ERRORS as error:
+            return {'source': None, 'diagnostics': [diagnostic(error)]}
+
+    def schem(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        name = schem_name(params)
+
+        try:
+            return {'path': cached_schem(read_image(params), name, self.build_cache),
+                    'diagnostics': []}
+        except DIAGNOSED_ERRORS as error:
+            return {'path': None, 'diagnostics': [diagnostic(error)]}
+
+    def handle(self, request: Any) -> Optional[Dict[str, Any]]:
+        request_id = request.get('id') if isinstance(request, dict) else None
+
+        try:
+            if not isinstance(request, dict) or not isinstance(request.get('method'), str):
+                raise RpcError(INVALID_REQUEST, 'Request must be an object with a method.')
+
+            method = self.methods.get(request['method'])
+
+            if method is None:
+                raise RpcError(METHOD_NOT_FOUND, f'Unknown method {request["method"]}.')
+
+            params = request.get('params', {})
+
+            if not isinstance(params, dict):
+                raise RpcError(INVALID_PARAMS, 'Parameters must be an object.')
+
+            result = {'jsonrpc': '2.0', 'id': request_id, 'result': method(params)}
+        except RpcError as error:
+            result = {'jsonrpc': '2.0', 'id': request_id, 'error': {'code': error.code, 'message': str(error)}}
+        except Exception as error:
+            result = {'jsonrpc': '2.0', 'id': request_id,
+                      'error': {'code': INTERNAL_ERROR, 'message': f'{type(error).__name__}: {error}'}}
+
+        if isinstance(request, dict) and 'id' not in request:
+            return None
+
+        return result
+
+    def handle_line(self, line: str) -> Optional[str]:
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError as error:
+            response = {'jsonrpc': '2.0', 'id': None, 'error': {'code': PARSE_ERROR, 'message': str(error)}}
+        else:
+            response = self.handle(request)
+
+        return None if response is None else json.dumps(response)
+
+
+def serve_stream(server: Server, input_file: TextIO, output_file: TextIO) -> None:
+    for line in input_file:
+        if line.strip() == '':
+            continue
+
+        response = server.handle_line(line)
+
+        if response is not None:
+            output_file.write(f'{response}\n')
+            output_file.flush()
+
+
+def serve_socket(server: Server, path: str) -> None:
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for line in self.rfile:
+                if line.strip() == b'':
+                    continue
+
+                response = server.handle_line(line.decode())
+
+                if response is not None:
+                    self.wfile.write(f'{response}\n'.encode())
+
+    if os.path.lexists(path):
+        if not stat.S_ISSOCK(os.lstat(path).st_mode):
+            raise FileExistsError(f'{path} exists and is not a socket.')
+        os.remove(path)
+
+    with socketserver.UnixStreamServer(path, Handler) as unix_server:
+        try:
+            unix_server.serve_forever()
+        finally:
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    argument_parser = argparse.ArgumentParser(description='Serve assembler requests as newline-delimited JSON-RPC.')
+    argument_parser.add_argument('--socket', help='listen on this Unix socket instead of stdin/stdout')
+    argument_parser.add_argument('--no-cache', action='store_true', help='rebuild schematics without the build cache')
+    arguments = argument_parser.parse_args()
+
+    rpc_server = Server(build_cache=None if arguments.no_cache else BuildCache())
+
+    try:
+        if arguments.socket is None:
+            serve_stream(rpc_server, sys.stdin, sys.stdout)
+        else:
+            serve_socket(rpc_server, arguments.socket)
+    except KeyboardInterrupt:
+        pass
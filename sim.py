@@ -0,0 +1,156 @@
+import sys
+from typing import List, Iterable
+
+import instructions
+from asm import assemble, read_file_lines, iter_hex_groups, write_lines
+from disasm import read_hex_file
+
+MEMORY_SIZE = 256
+DEFAULT_MAX_CYCLES = 10_000_000
+
+LDAM = instructions.OPCODES['LDAM']
+LDBM = instructions.OPCODES['LDBM']
+STAM = instructions.OPCODES['STAM']
+LDAC = instructions.OPCODES['LDAC']
+LDBC = instructions.OPCODES['LDBC']
+LDAP = instructions.OPCODES['LDAP']
+LDAI = instructions.OPCODES['LDAI']
+LDBI = instructions.OPCODES['LDBI']
+STAI = instructions.OPCODES['STAI']
+BR = instructions.OPCODES['BR']
+BRZ = instructions.OPCODES['BRZ']
+BRN = instructions.OPCODES['BRN']
+BRB = instructions.OPCODES['BRB']
+ADD = instructions.OPCODES['ADD']
+SUB = instructions.OPCODES['SUB']
+PFIX = instructions.OPCODES['PFIX']
+
+OPCODE_TABLE = bytes(decoded.opcode for decoded in instructions.DECODE_TABLE)
+OPERAND_TABLE = bytes(decoded.operand for decoded in instructions.DECODE_TABLE)
+
+
+class SimulationError(Exception):
+    pass
+
+
+def load_image(filepath: str) -> List[int]:
+    if filepath.endswith('.s'):
+        return assemble(read_file_lines(filepath))
+    if filepath.endswith('.bin'):
+        with open(filepath, 'rb') as file:
+            return list(file.read())
+    return read_hex_file(filepath)
+
+
+class Machine:
+    memory: bytearray
+    a: int
+    b: int
+    oreg: int
+    pc: int
+    start: int
+    cycles: int
+    halted: bool
+
+    def __init__(self, machine_code: Iterable[int] = ()):
+        machine_code = bytes(machine_code)
+
+        if len(machine_code) > MEMORY_SIZE:
+            raise SimulationError(f'Image of {len(machine_code)} bytes does not fit in {MEMORY_SIZE} bytes of memory.')
+
+        self.memory = bytearray(MEMORY_SIZE)
+        self.memory[:len(machine_code)] = machine_code
+        self.a = 0
+        self.b = 0
+        self.oreg = 0
+        self.pc = 0
+        self.start = 0
+        self.cycles = 0
+        self.halted = False
+
+    def step(self) -> int:
+        return self.run(1)
+
+    def run(self, max_cycles: int = DEFAULT_MAX_CYCLES) -> int:
+        memory = self.memory
+        opcodes = OPCODE_TABLE
+        operands = OPERAND_TABLE
+        a = self.a
+        b = self.b
+        oreg = self.oreg
+        pc = self.pc
+        start = self.start
+        halted = self.halted
+        cycles = 0
+
+        while cycles < max_cycles and not halted:
+            byte = memory[pc]
+            opcode = opcodes[byte]
+            operand = oreg | operands[byte]
+            pc = (pc + 1) & 0xFF
+            cycles += 1
+
+            if opcode == PFIX:
+                oreg = (operand << 4) & 0xFF
+                continue
+
+            oreg = 0
+
+            if opcode < BR:
+                if opcode == LDAM:
+                    a = memory[operand]
+                elif opcode == LDBM:
+                    b = memory[operand]
+                elif opcode == STAM:
+                    memory[operand] = a
+                elif opcode == LDAC:
+                    a = operand
+                elif opcode == LDBC:
+                    b = operand
+                elif opcode == LDAP:
+                    a = (pc + operand) & 0xFF
+                elif opcode == LDAI:
+                    a = memory[(a + operand) & 0xFF]
+                elif opcode == LDBI:
+                    b = memory[(b + operand) & 0xFF]
+                else:
+                    memory[(b + operand) & 0xFF] = a
+            elif opcode == ADD:
+                a = (a + b) & 0xFF
+            elif opcode == SUB:
+                a = (a - b) & 0xFF
+            else:
+                if opcode == BR or (opcode == BRZ and a == 0) or (opcode == BRN and a & 0x80):
+                    target = (pc + operand) & 0xFF
+                elif opcode == BRB:
+                    target = b
+                else:
+                    target = pc
+
+                if target == start:
+                    halted = True
+                pc = target
+
+            start = pc
+
+        self.a = a
+        self.b = b
+        self.oreg = oreg
+        self.pc = pc
+        self.start = start
+        self.halted = halted
+        self.cycles += cycles
+
+        return cycles
+
+    def dump(self) -> List[str]:
+        return [
+            f'A={self.a:02X} B={self.b:02X} PC={self.pc:02X} cycles={self.cycles} halted={self.halted}',
+            *iter_hex_groups(self.memory),
+        ]
+
+
+if __name__ == '__main__':
+    machine = Machine(load_image(sys.argv[1]))
+    machine.run()
+    write_lines(sys.stdout, machine.dump())
@@ -0,0 +1,61 @@
+import json
+from typing import List, Optional, Dict, Any
+
+from asm_line import AsmLine
+
+
+class SourceMapEntry:
+    address: int
+    file: Optional[str]
+    line: Optional[int]
+    label: Optional[str]
+    synthetic: bool
+
+    def __init__(self, address: int, file: Optional[str], line: Optional[int], label: Optional[str], synthetic: bool):
+        self.address = address
+        self.file = file
+        self.line = line
+        self.label = label
+        self.synthetic = synthetic
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'address': self.address,
+            'file': self.file,
+            'line': self.line,
+            'label': self.label,
+            'synthetic': self.synthetic,
+        }
+
+    @classmethod
+    def from_dict(cls, entry: Dict[str, Any]):
+        return SourceMapEntry(entry['address'], entry['file'], entry['line'], entry['label'], entry['synthetic'])
+
+    def __repr__(self) -> str:
+        return f'{self.address:02X} {self.file}:{self.line} {self.label}{" PFIX" if self.synthetic else ""}'
+
+    def __eq__(self, other):
+        return self.to_dict() == other.to_dict()
+
+
+def build_source_map(asm_lines: List[AsmLine], filename: Optional[str] = None) -> List[SourceMapEntry]:
+    result = []
+    label = None
+
+    for asm_line in asm_lines:
+        if asm_line.label is not None:
+            label = asm_line.label
+
+        result.append(SourceMapEntry(asm_line.address, filename, asm_line.source_line, label, asm_line.synthetic))
+
+    return result
+
+
+def write_source_map(filepath: str, source_map: List[SourceMapEntry]) -> None:
+    with open(filepath, 'w') as file:
+        json.dump([entry.to_dict() for entry in source_map], file, indent=1)
+
+
+def read_source_map(filepath: str) -> List[SourceMapEntry]:
+    with open(filepath, 'r') as file:
+        return [SourceMapEntry.from_dict(entry) for entry in json.load(file)]
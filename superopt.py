@@ -0,0 +1,463 @@
+import argparse
+import copy
+import hashlib
+import json
+import sys
+from typing import List, Dict, Optional, Tuple, Callable, Iterable
+
+import numpy as np
+
+from asm import default_pipeline, write_lines
+from asm_line import AsmLine, Argument
+from parser import parse_asm_lines
+from passes import PassManager, Program, SYMBOLS
+from peephole import find_pinned
+from symbol_table import SymbolTable
+
+DEFAULT_DATABASE = 'superopt_rules.json'
+DEFAULT_MAX_LENGTH = 3
+TEST_STATES = 64
+MAX_EXHAUSTIVE_BYTES = 3
+CHUNK_SIZE = 1 << 20
+REGISTERS = ('A', 'B')
+
+SUPPORTED = frozenset(['LDAM', 'LDBM', 'STAM', 'LDAC', 'LDBC', 'ADD', 'SUB'])
+MEMORY_OPERANDS = frozenset(['LDAM', 'LDBM', 'STAM'])
+
+READS = {
+    'LDAM': '', 'LDBM': '', 'STAM': 'A', 'LDAC': '', 'LDBC': '', 'LDAP': '', 'LDAI': 'A', 'LDBI': 'B',
+    'STAI': 'AB', 'BR': '', 'BRZ': 'A', 'BRN': 'A', 'BRB': 'B', 'ADD': 'AB', 'SUB': 'AB', 'PFIX': '',
+}
+WRITES = {
+    'LDAM': 'A', 'LDBM': 'B', 'STAM': '', 'LDAC': 'A', 'LDBC': 'B', 'LDAP': 'A', 'LDAI': 'A', 'LDBI': 'B',
+    'STAI': '', 'BR': '', 'BRZ': '', 'BRN': '', 'BRB': '', 'ADD': 'A', 'SUB': 'A', 'PFIX': '',
+}
+
+Instruction = Tuple[str, Optional[int]]
+
+
+class SuperoptError(Exception):
+    pass
+
+
+class Snippet:
+    instructions: List[Instruction]
+    slots: List[str]
+
+    def __init__(self, instructions: List[Instruction], slots: List[str]):
+        self.instructions = instructions
+        self.slots = slots
+
+    @classmethod
+    def from_asm_lines(cls, asm_lines: List[AsmLine]):
+        instructions = []
+        slots = []
+
+        for asm_line in asm_lines:
+            if asm_line.is_data or asm_line.mnemonic not in SUPPORTED:
+                raise SuperoptError(f'Unsupported line {asm_line} in snippet.')
+
+            argument = asm_line.argument
+
+            if asm_line.mnemonic in MEMORY_OPERANDS:
+                key = repr(argument)
+                if key not in slots:
+                    slots.append(key)
+                instructions.append((asm_line.mnemonic, slots.index(key)))
+            elif argument is not None:
+                if argument.is_label():
+                    raise SuperoptError(f'Label constant in {asm_line} is not supported.')
+                instructions.append((asm_line.mnemonic, argument.immediate & 0xFF))
+            else:
+                instructions.append((asm_line.mnemonic, None))
+
+        return Snippet(instructions, slots)
+
+    @classmethod
+    def from_lines(cls, lines: Iterable[str]):
+        return cls.from_asm_lines(parse_asm_lines(lines))
+
+    def to_lines(self, slot_names: Optional[List[str]] = None) -> List[str]:
+        return format_instructions(self.instructions, slot_names or [f'${i}' for i in range(len(self.slots))])
+
+
+def format_instructions(instructions: List[Instruction], slot_names: List[str]) -> List[str]:
+    result = []
+
+    for mnemonic, operand in instructions:
+        if operand is None:
+            result.append(mnemonic)
+        elif mnemonic in MEMORY_OPERANDS:
+            result.append(f'{mnemonic} {slot_names[operand]}')
+        else:
+            result.append(f'{mnemonic} {operand}')
+
+    return result
+
+
+class State:
+    a: np.ndarray
+    b: np.ndarray
+    memory: List[np.ndarray]
+
+    def __init__(self, a: np.ndarray, b: np.ndarray, memory: List[np.ndarray]):
+        self.a = a
+        self.b = b
+        self.memory = memory
+
+    def step(self, instruction: Instruction) -> 'State':
+        mnemonic, operand = instruction
+        a, b, memory = self.a, self.b, self.memory
+
+        if mnemonic == 'LDAM':
+            a = memory[operand]
+        elif mnemonic == 'LDBM':
+            b = memory[operand]
+        elif mnemonic == 'STAM':
+            memory = list(memory)
+            memory[operand] = a
+        elif mnemonic == 'LDAC':
+            a = np.full_like(a, operand)
+        elif mnemonic == 'LDBC':
+            b = np.full_like(b, operand)
+        elif mnemonic == 'ADD':
+            a = (a + b) & 0xFF
+        elif mnemonic == 'SUB':
+            a = (a - b) & 0xFF
+
+        return State(a, b, memory)
+
+    def run(self, instructions: List[Instruction]) -> 'State':
+        state = self
+        for instruction in instructions:
+            state = state.step(instruction)
+        return state
+
+    def fingerprint(self) -> bytes:
+        return b''.join(array.astype(np.uint8).tobytes() for array in [self.a, self.b, *self.memory])
+
+    def matches(self, other: 'State', live: str) -> bool:
+        return ('A' not in live or np.array_equal(self.a, other.a)) and \
+               ('B' not in live or np.array_equal(self.b, other.b)) and \
+               all(np.array_equal(mine, theirs) for mine, theirs in zip(self.memory, other.memory))
+
+
+def live_inputs(instructions: List[Instruction]) -> List[str]:
+    written = set()
+    result = []
+
+    for mnemonic, operand in instructions:
+        reads = list(READS[mnemonic])
+        if mnemonic in ('LDAM', 'LDBM'):
+            reads.append(f'${operand}')
+        for name in reads:
+            if name not in written and name not in result:
+                result.append(name)
+        written.update(WRITES[mnemonic])
+        if mnemonic == 'STAM':
+            written.add(f'${operand}')
+
+    return result
+
+
+def random_state(slots: int, count: int, generator: np.random.Generator) -> State:
+    values = generator.integers(0, 256, size=(2 + slots, count), dtype=np.int64)
+    values[:, :4] = [0, 1, 0x80, 0xFF]
+    return State(values[0], values[1], list(values[2:]))
+
+
+def exhaustive_states(inputs: List[str], slots: int, start: int, stop: int) -> State:
+    index = np.arange(start, stop, dtype=np.int64)
+    values = {name: (index >> (8 * position)) & 0xFF for position, name in enumerate(inputs)}
+    zeros = np.zeros_like(index)
+    return State(values.get('A', zeros), values.get('B', zeros),
+                 [values.get(f'${slot}', zeros) for slot in range(slots)])
+
+
+def written(instructions: List[Instruction]) -> set:
+    result = set()
+
+    for mnemonic, operand in instructions:
+        result.update(WRITES[mnemonic])
+        if mnemonic == 'STAM':
+            result.add(f'${operand}')
+
+    return result
+
+
+def verify(target: List[Instruction], candidate: List[Instruction], slots: int, live: str) -> bool:
+    inputs = live_inputs(target)
+    inputs += [name for name in live_inputs(candidate) if name not in inputs]
+    overwritten = written(target) & written(candidate)
+    inputs += [name for name in [*live, *(f'${slot}' for slot in range(slots))]
+               if name not in inputs and name not in overwritten]
+
+    if len(inputs) > MAX_EXHAUSTIVE_BYTES:
+        return False
+
+    total = 1 << (8 * len(inputs))
+
+    for start in range(0, total, CHUNK_SIZE):
+        state = exhaustive_states(inputs, slots, start, min(start + CHUNK_SIZE, total))
+        if not state.run(target).matches(state.run(candidate), live):
+            return False
+
+    return True
+
+
+def alphabet(slots: int) -> List[Instruction]:
+    result = [('ADD', None), ('SUB', None)]
+    result += [('LDAC', value) for value in range(16)]
+    result += [('LDBC', value) for value in range(16)]
+    result += [(mnemonic, slot) for slot in range(slots) for mnemonic in ('LDAM', 'LDBM', 'STAM')]
+    return result
+
+
+def superoptimise(snippet: Snippet, live: str = 'AB', max_length: Optional[int] = None,
+                  seed: int = 0) -> Optional[List[Instruction]]:
+    target = snippet.instructions
+    slots = len(snippet.slots)
+    max_length = min(len(target) - 1, DEFAULT_MAX_LENGTH if max_length is None else max_length)
+    tests = random_state(slots, TEST_STATES, np.random.default_rng(seed))
+    expected = tests.run(target)
+    frontier = [([], tests)]
+    seen = {tests.fingerprint()}
+    instructions = alphabet(slots)
+
+    if expected.matches(tests, live) and verify(target, [], slots, live):
+        return []
+
+    for _ in range(max_length):
+        next_frontier = []
+
+        for sequence, state in frontier:
+            for instruction in instructions:
+                next_state = state.step(instruction)
+                fingerprint = next_state.fingerprint()
+
+                if fingerprint in seen:
+                    continue
+
+                seen.add(fingerprint)
+                candidate = sequence + [instruction]
+
+                if next_state.matches(expected, live) and verify(target, candidate, slots, live):
+                    return candidate
+
+                next_frontier.append((candidate, next_state))
+
+        frontier = next_frontier
+
+    return None
+
+
+class Rule:
+    pattern: List[str]
+    replacement: List[str]
+    live: str
+
+    def __init__(self, pattern: List[str], replacement: List[str], live: str):
+        self.pattern = pattern
+        self.replacement = replacement
+        self.live = live
+
+    def to_dict(self) -> Dict[str, object]:
+        return {'pattern': self.pattern, 'replacement': self.replacement, 'live': self.live}
+
+    @classmethod
+    def from_dict(cls, rule: Dict[str, object]):
+        return Rule(list(rule['pattern']), list(rule['replacement']), str(rule['live']))
+
+    def __repr__(self) -> str:
+        return f'{"; ".join(self.pattern)} => {"; ".join(self.replacement) or "(nothing)"} [live {self.live or "-"}]'
+
+    def __eq__(self, other):
+        return self.to_dict() == other.to_dict()
+
+
+class RuleDatabase:
+    rules: List[Rule]
+
+    def __init__(self, rules: Optional[List[Rule]] = None):
+        self.rules = [] if rules is None else rules
+
+    @classmethod
+    def load(cls, filepath: str = DEFAULT_DATABASE):
+        with open(filepath, 'r') as file:
+            return RuleDatabase([Rule.from_dict(rule) for rule in json.load(file)])
+
+    def save(self, filepath: str = DEFAULT_DATABASE) -> None:
+        with open(filepath, 'w') as file:
+            json.dump([rule.to_dict() for rule in self.rules], file, indent=1)
+
+    def digest(self) -> str:
+        return hashlib.sha256(json.dumps([rule.to_dict() for rule in self.rules]).encode()).hexdigest()
+
+    def add(self, rule: Rule) -> bool:
+        if any(existing.pattern == rule.pattern and existing.live == rule.live for existing in self.rules):
+            return False
+        self.rules.append(rule)
+        return True
+
+
+def discover(lines: List[str], live: str = 'AB', max_length: Optional[int] = None) -> Optional[Rule]:
+    snippet = Snippet.from_lines(lines)
+    result = superoptimise(snippet, live, max_length)
+
+    if result is None:
+        return None
+
+    slot_names = [f'${i}' for i in range(len(snippet.slots))]
+    return Rule(snippet.to_lines(), format_instructions(result, slot_names), live)
+
+
+def match_rule(asm_lines: List[AsmLine], i: int, rule: Rule) -> Optional[Dict[str, Argument]]:
+    if i + len(rule.pattern) > len(asm_lines):
+        return None
+
+    bindings = {}
+
+    for asm_line, line in zip(asm_lines[i:], rule.pattern):
+        mnemonic, _, operand = line.partition(' ')
+
+        if asm_line.is_data or asm_line.mnemonic != mnemonic:
+            return None
+
+        argument = asm_line.argument
+
+        if operand.startswith('$'):
+            bound = bindings.setdefault(operand, argument)
+            if bound != argument:
+                return None
+        elif operand == '':
+            if argument is not None:
+                return None
+        elif argument is None or argument.is_label() or argument.immediate != int(operand):
+            return None
+
+    if len(bindings) > 1 and any(not argument.is_label() or argument.offset != 0 for argument in bindings.values()):
+        return None
+
+    if len({argument.label for argument in bindings.values()}) != len(bindings):
+        return None
+
+    return bindings
+
+
+def is_dead(asm_lines: List[AsmLine], i: int, register: str) -> bool:
+    for asm_line in asm_lines[i:]:
+        if asm_line.is_data or asm_line.label is not None or register in READS[asm_line.mnemonic]:
+            return False
+        if register in WRITES[asm_line.mnemonic]:
+            return True
+        if asm_line.mnemonic in ('BR', 'BRZ', 'BRN', 'BRB'):
+            return False
+    return False
+
+
+def build_replacement(rule: Rule, bindings: Dict[str, Argument], source_line: Optional[int]) -> List[AsmLine]:
+    result = []
+
+    for line in rule.replacement:
+        mnemonic, _, operand = line.partition(' ')
+
+        if operand.startswith('$'):
+            argument = copy.copy(bindings[operand])
+        elif operand == '':
+            argument = None
+        else:
+            argument = Argument.from_immediate(int(operand))
+
+        asm_line = AsmLine.from_instruction(mnemonic, argument)
+        asm_line.source_line = source_line
+        result.append(asm_line)
+
+    return result
+
+
+def apply_rule(asm_lines: List[AsmLine], i: int, rule: Rule, pinned: bytearray) -> bool:
+    end = i + len(rule.pattern)
+    bindings = match_rule(asm_lines, i, rule)
+
+    if bindings is None or any(pinned[i:end]) or (i > 0 and asm_lines[i - 1].is_prefix()):
+        return False
+
+    if any(asm_line.label is not None for asm_line in asm_lines[i + 1:end]):
+        return False
+
+    if any(register not in rule.live and not is_dead(asm_lines, end, register) for register in REGISTERS):
+        return False
+
+    replacement = build_replacement(rule, bindings, asm_lines[i].source_line)
+    label = asm_lines[i].label
+
+    if label is not None:
+        if replacement:
+            replacement[0].label = label
+        elif end < len(asm_lines) and asm_lines[end].label is None:
+            asm_lines[end].label = label
+        else:
+            return False
+
+    asm_lines[i:end] = replacement
+    return True
+
+
+def apply_rules(asm_lines: List[AsmLine], database: RuleDatabase) -> int:
+    saved = 0
+    changed = True
+
+    while changed:
+        changed = False
+        pinned = find_pinned(asm_lines, SymbolTable.from_asm_lines(asm_lines))
+
+        for i in range(len(asm_lines)):
+            for rule in database.rules:
+                if apply_rule(asm_lines, i, rule, pinned):
+                    saved += len(rule.pattern) - len(rule.replacement)
+                    changed = True
+                    break
+            if changed:
+                break
+
+    return saved
+
+
+def rules_pass(database: RuleDatabase) -> Callable[[Program], int]:
+    def run(program: Program) -> int:
+        return apply_rules(program.asm_lines, database)
+
+    return run
+
+
+def rules_pipeline(database: Optional[RuleDatabase] = None, trace_allocations: bool = False) -> PassManager:
+    pipeline = default_pipeline(trace_allocations)
+    database = RuleDatabase.load() if database is None else database
+    pipeline.add('superopt', rules_pass(database), invalidates=[SYMBOLS], before='relax_prefixes',
+                 config=database.digest())
+    return pipeline
+
+
+if __name__ == '__main__':
+    argument_parser = argparse.ArgumentParser(description='Search for the shortest equivalent BCPU sequence.')
+    argument_parser.add_argument('lines', nargs='+', help='snippet lines, e.g. "LDBC 1" SUB')
+    argument_parser.add_argument('--live', default='AB', help='registers still needed after the snippet')
+    argument_parser.add_argument('--max-length', type=int, default=DEFAULT_MAX_LENGTH)
+    argument_parser.add_argument('--database', default=DEFAULT_DATABASE)
+    argument_parser.add_argument('--save', action='store_true', help='add the discovered rewrite to the database')
+    arguments = argument_parser.parse_args()
+
+    rule = discover(arguments.lines, arguments.live.upper(), arguments.max_length)
+
+    if rule is None:
+        write_lines(sys.stdout, ['no shorter sequence found'])
+    else:
+        write_lines(sys.stdout, [repr(rule)])
+
+        if arguments.save:
+            try:
+                database = RuleDatabase.load(arguments.database)
+            except FileNotFoundError:
+                database = RuleDatabase()
+            database.add(rule)
+            database.save(arguments.database)
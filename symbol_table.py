@@ -0,0 +1,62 @@
+from typing import Dict, List
+
+from asm_line import AsmLine
+
+
+class SymbolError(Exception):
+    pass
+
+
+class SymbolTable:
+    def __init__(self):
+        self.indices: Dict[str, int] = {}
+
+    @classmethod
+    def from_asm_lines(cls, asm_lines: List[AsmLine]):
+        symbol_table = SymbolTable()
+        duplicates = []
+
+        for i, asm_line in enumerate(asm_lines):
+            label = asm_line.label
+
+            if label is None:
+                continue
+
+            if label in symbol_table.indices:
+                duplicates.append(f'{label} at line {i + 1}')
+            else:
+                symbol_table.indices[label] = i
+
+        if duplicates:
+            raise SymbolError(f'Duplicate labels: {", ".join(duplicates)}.')
+
+        return symbol_table
+
+    def __contains__(self, label: str) -> bool:
+        return label in self.indices
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    def index_of(self, label: str) -> int:
+        index = self.indices.get(label)
+
+        if index is None:
+            raise SymbolError(f'Undefined label {label}.')
+
+        return index
+
+    def check_references(self, asm_lines: List[AsmLine]) -> None:
+        undefined = []
+
+        for i, asm_line in enumerate(asm_lines):
+            argument = asm_line.argument
+            if argument is not None and argument.is_label() and argument.label not in self.indices:
+                undefined.append(f'{argument.label} at line {i + 1}')
+
+        if undefined:
+            raise SymbolError(f'Undefined labels: {", ".join(undefined)}.')
+
+    def remap(self, new_indices: List[int]) -> None:
+        for label, label_index in self.indices.items():
+            self.indices[label] = new_indices[label_index]
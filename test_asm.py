@@ -1,39 +1,35 @@
 from unittest import TestCase
 
-from asm import parse_asm_lines, prefix_negative_relative_branch, prefix_positive_relative_branch, high_four_bits, \
-    low_four_bits, \
-    fill_addresses, fill_relative_immediates, prefix_non_relative_branch, \
-    fill_absolute_immediates, fill_data_immediates
+from asm import parse_asm_lines, relax_prefixes, high_four_bits, low_four_bits, fill_addresses, \
+    fill_relative_immediates, fill_absolute_immediates, fill_data_immediates
 
 
-def assert_prefix_positive_relative_branch(input_lines, expected_lines):
+def assert_relax_prefixes(input_lines, expected_lines):
     asm_lines = parse_asm_lines(input_lines)
-    actual = prefix_positive_relative_branch(asm_lines)
+    actual = relax_prefixes(asm_lines)
     expected = parse_asm_lines(expected_lines)
 
     assert actual == expected
 
 
 class Test(TestCase):
-    def test_prefix_negative_relative_branch(self):
-        asm_lines = parse_asm_lines([
+    def test_relax_prefixes_negative_relative_branch(self):
+        input_lines = [
             '.start',
             'LDAM 0',
             'BR .start',
-        ])
-
-        actual = prefix_negative_relative_branch(asm_lines)
+        ]
 
-        expected = parse_asm_lines([
+        expected_lines = [
             '.start',
             'LDAM 0',
             'PFIX 0',
             'BR .start',
-        ])
+        ]
 
-        assert actual == expected
+        assert_relax_prefixes(input_lines, expected_lines)
 
-    def test_prefix_positive_relative_branch_long(self):
+    def test_relax_prefixes_positive_relative_branch_long(self):
         input_lines = [
             '.start',
             'BR .middle',
@@ -47,8 +43,8 @@ class Test(TestCase):
         ]
 
         expected_lines = [
-            'PFIX 0',
             '.start',
+            'PFIX 0',
             'BR .middle',
             'PFIX 0',
             'BR .end',
@@ -60,9 +56,9 @@ class Test(TestCase):
             'LDAM 0',
         ]
 
-        assert_prefix_positive_relative_branch(input_lines, expected_lines)
+        assert_relax_prefixes(input_lines, expected_lines)
 
-    def test_prefix_positive_relative_branch_short(self):
+    def test_relax_prefixes_positive_relative_branch_short(self):
         input_lines = [
             '.start',
             'BR .middle',
@@ -74,20 +70,9 @@ class Test(TestCase):
             'LDAM 0',
         ]
 
-        expected_lines = [
-            '.start',
-            'BR .middle',
-            'BR .end',
-            *['DATA 0'] * 14,
-            '.middle',
-            'LDAM 0',
-            '.end',
-            'LDAM 0',
-        ]
-
-        assert_prefix_positive_relative_branch(input_lines, expected_lines)
+        assert_relax_prefixes(input_lines, input_lines)
 
-    def test_prefix_non_relative_branch(self):
+    def test_relax_prefixes_non_relative_branch(self):
         input_lines = [
             'LDAM .data',
             *['DATA 0'] * 16,
@@ -103,13 +88,9 @@ class Test(TestCase):
             'DATA 1',
         ]
 
-        input_asm_lines = parse_asm_lines(input_lines)
-        actual = prefix_non_relative_branch(input_asm_lines)
-        expected = parse_asm_lines(expected_lines)
-
-        assert actual == expected
+        assert_relax_prefixes(input_lines, expected_lines)
 
-    def test_prefix_non_relative_branch_data(self):
+    def test_relax_prefixes_non_relative_branch_data(self):
         input_lines = [
             'DATA .data',
             *['DATA 0'] * 16,
@@ -117,11 +98,30 @@ class Test(TestCase):
             'DATA 1',
         ]
 
-        input_asm_lines = parse_asm_lines(input_lines)
-        actual = prefix_non_relative_branch(input_asm_lines)
-        expected = parse_asm_lines(input_lines)
+        assert_relax_prefixes(input_lines, input_lines)
+
+    def test_relax_prefixes_shifted_non_relative_branch(self):
+        input_lines = [
+            '.start',
+            'LDAM .data',
+            *['DATA 0'] * 13,
+            'BR .start',
+            '.data',
+            'DATA 1',
+        ]
+
+        expected_lines = [
+            '.start',
+            'PFIX 0',
+            'LDAM .data',
+            *['DATA 0'] * 13,
+            'PFIX 0',
+            'BR .start',
+            '.data',
+            'DATA 1',
+        ]
 
-        assert actual == expected
+        assert_relax_prefixes(input_lines, expected_lines)
 
     def test_high_four_bits(self):
         assert high_four_bits(0b1110001) == 0b111
@@ -0,0 +1,39 @@
+import copy
+from unittest import TestCase
+
+from asm_line import Argument, AsmLine
+
+
+class Test(TestCase):
+    def test_slots(self):
+        asm_line = AsmLine.from_instruction('LDAM', Argument.from_label('.start'))
+
+        assert not hasattr(asm_line, '__dict__')
+        assert not hasattr(asm_line.argument, '__dict__')
+
+    def test_resolve(self):
+        argument = Argument.from_label('.start', 2)
+
+        argument.resolve(5)
+
+        assert argument == Argument.from_immediate(5)
+        assert not argument.is_label()
+
+    def test_copy(self):
+        asm_line = AsmLine.from_data(Argument.from_immediate(3))
+        asm_line.label = '.data'
+
+        actual = copy.copy(asm_line)
+
+        assert isinstance(actual, AsmLine)
+        assert actual == asm_line
+
+    def test_to_int(self):
+        assert AsmLine.from_instruction('BR', Argument.from_immediate(8)).to_int() == 0x98
+        assert AsmLine.from_instruction('ADD', None).to_int() == 0xD0
+        assert AsmLine.from_data(Argument.from_immediate(0x17)).to_int() == 0x17
+
+    def test_repr_offset(self):
+        assert repr(Argument.from_label('.array', -1)) == '.array - 1'
+        assert repr(Argument.from_label('.array', 2)) == '.array + 2'
+        assert repr(Argument.from_label('.array')) == '.array'
@@ -1,6 +1,12 @@
+import io
+import os
+import tempfile
 from unittest import TestCase
 
-from asm import read_file_lines, assemble, to_hex, group_code
+from asm import read_file_lines, assemble, to_hex, group_code, iter_file_lines, iter_assemble, iter_hex_groups, \
+    write_lines, assemble_bytes, iter_intel_hex, write_output, AssemblyError
+from sim import load_image
+from util import parse_intel_hex
 
 
 def assert_programme(programme_name):
@@ -14,9 +20,58 @@ def assert_programme(programme_name):
     assert actual_code == expected_code
 
 
+def assert_programme_stream(programme_name):
+    output = io.StringIO()
+    asm_code = iter_file_lines(f'programmes/{programme_name}.s')
+    write_lines(output, iter_hex_groups(iter_assemble(asm_code)))
+    expected_code = open(f'programmes/{programme_name}.txt').read().strip()
+
+    assert output.getvalue() == f'{expected_code}\n'
+
+
 class Test(TestCase):
     def test_insertion_sort(self):
         assert_programme('insertion_sort')
 
     def test_multiplication(self):
         assert_programme('multiplication')
+
+    def test_insertion_sort_stream(self):
+        assert_programme_stream('insertion_sort')
+
+    def test_multiplication_stream(self):
+        assert_programme_stream('multiplication')
+
+    def test_iter_hex_groups(self):
+        assert list(iter_hex_groups(range(5), 2)) == ['00 01', '02 03', '04']
+        assert list(iter_hex_groups(range(4), 2)) == ['00 01', '02 03']
+
+    def test_assemble_bytes(self):
+        asm_code = read_file_lines('programmes/multiplication.s')
+
+        assert assemble_bytes(asm_code) == bytes(assemble(asm_code))
+
+    def test_iter_intel_hex(self):
+        assert list(iter_intel_hex(bytes([0x94, 0x00, 0x03]), 2)) == [':0200000094006A', ':0100020003FA', ':00000001FF']
+
+    def test_intel_hex_round_trip(self):
+        image = assemble_bytes(read_file_lines('programmes/bubble_sort.s'))
+
+        assert bytes(parse_intel_hex('\n'.join(iter_intel_hex(image)))) == image
+
+    def test_intel_hex_bad_checksum(self):
+        with self.assertRaises(ValueError):
+            parse_intel_hex(':0200000094006B')
+
+    def test_write_output(self):
+        image = assemble_bytes(read_file_lines('programmes/insertion_sort.s'))
+
+        with tempfile.TemporaryDirectory() as directory:
+            for output_format, filename in [('hex', 'out.txt'), ('bin', 'out.bin'), ('ihex', 'out.hex')]:
+                filepath = os.path.join(directory, filename)
+                write_output(filepath, image, output_format)
+
+                assert bytes(load_image(filepath)) == image
+
+            with self.assertRaises(AssemblyError):
+                write_output(os.path.join(directory, 'out.srec'), image, 'srec')
@@ -0,0 +1,117 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from unittest import TestCase
+
+from asm import assemble, read_file_lines, write_file
+from batch import assemble_batch, build_manifest, collect_sources, glob_root, output_path
+from disasm import read_hex_file
+from sim import load_image
+
+
+def make_tree(directory):
+    os.makedirs(os.path.join(directory, 'nested'))
+
+    for programme_name in ['multiplication', 'bubble_sort']:
+        shutil.copy(f'programmes/{programme_name}.s', directory)
+
+    shutil.copy('programmes/insertion_sort.s', os.path.join(directory, 'nested'))
+    write_file(os.path.join(directory, 'nested', 'broken.s'), ['LDAC 1', 'BR .missing'])
+    write_file(os.path.join(directory, 'notes.txt'), ['not a programme'])
+
+
+class Test(TestCase):
+    def test_collect_sources(self):
+        with tempfile.TemporaryDirectory() as directory:
+            make_tree(directory)
+            sources = collect_sources([directory, os.path.join(directory, '*.s')])
+
+            assert [os.path.relpath(source, directory) for source, _ in sources] == [
+                'bubble_sort.s', 'multiplication.s', os.path.join('nested', 'broken.s'),
+                os.path.join('nested', 'insertion_sort.s'),
+            ]
+            assert all(root == directory for _, root in sources)
+
+    def test_same_names_in_different_directories(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for name in ['a', 'b']:
+                os.makedirs(os.path.join(directory, name))
+                write_file(os.path.join(directory, name, 'x.s'), ['LDAC 1', 'HALT'])
+
+            mirror = os.path.join(directory, 'out')
+            by_glob = collect_sources([os.path.join(directory, '**', 'x.s')])
+            by_directories = collect_sources([os.path.join(directory, 'a'), os.path.join(directory, 'b')])
+
+            for sources in [by_glob, by_directories]:
+                results = assemble_batch(sources, 'hex', mirror, 1)
+
+                assert [os.path.relpath(result['output'], mirror) for result in results] == [
+                    os.path.join('a', 'x.txt'), os.path.join('b', 'x.txt'),
+                ]
+                assert all(result['error'] is None for result in results)
+
+    def test_output_clash(self):
+        with tempfile.TemporaryDirectory() as directory:
+            sources = []
+
+            for name in ['a', 'b']:
+                os.makedirs(os.path.join(directory, name))
+                write_file(os.path.join(directory, name, 'x.s'), ['LDAC 1', 'HALT'])
+                sources.append((os.path.join(directory, name, 'x.s'), os.path.join(directory, name)))
+
+            results = assemble_batch(sources, 'hex', os.path.join(directory, 'out'), 2)
+
+            assert all('OutputClash' in result['error'] for result in results)
+            assert not os.path.exists(os.path.join(directory, 'out'))
+
+    def test_glob_root(self):
+        assert glob_root(os.path.join('a', 'b', '**', '*.s')) == os.path.join('a', 'b')
+        assert glob_root('*.s') == ''
+
+    def test_output_path(self):
+        assert output_path('a/b/c.s', 'a', 'bin') == 'a/b/c.bin'
+        assert output_path('a/b/c.s', 'a', 'hex', 'out') == 'out/b/c.txt'
+        assert output_path('c.s', '', 'ihex', 'out') == 'out/c.hex'
+
+    def test_batch_with_error(self):
+        for workers in [1, 2]:
+            with tempfile.TemporaryDirectory() as directory:
+                make_tree(directory)
+                mirror = os.path.join(directory, 'out')
+                results = assemble_batch(collect_sources([directory]), 'bin', mirror, workers)
+                manifest = build_manifest(results, 0.0)
+
+                assert (manifest['assembled'], manifest['failed']) == (3, 1)
+                assert 'missing' in results[2]['error']
+
+                for result in results:
+                    if result['error'] is None:
+                        assert load_image(result['output']) == assemble(read_file_lines(result['source']))
+                        assert result['output'].startswith(mirror)
+                        assert result['size'] == os.path.getsize(result['output'])
+
+    def test_golden_files_untouched(self):
+        with tempfile.TemporaryDirectory() as directory:
+            shutil.copytree('programmes', os.path.join(directory, 'programmes'))
+            golden = {filename: read_file_lines(os.path.join(directory, 'programmes', filename))
+                      for filename in os.listdir('programmes') if filename.endswith('.txt')}
+
+            subprocess.run([sys.executable, os.path.abspath('batch.py'), 'programmes'], cwd=directory,
+                           capture_output=True, check=True)
+
+            for filename, lines in golden.items():
+                assert read_file_lines(os.path.join(directory, 'programmes', filename)) == lines
+                assert read_hex_file(os.path.join(directory, 'build', filename)) == \
+                    assemble(read_file_lines(os.path.join('programmes', filename[:-4] + '.s')))
+
+    def test_in_place(self):
+        with tempfile.TemporaryDirectory() as directory:
+            write_file(os.path.join(directory, 'x.s'), ['LDAC 1', 'HALT'])
+
+            subprocess.run([sys.executable, os.path.abspath('batch.py'), '--in-place', 'x.s'], cwd=directory,
+                           capture_output=True, check=True)
+
+            assert read_hex_file(os.path.join(directory, 'x.txt')) == assemble(['LDAC 1', 'HALT'])
+            assert not os.path.exists(os.path.join(directory, 'build'))
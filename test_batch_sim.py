@@ -0,0 +1,44 @@
+from unittest import TestCase
+
+from batch_sim import BatchMachine, run_batch
+from sim import Machine, load_image
+
+
+class Test(TestCase):
+    def test_multiplication_operands(self):
+        machine_code = load_image('programmes/multiplication.s')
+        operands = [(a, b) for a in range(1, 17) for b in range(0, 256, 15)]
+        patches = [{2: a, 3: b} for a, b in operands]
+
+        memories, cycles = run_batch(machine_code, patches)
+
+        for lane, (a, b) in enumerate(operands):
+            assert memories[lane, 1] == (a * b) & 0xFF
+            assert cycles[lane] == 11 * a + 2
+
+    def test_matches_machine(self):
+        machine_code = load_image('programmes/bubble_sort.s')
+        patches = [{}, {4: 9, 5: 1}, {8: 0}]
+        batch = BatchMachine(machine_code, patches)
+
+        batch.run()
+
+        for lane, patch in enumerate(patches):
+            machine = Machine(machine_code)
+            for address, value in patch.items():
+                machine.memory[address] = value
+            machine.run()
+
+            assert batch.halted[lane]
+            assert batch.cycles[lane] == machine.cycles
+            assert batch.memory[lane].tobytes() == bytes(machine.memory)
+            assert batch.a[lane] == machine.a
+
+    def test_max_cycles(self):
+        batch = BatchMachine([0x90], [{}, {0: 0xFF, 1: 0x9E}])
+
+        batch.run(10)
+
+        assert not batch.halted[0]
+        assert batch.halted[1]
+        assert list(batch.cycles) == [10, 2]
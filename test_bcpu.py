@@ -0,0 +1,45 @@
+import os
+import subprocess
+import sys
+import tempfile
+from unittest import TestCase
+
+import asm
+import bcpu
+import sim
+from asm import assemble, read_file_lines
+from disasm import read_hex_file
+
+
+def imported_modules(statement):
+    code = f'import sys; {statement}; print(" ".join(sys.modules))'
+    return subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout.split()
+
+
+class Test(TestCase):
+    def test_defaults_match_modules(self):
+        assert bcpu.OUTPUT_FORMATS == asm.OUTPUT_FORMATS
+        assert bcpu.DEFAULT_MAX_CYCLES == sim.DEFAULT_MAX_CYCLES
+
+    def test_asm(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'out.txt')
+
+            assert bcpu.main(['asm', 'programmes/insertion_sort.s', output]) == 0
+            assert read_hex_file(output) == assemble(read_file_lines('programmes/insertion_sort.s'))
+
+    def test_sim_exit_status(self):
+        with tempfile.TemporaryDirectory() as directory:
+            source = os.path.join(directory, 'loop.s')
+            asm.write_file(source, ['.loop', 'LDAC 1', 'BR .loop'])
+
+            assert bcpu.main(['sim', 'programmes/multiplication.s']) == 0
+            assert bcpu.main(['sim', source, '--max-cycles', '100']) == 1
+
+    def test_lazy_imports(self):
+        modules = imported_modules('import bcpu; bcpu.build_parser()')
+
+        assert 'asm' not in modules
+        assert 'sim' not in modules
+        assert 'mcschematic' not in imported_modules('import schem')
+        assert 'numpy' not in imported_modules('import schem')
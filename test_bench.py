@@ -0,0 +1,50 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from asm import assemble_asm_lines
+from bench import compare, generate_programme, main, scaling_exponent, suite, time_phases
+
+
+class Test(TestCase):
+    def test_generate_programme(self):
+        asm_lines = assemble_asm_lines(generate_programme(200, label_density=0.5))
+        mnemonics = [asm_line.mnemonic for asm_line in asm_lines]
+
+        assert any(asm_line.synthetic for asm_line in asm_lines)
+        assert sum(1 for asm_line in asm_lines if asm_line.is_data) == 32
+        assert {'BR', 'BRZ', 'BRN', 'LDAM', 'STAM', 'ADD'} <= set(mnemonics)
+        assert generate_programme(50, seed=3) == generate_programme(50, seed=3)
+
+    def test_suite(self):
+        assert list(suite((16, 32))) == ['sparse_16', 'dense_16', 'sparse_32', 'dense_32']
+
+    def test_time_phases(self):
+        phases = time_phases(generate_programme(64), schem=False)
+
+        assert set(phases) == {'parse', 'prefix', 'fills', 'encode', 'total'}
+        assert abs(phases['total'] - sum(phases[phase] for phase in ['parse', 'prefix', 'fills', 'encode'])) < 1e-9
+
+    def test_compare(self):
+        baseline = {'dense_64': {'parse': 0.010, 'fills': 0.0001}}
+        results = {'dense_64': {'parse': 0.020, 'fills': 0.0004}, 'dense_128': {'parse': 1.0}}
+
+        assert compare(results, baseline) == ['dense_64 parse: 20.000 ms, baseline 10.000 ms']
+        assert compare(results, baseline, threshold=1.5) == []
+
+    def test_scaling_exponent(self):
+        results = {f'dense_{size}': {'total': size * 0.001, 'schem': 0.0} for size in [64, 128, 256]}
+        results['sparse_64'] = {'total': 1.0}
+
+        assert abs(scaling_exponent(results, 'dense_') - 1.0) < 1e-9
+        assert scaling_exponent(results, 'sparse_') is None
+
+    def test_main_baseline(self):
+        with tempfile.TemporaryDirectory() as directory:
+            baseline = os.path.join(directory, 'baseline.json')
+            arguments = ['--sizes', '16', '32', '--repeats', '1', '--no-schem', '--baseline', baseline]
+
+            assert main(arguments) == 1
+            assert main([*arguments, '--save-baseline']) == 0
+            assert os.path.exists(baseline)
+            assert main([*arguments, '--threshold', '100', '--max-exponent', '10']) == 0
@@ -0,0 +1,100 @@
+from unittest import TestCase
+
+from asm import assemble
+from block_sim import BlockMachine, HOT_THRESHOLD
+from sim import Machine, load_image
+
+SELF_MODIFYING = [
+    '.start',
+    'LDAM .count',
+    'BRZ .done',
+    'LDBC 1',
+    'SUB',
+    'STAM .count',
+    '.target',
+    'LDAC 1',
+    'STAM .result',
+    'PFIX 3',
+    'LDAC 2',
+    'STAM .target',
+    'BR .start',
+    '.done',
+    'HALT',
+    '.count',
+    'DATA 2',
+    '.result',
+    'DATA 0',
+]
+
+
+def assert_same_as_machine(machine_code):
+    expected = Machine(machine_code)
+    expected.run()
+
+    for hot_threshold in [1, 2, HOT_THRESHOLD]:
+        actual = BlockMachine(machine_code, hot_threshold)
+        actual.run()
+
+        assert actual.halted == expected.halted
+        assert actual.cycles == expected.cycles
+        assert actual.memory == expected.memory
+        assert (actual.a, actual.b, actual.pc) == (expected.a, expected.b, expected.pc)
+
+
+class Test(TestCase):
+    def test_programmes(self):
+        for programme_name in ['bubble_sort', 'insertion_sort', 'multiplication']:
+            assert_same_as_machine(load_image(f'programmes/{programme_name}.s'))
+
+    def test_self_modifying_code(self):
+        machine_code = assemble(SELF_MODIFYING)
+        target = machine_code.index(0x31)
+        machine = BlockMachine(machine_code, hot_threshold=1)
+
+        machine.run()
+
+        assert machine.memory[target] == 0x32
+        assert machine.memory[len(machine_code) - 1] == 2
+        assert machine.invalidations > 0
+        assert_same_as_machine(machine_code)
+
+    def test_loop_compiled_into_block(self):
+        machine = BlockMachine(assemble(['.loop', 'LDBC 1', 'ADD', 'BR .loop']))
+
+        machine.run(300)
+
+        assert machine.translations == 1
+        assert machine.cycles >= 300
+        assert not machine.halted
+        assert 'continue' in machine.sources[0]
+
+    def test_resume_after_prefix_step(self):
+        machine_code = assemble(['PFIX 1', 'LDAC 2', 'HALT'])
+        machine = BlockMachine(machine_code)
+
+        machine.step()
+        machine.run()
+
+        assert machine.halted
+        assert machine.a == 0x12
+        assert machine.cycles == 4
+
+    def test_short_programme_interpreted(self):
+        machine = BlockMachine(load_image('programmes/insertion_sort.s'))
+
+        machine.run()
+
+        assert machine.halted
+        assert machine.translations == 0
+        assert 0 < max(machine.entries) < HOT_THRESHOLD
+
+    def test_hot_loop_translated(self):
+        machine = BlockMachine(assemble(['.loop', 'LDBC 1', 'ADD', 'BR .loop']))
+
+        machine.run(10)
+
+        assert machine.translations == 0
+        machine.run(300)
+
+        assert machine.translations == 1
+        assert machine.entries[0] == HOT_THRESHOLD
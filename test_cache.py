@@ -0,0 +1,129 @@
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+
+from asm import assemble, default_pipeline, read_file_lines
+from cache import BuildCache, assembler_version, cached_assemble, cached_schem, file_digest, pipeline_key, IMAGE
+from peephole import optimising_pipeline
+from superopt import RuleDatabase, Rule, rules_pipeline
+
+
+class Test(TestCase):
+    def test_key(self):
+        cache = BuildCache()
+
+        assert cache.key(b'LDAC 1', IMAGE) == cache.key(b'LDAC 1', IMAGE)
+        assert cache.key(b'LDAC 1', IMAGE) != cache.key(b'LDAC 2', IMAGE)
+        assert cache.key(b'LDAC 1', IMAGE) != cache.key(b'LDAC 1', IMAGE, 'peephole')
+
+    def test_assembler_version(self):
+        assert assembler_version() == BuildCache().version
+        assert len(assembler_version()) == 64
+
+    def test_get_put(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = BuildCache(directory)
+            key = cache.key(b'source', IMAGE)
+
+            assert cache.get(key, IMAGE) is None
+            cache.put(key, IMAGE, b'\x01\x02')
+            assert cache.get(key, IMAGE) == b'\x01\x02'
+            assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_running_total(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = BuildCache(directory, max_bytes=100)
+            keys = [cache.key(bytes([i]), IMAGE) for i in range(4)]
+
+            for key in keys:
+                cache.put(key, IMAGE, bytes(10))
+            cache.put(keys[0], IMAGE, bytes(20))
+
+            assert cache.total == cache.size() == 50
+
+    def test_concurrent_put(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = BuildCache(directory)
+            key = cache.key(b'source', IMAGE)
+
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                list(executor.map(lambda i: BuildCache(directory).put(key, IMAGE, bytes([i]) * 64), range(32)))
+
+            assert len(cache.get(key, IMAGE)) == 64
+            assert [path for _, _, path in cache.entries()] == [cache.path(key, IMAGE)]
+
+    def test_cached_assemble(self):
+        filepath = 'programmes/bubble_sort.s'
+        expected = bytes(assemble(read_file_lines(filepath)))
+
+        with tempfile.TemporaryDirectory() as directory:
+            cache = BuildCache(directory)
+            cold_image, cold_map = cached_assemble(filepath, cache)
+            warm_image, warm_map = cached_assemble(filepath, cache)
+
+            assert cold_image == warm_image == expected
+            assert cold_map == warm_map
+            assert warm_map[0].file == filepath
+            assert cache.hits == 2
+
+            optimised_image, _ = cached_assemble(filepath, cache, optimising_pipeline())
+
+            assert optimised_image == expected
+            assert cache.hits == 2
+
+    def test_pipeline_key(self):
+        database = RuleDatabase.load()
+        edited = RuleDatabase(list(database.rules))
+        edited.add(Rule(['LDAC 0', 'ADD'], [], 'AB'))
+
+        assert pipeline_key(None) == pipeline_key(default_pipeline())
+        assert pipeline_key(rules_pipeline(database)) == pipeline_key(rules_pipeline(RuleDatabase.load()))
+        assert pipeline_key(rules_pipeline(database)) != pipeline_key(rules_pipeline(edited))
+
+    def test_file_digest(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filepath = os.path.join(directory, 'rom.schem')
+
+            with open(filepath, 'wb') as file:
+                file.write(b'first')
+            first = file_digest(filepath)
+
+            with open(filepath, 'wb') as file:
+                file.write(b'second')
+
+            assert file_digest(filepath) != first
+
+    def test_cached_schem_creates_directory(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = BuildCache(os.path.join(directory, 'cache'))
+            cold = cached_schem(bytes([1, 2, 3]), 'cold', cache, os.path.join(directory, 'cold'))
+            warm = cached_schem(bytes([1, 2, 3]), 'warm', cache, os.path.join(directory, 'warm'))
+
+            with open(cold, 'rb') as cold_file, open(warm, 'rb') as warm_file:
+                assert cold_file.read() == warm_file.read()
+            assert cache.hits == 1
+
+    def test_no_cache(self):
+        image, source_map = cached_assemble('programmes/multiplication.s')
+
+        assert image == bytes(assemble(read_file_lines('programmes/multiplication.s')))
+        assert len(source_map) == len(image)
+
+    def test_evicts_least_recently_used(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = BuildCache(directory, max_bytes=20)
+            keys = [cache.key(bytes([i]), IMAGE) for i in range(3)]
+
+            cache.put(keys[0], IMAGE, bytes(8))
+            cache.put(keys[1], IMAGE, bytes(8))
+            os.utime(cache.path(keys[0], IMAGE), (time.time() - 10, time.time() - 10))
+            os.utime(cache.path(keys[1], IMAGE), (time.time() - 5, time.time() - 5))
+            cache.get(keys[0], IMAGE)
+            cache.put(keys[2], IMAGE, bytes(8))
+
+            assert cache.get(keys[0], IMAGE) is not None
+            assert cache.get(keys[1], IMAGE) is None
+            assert cache.get(keys[2], IMAGE) is not None
+            assert cache.size() == 16
@@ -0,0 +1,43 @@
+from unittest import TestCase
+
+from asm import assemble
+from cfg import decode_instructions, build_cfg, find_loops
+from sim import load_image
+
+
+class Test(TestCase):
+    def test_decode_merges_prefixes(self):
+        machine_code = assemble([
+            '.loop',
+            'BRZ .end',
+            'BR .loop',
+            '.end',
+            'HALT',
+        ])
+
+        result = decode_instructions(machine_code)
+
+        assert [(instruction.address, instruction.size, instruction.mnemonic) for instruction in result] == [
+            (0, 1, 'BRZ'),
+            (1, 2, 'BR'),
+            (3, 2, 'BR'),
+        ]
+        assert result[1].target() == 0
+        assert not result[1].is_halt()
+        assert result[2].is_halt()
+
+    def test_build_cfg(self):
+        blocks = build_cfg(load_image('programmes/multiplication.s'))
+
+        assert sorted(blocks) == [0x0, 0x4, 0xD, 0xF, 0x10]
+        assert blocks[0x4].successors == [0xF, 0xD]
+        assert blocks[0xD].successors == [0x4]
+        assert blocks[0x10].successors == []
+
+    def test_find_loops(self):
+        blocks = build_cfg(load_image('programmes/bubble_sort.s'))
+
+        result = {loop.header: loop for loop in find_loops(blocks)}
+
+        assert sorted(result) == [0x9, 0x10]
+        assert result[0x10].body < result[0x9].body
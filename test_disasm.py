@@ -0,0 +1,75 @@
+import random
+from unittest import TestCase
+
+from asm import assemble, read_file_lines
+from disasm import disassemble, disassemble_to_source, find_code, read_hex_file, to_source
+
+
+def assert_round_trip(machine_code):
+    source = disassemble_to_source(machine_code)
+
+    assert assemble(source) == machine_code
+
+
+class Test(TestCase):
+    def test_round_trip_programmes(self):
+        for programme_name in ['bubble_sort', 'insertion_sort', 'multiplication']:
+            assert_round_trip(read_hex_file(f'programmes/{programme_name}.txt'))
+
+    def test_round_trip_random(self):
+        generator = random.Random(0)
+
+        for _ in range(200):
+            machine_code = [generator.randrange(256) for _ in range(generator.randrange(1, 64))]
+            assert_round_trip(machine_code)
+
+    def test_find_code(self):
+        machine_code = assemble(read_file_lines('programmes/multiplication.s'))
+
+        code = find_code(machine_code)
+
+        assert list(code[:4]) == [1, 0, 0, 0]
+        assert all(code[4:])
+
+    def test_disassemble_labels(self):
+        machine_code = assemble([
+            'BR .start',
+            '.value',
+            'DATA 7',
+            '.start',
+            'LDAM .value',
+            'HALT',
+        ])
+
+        actual = to_source(disassemble(machine_code))
+
+        assert actual == [
+            'BR .label_02',
+            '.data_01',
+            'DATA 7',
+            '.label_02',
+            'LDAM .data_01',
+            'HALT',
+        ]
+
+    def test_disassemble_fold_prefix(self):
+        machine_code = assemble([
+            '.start',
+            'LDAM .end',
+            *['ADD'] * 15,
+            'BR .start',
+            '.end',
+            'DATA 1',
+        ])
+
+        actual = to_source(disassemble(machine_code))
+
+        assert actual[0:3] == ['.label_00', 'LDAM .data_13', 'ADD']
+        assert actual[-3:] == ['BR .label_00', '.data_13', 'DATA 1']
+
+    def test_disassemble_redundant_prefix(self):
+        machine_code = [0xF0, 0x91, 0x00, 0x9F]
+
+        actual = to_source(disassemble(machine_code))
+
+        assert actual[:2] == ['PFIX 0', 'BR 1']
@@ -0,0 +1,29 @@
+from unittest import TestCase
+
+import instructions
+
+
+class Test(TestCase):
+    def test_opcodes(self):
+        assert len(instructions.OPCODES) == 16
+        assert instructions.OPCODES['LDAM'] == 0
+        assert instructions.OPCODES['BR'] == 9
+        assert instructions.OPCODES['PFIX'] == 0xF
+
+    def test_operand_kinds(self):
+        assert instructions.RELATIVE_BRANCHES == {'BR', 'BRZ', 'BRN'}
+        assert 'BRB' in instructions.ABSOLUTE_OPERANDS
+        assert 'ADD' not in instructions.ABSOLUTE_OPERANDS
+        assert instructions.RELATIVE_BRANCHES.isdisjoint(instructions.ABSOLUTE_OPERANDS)
+
+    def test_decode_table(self):
+        assert len(instructions.DECODE_TABLE) == 256
+
+        for byte, decoded in enumerate(instructions.DECODE_TABLE):
+            assert (decoded.opcode << 4) + decoded.operand == byte
+            assert instructions.OPCODES[decoded.mnemonic] == decoded.opcode
+
+        decoded = instructions.DECODE_TABLE[0xA7]
+        assert decoded.mnemonic == 'BRZ'
+        assert decoded.operand == 7
+        assert decoded.flags & instructions.CONDITIONAL
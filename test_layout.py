@@ -0,0 +1,130 @@
+from unittest import TestCase
+
+from asm import assemble, read_file_lines, default_pipeline
+from disasm import to_source
+from layout import parse_source, analyse_blocks, layout, layout_pass, profile_guided_layout, LayoutStatistics
+from passes import SYMBOLS
+from sim import Machine
+
+PROGRAMMES = ['bubble_sort', 'insertion_sort', 'multiplication']
+
+
+def run(asm_code):
+    machine = Machine(assemble(asm_code))
+    machine.run()
+    return machine
+
+
+class Test(TestCase):
+    def test_analyse_blocks(self):
+        blocks, fixed = analyse_blocks(parse_source(read_file_lines('programmes/multiplication.s')))
+
+        assert [(block.first, block.last) for block in blocks] == [(0, 0), (4, 12), (13, 13), (14, 16)]
+        assert blocks[1].fallthrough == 2
+        assert blocks[1].target == 3
+        assert blocks[2].jump == 1
+        assert fixed == set()
+
+    def test_fallthrough_gets_branch(self):
+        asm_lines = parse_source([
+            'LDAC 1',
+            'BRZ .cold',
+            'ADD',
+            'HALT',
+            '.cold',
+            'SUB',
+            'HALT',
+        ])
+        statistics = LayoutStatistics()
+
+        result = layout(asm_lines, {(0, 2): 10}, statistics)
+
+        assert to_source(result) == [
+            'LDAC 1',
+            'BRZ .cold',
+            'BR .layout_0',
+            '.cold',
+            'SUB',
+            'PFIX 15',
+            'BR 14',
+            '.layout_0',
+            'ADD',
+            'PFIX 15',
+            'BR 14',
+        ]
+        assert statistics.moved == 2
+        assert statistics.added_branches == 1
+
+    def test_jump_becomes_fallthrough(self):
+        asm_lines = parse_source([
+            'LDAC 1',
+            'BR .hot',
+            '.cold',
+            'SUB',
+            'HALT',
+            '.hot',
+            'ADD',
+            'HALT',
+        ])
+        statistics = LayoutStatistics()
+
+        result = layout(asm_lines, {(0, 2): 1}, statistics)
+
+        assert to_source(result) == ['LDAC 1', '.hot', 'ADD', 'PFIX 15', 'BR 14', '.cold', 'SUB', 'PFIX 15', 'BR 14']
+        assert statistics.removed_branches == 1
+
+    def test_offset_reference_keeps_segment(self):
+        asm_code = [
+            'BRZ .b',
+            '.a',
+            'LDAC .a + 3',
+            'HALT',
+            '.b',
+            'ADD',
+            'BR .a',
+        ]
+        statistics = LayoutStatistics()
+
+        result = layout(parse_source(asm_code), statistics=statistics)
+
+        assert to_source(result) == to_source(parse_source(asm_code))
+        assert statistics.fixed_segments == 1
+
+    def test_layout_preserves_behaviour(self):
+        for programme_name in PROGRAMMES:
+            asm_code = read_file_lines(f'programmes/{programme_name}.s')
+            original = run(asm_code)
+
+            for laid_out in (layout(parse_source(asm_code)), profile_guided_layout(asm_code)[0]):
+                machine = run(to_source(laid_out))
+
+                assert machine.halted
+                assert machine.a == original.a
+
+    def test_profile_guided_layout(self):
+        asm_code = read_file_lines('programmes/insertion_sort.s')
+
+        result, statistics = profile_guided_layout(asm_code)
+
+        assert run(to_source(result)).cycles < run(asm_code).cycles
+        assert statistics.moved > 0
+        assert not statistics.kept_original
+
+    def test_kept_original(self):
+        asm_code = read_file_lines('programmes/multiplication.s')
+
+        result, statistics = profile_guided_layout(asm_code)
+
+        assert to_source(result) == to_source(parse_source(asm_code))
+        assert statistics.kept_original
+
+    def test_layout_pass(self):
+        asm_code = read_file_lines('programmes/insertion_sort.s')
+        pipeline = default_pipeline()
+        pipeline.add('layout', layout_pass, invalidates=[SYMBOLS], before='relax_prefixes')
+
+        machine = Machine(assemble(asm_code, pipeline))
+        machine.run()
+
+        assert list(machine.memory[3:8]) == list(run(asm_code).memory[3:8])
+        assert pipeline.statistics[pipeline.index_of('layout')].touched > 0
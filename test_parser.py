@@ -61,4 +61,14 @@ class Test(TestCase):
         expected_asm_line_1 = AsmLine.from_instruction('PFIX', Argument.from_immediate(15))
         expected_asm_line_1.label = '.end'
         assert actual[1] == expected_asm_line_1
-        assert actual[2] == AsmLine.from_instruction('BR', Argument.from_immediate(14))
\ No newline at end of file
+        assert actual[2] == AsmLine.from_instruction('BR', Argument.from_immediate(14))
+
+    def test_parse_asm_lines_label_after_alias(self):
+        actual = parse_asm_lines([
+            '.end',
+            'HALT',
+            'LDAM 1',
+        ])
+
+        assert len(actual) == 3
+        assert actual[2].label is None
@@ -0,0 +1,59 @@
+from unittest import TestCase
+
+from asm import default_pipeline, assemble, read_file_lines, AssemblyError
+from parser import parse_asm_lines
+from passes import PassManager, Program, PassError, SYMBOLS
+
+
+def count_lines_pass(program):
+    return len(program.asm_lines)
+
+
+class Test(TestCase):
+    def test_default_pipeline_statistics(self):
+        pipeline = default_pipeline()
+
+        assemble(read_file_lines('programmes/insertion_sort.s'), pipeline)
+
+        assert [statistics.name for statistics in pipeline.statistics] == pipeline.names()
+        relax_statistics = pipeline.statistics[pipeline.index_of('relax_prefixes')]
+        assert relax_statistics.touched == 5
+        assert relax_statistics.lines == 55
+        assert all(statistics.seconds >= 0 for statistics in pipeline.statistics)
+
+    def test_trace_allocations(self):
+        pipeline = default_pipeline(trace_allocations=True)
+
+        assemble(read_file_lines('programmes/multiplication.s'), pipeline)
+
+        assert all(statistics.peak_bytes is not None for statistics in pipeline.statistics)
+        assert len(pipeline.report()) == len(pipeline.statistics)
+
+    def test_add_before(self):
+        pipeline = default_pipeline()
+
+        pipeline.add('count_lines', count_lines_pass, before='relax_prefixes')
+
+        assert pipeline.names()[pipeline.index_of('relax_prefixes') - 1] == 'count_lines'
+
+    def test_add_duplicate(self):
+        pipeline = PassManager()
+        pipeline.add('count_lines', count_lines_pass)
+
+        with self.assertRaises(PassError):
+            pipeline.add('count_lines', count_lines_pass)
+
+    def test_invalidate_symbols(self):
+        program = Program(parse_asm_lines(['.start', 'DATA 0']))
+        symbol_table = program.symbol_table
+
+        program.invalidate([SYMBOLS])
+
+        assert program.symbol_table is not symbol_table
+
+    def test_fill_requires_addresses(self):
+        pipeline = default_pipeline()
+        pipeline.remove('fill_addresses')
+
+        with self.assertRaises(AssemblyError):
+            assemble(['.start', 'BR .start'], pipeline)
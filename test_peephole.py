@@ -0,0 +1,130 @@
+from unittest import TestCase
+
+from asm import assemble, read_file_lines
+from parser import parse_asm_lines
+from peephole import optimise, optimising_pipeline, PeepholeStatistics
+from sim import Machine
+
+
+def assert_optimise(input_lines, expected_lines):
+    actual = optimise(parse_asm_lines(input_lines))
+    expected = parse_asm_lines(expected_lines)
+
+    assert actual == expected
+
+
+class Test(TestCase):
+    def test_redundant_store(self):
+        assert_optimise(['LDAM .x', 'STAM .x', 'HALT', '.x', 'DATA 1'], ['LDAM .x', 'HALT', '.x', 'DATA 1'])
+
+    def test_redundant_load(self):
+        assert_optimise(['STAM .x', 'LDAM .x', 'HALT', '.x', 'DATA 1'], ['STAM .x', 'HALT', '.x', 'DATA 1'])
+
+    def test_labelled_load_kept(self):
+        input_lines = [
+            'STAM .x',
+            '.entry',
+            'LDAM .x',
+            'BR .entry',
+            '.x',
+            'DATA 1',
+        ]
+
+        assert_optimise(input_lines, input_lines)
+
+    def test_dead_load_moves_label(self):
+        assert_optimise(
+            ['.start', 'LDAC 0', 'LDAM .x', 'BRZ .start', 'HALT', '.x', 'DATA 1'],
+            ['.start', 'LDAM .x', 'BRZ .start', 'HALT', '.x', 'DATA 1'],
+        )
+
+    def test_dead_load_reads_a(self):
+        input_lines = ['LDAC 3', 'LDAI 0', 'HALT']
+
+        assert_optimise(input_lines, input_lines)
+
+    def test_branch_to_next(self):
+        assert_optimise(['BRZ .next', '.next', 'HALT'], ['.next', 'HALT'])
+
+    def test_thread_jump(self):
+        assert_optimise(
+            ['BRZ .a', 'ADD', '.a', 'BR .b', 'SUB', '.b', 'HALT'],
+            ['BRZ .b', 'ADD', '.a', 'BR .b', 'SUB', '.b', 'HALT'],
+        )
+
+    def test_thread_jump_needs_prefix(self):
+        input_lines = ['BRZ .a', 'ADD', '.a', 'BR .b'] + ['SUB'] * 20 + ['.b', 'HALT']
+
+        assert_optimise(input_lines, input_lines)
+
+    def test_thread_jump_backward(self):
+        input_lines = ['LDAC 1', '.top', 'LDBC 1', 'SUB', 'BRZ .hop'] + ['ADD'] * 4 + ['.hop', 'BR .top']
+
+        assert_optimise(input_lines, input_lines)
+
+    def test_thread_jump_cycle(self):
+        input_lines = ['BRZ .a', 'ADD', '.a', 'BR .b', '.b', 'BR .a']
+
+        assert_optimise(input_lines, input_lines)
+
+    def test_zero_prefix(self):
+        assert_optimise(['PFIX 0', 'LDAC 1', 'HALT'], ['LDAC 1', 'HALT'])
+
+    def test_offset_reference_pinned(self):
+        input_lines = [
+            'LDAM .data + 2',
+            'HALT',
+            '.data',
+            'LDAC 1',
+            'LDAC 2',
+            'DATA 7',
+        ]
+
+        assert_optimise(input_lines, input_lines)
+
+    def test_statistics(self):
+        statistics = PeepholeStatistics()
+
+        optimise(parse_asm_lines(['LDAC 1', 'LDAC 2', 'BR .end', '.end', 'HALT']), statistics=statistics)
+
+        assert statistics.bytes_saved == 2
+        assert statistics.cycles_saved == 2
+        assert statistics.applied == {'dead_load': 1, 'branch_to_next': 1}
+
+    def test_pipeline_preserves_behaviour(self):
+        asm_code = [
+            'LDAC 0',
+            'LDAM .a',
+            'STAM .a',
+            'BR .loop',
+            '.loop',
+            'LDBC 1',
+            'SUB',
+            'STAM .a',
+            'LDAM .a',
+            'BRZ .end',
+            'BR .jump',
+            '.jump',
+            'BR .loop',
+            '.end',
+            'HALT',
+            '.a',
+            'DATA 5',
+        ]
+        pipeline = optimising_pipeline()
+        original = Machine(assemble(asm_code))
+        optimised = Machine(assemble(asm_code, pipeline))
+
+        original.run()
+        optimised.run()
+
+        assert optimised.halted
+        assert optimised.a == original.a
+        assert optimised.cycles < original.cycles
+        assert pipeline.statistics[pipeline.index_of('peephole')].touched == 5
+
+    def test_programmes_unchanged(self):
+        for programme_name in ['bubble_sort', 'insertion_sort', 'multiplication']:
+            asm_code = read_file_lines(f'programmes/{programme_name}.s')
+
+            assert assemble(asm_code, optimising_pipeline()) == assemble(asm_code)
@@ -0,0 +1,136 @@
+from unittest import TestCase
+
+from asm import assemble, read_file_lines, default_pipeline
+from disasm import to_source
+from layout import parse_source
+from passes import SYMBOLS
+from placement import find_units, place_data, placement_pass, profile_guided_placement, PlacementStatistics
+from sim import Machine
+from symbol_table import SymbolTable
+
+DATA_AT_END = [
+    '.start',
+    'LDAM .result',
+    'LDBM .b',
+    'ADD',
+    'STAM .result',
+    'LDAM .a',
+    'LDBC 1',
+    'SUB',
+    'STAM .a',
+    'BRZ .end',
+    'BR .start',
+    '.end',
+    'LDAM .result',
+    'HALT',
+    '.table',
+    'DATA 1',
+    'DATA 2',
+    'DATA 3',
+    'DATA 4',
+    '.result',
+    'DATA 0',
+    '.a',
+    'DATA 9',
+    '.b',
+    'DATA 23',
+]
+
+
+def run(asm_code):
+    machine = Machine(assemble(asm_code))
+    machine.run()
+    return machine
+
+
+LABELLED_ENTRY = ['.top', 'BR .main'] + ['DATA 0'] * 20 + [
+    '.x',
+    'DATA 3',
+    '.main',
+    'LDAM .x',
+    'LDBC 1',
+    'SUB',
+    'STAM .x',
+    'BRZ .done',
+    'BR .top',
+    '.done',
+    'HALT',
+]
+
+
+class Test(TestCase):
+    def test_find_units(self):
+        asm_lines = parse_source(read_file_lines('programmes/bubble_sort.s'))
+
+        units = find_units(asm_lines, SymbolTable.from_asm_lines(asm_lines))
+
+        assert [(unit.first, unit.last, unit.pinned) for unit in units] == [(1, 1, False), (2, 2, False), (3, 8, True)]
+
+    def test_hot_data_moved_below_prefix_range(self):
+        statistics = PlacementStatistics()
+
+        result = to_source(place_data(parse_source(DATA_AT_END), statistics=statistics))
+
+        assert result[:7] == ['BR .start', '.result', 'DATA 0', '.a', 'DATA 9', '.b', 'DATA 23']
+        assert result[-5:] == ['.table', 'DATA 1', 'DATA 2', 'DATA 3', 'DATA 4']
+        assert statistics.changed
+        assert statistics.hot_lines == 3
+        assert run(result).a == run(DATA_AT_END).a
+        assert len(assemble(result)) < len(assemble(DATA_AT_END))
+        assert run(result).cycles < run(DATA_AT_END).cycles
+
+    def test_labelled_entry_jump(self):
+        result = to_source(place_data(parse_source(LABELLED_ENTRY)))
+
+        assert result[:2] == ['.top', 'BR .main']
+        assert result[2:4] == ['.x', 'DATA 3']
+        assert run(result).halted
+        assert run(result).a == run(LABELLED_ENTRY).a == 0
+        assert run(result).cycles < run(LABELLED_ENTRY).cycles
+
+    def test_programmes_unchanged(self):
+        for programme_name in ['bubble_sort', 'insertion_sort', 'multiplication']:
+            asm_code = read_file_lines(f'programmes/{programme_name}.s')
+            statistics = PlacementStatistics()
+
+            result = place_data(parse_source(asm_code), statistics=statistics)
+
+            assert to_source(result) == to_source(parse_source(asm_code))
+            assert not statistics.changed
+
+    def test_offset_reference_pinned(self):
+        asm_code = [
+            'LDAM .buffer + 1',
+            'HALT',
+            '.buffer',
+            'DATA 0',
+            '.x',
+            'DATA 5',
+        ]
+
+        result = place_data(parse_source(asm_code))
+
+        assert to_source(result) == to_source(parse_source(asm_code))
+
+    def test_literal_address_keeps_layout(self):
+        asm_code = ['LDAM 3', 'LDAM .x', 'HALT', '.x', 'DATA 5'] + ['ADD'] * 16
+
+        result = place_data(parse_source(asm_code))
+
+        assert to_source(result) == to_source(parse_source(asm_code))
+
+    def test_profile_guided_placement(self):
+        result, statistics = profile_guided_placement(DATA_AT_END)
+
+        assert statistics.changed
+        assert run(to_source(result)).a == 23 * 9 & 0xFF
+
+    def test_placement_pass(self):
+        pipeline = default_pipeline()
+        pipeline.add('placement', placement_pass, invalidates=[SYMBOLS], before='relax_prefixes')
+
+        machine = Machine(assemble(DATA_AT_END, pipeline))
+        machine.run()
+
+        assert machine.a == run(DATA_AT_END).a
+        assert pipeline.statistics[pipeline.index_of('placement')].touched > 0
@@ -0,0 +1,41 @@
+from unittest import TestCase
+
+from asm import assemble_with_source_map, read_file_lines
+from profiler import profile, profile_file
+
+
+class Test(TestCase):
+    def test_profile_file(self):
+        result = profile_file('programmes/multiplication.s')
+
+        assert result.halted
+        assert result.total_cycles() == 35
+        assert result.by_label()[0].key == '.start'
+        assert result.by_label()[0].cycles == 31
+
+    def test_prefix_cycles_attributed_to_line(self):
+        machine_code, source_map = assemble_with_source_map([
+            'LDAC 2',
+            '.loop',
+            'LDBC 1',
+            'SUB',
+            'BRZ .end',
+            'BR .loop',
+            '.end',
+            'HALT',
+        ], 'loop.s')
+
+        result = profile(machine_code, source_map)
+        rows = {row.key: row for row in result.by_line()}
+
+        assert rows['loop.s:6'].cycles == 2
+        assert rows['loop.s:6'].instructions == 1
+
+    def test_report(self):
+        source_lines = read_file_lines('programmes/bubble_sort.s')
+        result = profile_file('programmes/bubble_sort.s')
+
+        report = result.report(source_lines, limit=3)
+
+        assert 'BRZ .start' in report[1]
+        assert result.to_dict()['total_cycles'] == 431
@@ -0,0 +1,85 @@
+import gzip
+import os
+import tempfile
+from unittest import TestCase
+
+import mcschematic
+
+from schem import BCPURomBuilder, POSITIONS, TEMPLATE_PATH, BARREL_15, load_template, set_blocks
+
+
+class Test(TestCase):
+    def test_positions(self):
+        assert len(POSITIONS) == 256
+        assert len(set(POSITIONS)) == 256
+        assert POSITIONS[0] == (0, -14, -7)
+        assert POSITIONS[1 * 8 + 7] == (2, 1, -7)
+        assert POSITIONS[17 * 8] == (2, -13, -1)
+
+    def test_template_is_shared(self):
+        first = BCPURomBuilder()
+        second = BCPURomBuilder()
+        first.write_byte(0xFF, 0)
+
+        assert load_template(TEMPLATE_PATH) is load_template(TEMPLATE_PATH)
+        assert first.rom.getBlockDataAt(POSITIONS[0]) == BARREL_15
+        assert load_template().getBlockDataAt(POSITIONS[0]) != BARREL_15
+        assert second.rom.getBlockDataAt(POSITIONS[0]) == load_template().getBlockDataAt(POSITIONS[0])
+
+    def test_write_image(self):
+        image = bytes([0x00, 0x01, 0x80, 0xFF, 0x5A] + list(range(27)))
+        bulk = BCPURomBuilder()
+        bulk.write_image(image)
+        single = BCPURomBuilder()
+
+        for address, byte in enumerate(image):
+            single.write_byte(byte, address)
+
+        for position in POSITIONS:
+            assert bulk.rom.getBlockDataAt(position) == single.rom.getBlockDataAt(position)
+
+        with tempfile.TemporaryDirectory() as directory:
+            bulk.save('bulk', directory)
+
+    def test_set_blocks_matches_set_block(self):
+        positions = POSITIONS[::3]
+        bulk = load_template().makeCopy()
+        single = load_template().makeCopy()
+        set_blocks(bulk, positions)
+
+        for position in positions:
+            single.setBlock(position, BARREL_15)
+
+        with tempfile.TemporaryDirectory() as directory:
+            os.makedirs(os.path.join(directory, 'bulk'))
+            os.makedirs(os.path.join(directory, 'single'))
+            bulk.save(os.path.join(directory, 'bulk'), 'rom', mcschematic.Version.JE_1_18_2)
+            single.save(os.path.join(directory, 'single'), 'rom', mcschematic.Version.JE_1_18_2)
+
+            with gzip.open(os.path.join(directory, 'bulk', 'rom.schem')) as bulk_file, \
+                    gzip.open(os.path.join(directory, 'single', 'rom.schem')) as single_file:
+                assert bulk_file.read() == single_file.read()
+
+    def test_set_blocks_public_fallback(self):
+        class Structure:
+            def __init__(self):
+                self.blocks = {}
+
+            def setBlock(self, position, block_data):
+                self.blocks[position] = block_data
+
+        class Schematic:
+            def __init__(self):
+                self.structure = Structure()
+
+            def getStructure(self):
+                return self.structure
+
+        rom = Schematic()
+        set_blocks(rom, POSITIONS[:5])
+
+        assert rom.structure.blocks == dict.fromkeys(POSITIONS[:5], BARREL_15)
+
+    def test_image_too_large(self):
+        with self.assertRaises(Exception):
+            BCPURomBuilder().write_image(bytes(33))
@@ -0,0 +1,99 @@
+import io
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+from asm import assemble, read_file_lines, write_file
+from server import Server, serve_socket, serve_stream, METHOD_NOT_FOUND, INVALID_PARAMS, PARSE_ERROR
+
+
+def call(server, method, params, request_id=1):
+    return server.handle({'jsonrpc': '2.0', 'id': request_id, 'method': method, 'params': params})
+
+
+class Test(TestCase):
+    def test_assemble(self):
+        server = Server()
+        source = '\n'.join(read_file_lines('programmes/multiplication.s'))
+        response = call(server, 'assemble', {'source': source})
+        result = response['result']
+
+        assert response['id'] == 1
+        assert result['machine_code'] == assemble(read_file_lines('programmes/multiplication.s'))
+        assert result['diagnostics'] == []
+        assert len(result['source_map']) == len(result['machine_code'])
+        assert result['source_map'][0]['line'] == 3
+
+    def test_assemble_formats(self):
+        server = Server()
+        result = call(server, 'assemble', {'source': 'LDAC 1\nHALT', 'format': 'hex'})['result']
+
+        assert result['machine_code'] == '31 FF 9E'
+        assert call(server, 'assemble', {'source': 'HALT', 'format': 'srec'})['error']['code'] == INVALID_PARAMS
+
+    def test_assemble_file_reuses_document(self):
+        server = Server(max_documents=1)
+        result = call(server, 'assemble_file', {'path': 'programmes/bubble_sort.s'})['result']
+
+        assert result['machine_code'] == assemble(read_file_lines('programmes/bubble_sort.s'))
+        assert result['source_map'][0]['file'].endswith('bubble_sort.s')
+
+        call(server, 'assemble_file', {'path': 'programmes/bubble_sort.s'})
+        assert list(server.documents.values())[0].reparsed == 0
+
+        call(server, 'assemble', {'source': 'HALT'})
+        assert len(server.documents) == 1
+
+    def test_diagnostics(self):
+        result = call(Server(), 'assemble', {'source': 'BR .missing'})['result']
+
+        assert result['machine_code'] is None
+        assert result['diagnostics'][0]['kind'] == 'SymbolError'
+        assert 'missing' in result['diagnostics'][0]['message']
+
+        result = call(Server(), 'assemble_file', {'path': 'programmes/missing.s'})['result']
+        assert result['diagnostics'][0]['kind'] == 'FileNotFoundError'
+
+    def test_disassemble(self):
+        machine_code = assemble(read_file_lines('programmes/insertion_sort.s'))
+        result = call(Server(), 'disassemble', {'machine_code': machine_code})['result']
+
+        assert assemble(result['source']) == machine_code
+        assert call(Server(), 'disassemble', {'hex': '31 FF 9E'})['result']['source'][-1] == 'HALT'
+
+    def test_errors(self):
+        server = Server()
+
+        assert call(server, 'link', {})['error']['code'] == METHOD_NOT_FOUND
+        assert call(server, 'assemble', {'source': 3})['error']['code'] == INVALID_PARAMS
+        assert call(server, 'disassemble', {'machine_code': [300]})['error']['code'] == INVALID_PARAMS
+        assert json.loads(server.handle_line('{'))['error']['code'] == PARSE_ERROR
+
+        for name in ['../escape', '/tmp/rom', 'a/b', '..', '', 7]:
+            assert call(server, 'schem', {'hex': 'FF 9E', 'name': name})['error']['code'] == INVALID_PARAMS
+        assert server.handle({'jsonrpc': '2.0', 'method': 'assemble', 'params': {'source': 'HALT'}}) is None
+
+    def test_serve_stream(self):
+        requests = [
+            {'jsonrpc': '2.0', 'id': 1, 'method': 'assemble', 'params': {'source': 'HALT'}},
+            {'jsonrpc': '2.0', 'method': 'assemble', 'params': {'source': 'HALT'}},
+            {'jsonrpc': '2.0', 'id': 2, 'method': 'disassemble', 'params': {'machine_code': [255, 158]}},
+        ]
+        output = io.StringIO()
+
+        serve_stream(Server(), io.StringIO(''.join(f'{json.dumps(request)}\n' for request in requests)), output)
+        responses = [json.loads(line) for line in output.getvalue().splitlines()]
+
+        assert [response['id'] for response in responses] == [1, 2]
+        assert responses[0]['result']['machine_code'] == [0xFF, 0x9E]
+
+    def test_serve_socket_keeps_regular_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'bcpu.sock')
+            write_file(path, ['not a socket'])
+
+            with self.assertRaises(FileExistsError):
+                serve_socket(Server(), path)
+
+            assert read_file_lines(path) == ['not a socket']
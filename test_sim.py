@@ -0,0 +1,98 @@
+from unittest import TestCase
+
+from asm import assemble
+from sim import Machine, load_image, SimulationError
+
+
+def run_programme(programme_name):
+    machine = Machine(load_image(f'programmes/{programme_name}.s'))
+    machine.run()
+    return machine
+
+
+class Test(TestCase):
+    def test_multiplication(self):
+        machine = run_programme('multiplication')
+
+        assert machine.halted
+        assert machine.a == 69
+        assert machine.memory[1] == 69
+        assert machine.cycles == 35
+
+    def test_bubble_sort(self):
+        machine = run_programme('bubble_sort')
+
+        assert machine.halted
+        assert list(machine.memory[4:9]) == [2, 3, 3, 4, 5]
+
+    def test_insertion_sort(self):
+        machine = run_programme('insertion_sort')
+
+        assert machine.halted
+        assert list(machine.memory[4:9]) == [1, 2, 3, 4, 5]
+
+    def test_prefix_operand(self):
+        machine = Machine(assemble([
+            'PFIX 0xA',
+            'LDAC 0x5',
+            'HALT',
+        ]))
+
+        machine.run()
+
+        assert machine.a == 0xA5
+
+    def test_indirect_and_arithmetic(self):
+        machine = Machine(assemble([
+            'LDBC .value',
+            'LDAC 3',
+            'STAI 0',
+            'LDBI 0',
+            'LDAC 1',
+            'SUB',
+            'HALT',
+            '.value',
+            'DATA 0',
+        ]))
+
+        machine.run()
+
+        assert machine.memory[8] == 3
+        assert machine.b == 3
+        assert machine.a == 0xFE
+
+    def test_brn_and_ldap(self):
+        machine = Machine(assemble([
+            'LDAC 0',
+            'LDBC 1',
+            'SUB',
+            'BRN .negative',
+            'HALT',
+            '.negative',
+            'LDAP 2',
+            'HALT',
+        ]))
+
+        machine.run()
+
+        assert machine.a == 9
+
+    def test_step(self):
+        machine = Machine(assemble(['LDAC 1', 'HALT']))
+
+        assert machine.step() == 1
+        assert machine.pc == 1
+        assert machine.a == 1
+        assert not machine.halted
+
+    def test_max_cycles(self):
+        machine = Machine(assemble(['.loop', 'LDAC 1', 'BR .loop']))
+
+        machine.run(100)
+
+        assert machine.cycles == 100
+        assert not machine.halted
+
+    def test_image_too_large(self):
+        with self.assertRaises(SimulationError):
+            Machine([0] * 257)
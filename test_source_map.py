@@ -0,0 +1,33 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from asm import assemble_with_source_map
+from source_map import SourceMapEntry, write_source_map, read_source_map
+
+
+class Test(TestCase):
+    def test_assemble_with_source_map(self):
+        machine_code, source_map = assemble_with_source_map([
+            '# comment',
+            '.start',
+            'LDAM 1',
+            '',
+            'BR .start',
+            'HALT',
+        ], 'test.s')
+
+        assert len(source_map) == len(machine_code) == 5
+        assert source_map[0] == SourceMapEntry(0, 'test.s', 3, '.start', False)
+        assert source_map[1] == SourceMapEntry(1, 'test.s', 5, '.start', True)
+        assert source_map[2] == SourceMapEntry(2, 'test.s', 5, '.start', False)
+        assert source_map[3].line == source_map[4].line == 6
+
+    def test_write_read_source_map(self):
+        _, source_map = assemble_with_source_map(['.start', 'LDAM .start'], 'test.s')
+
+        with tempfile.TemporaryDirectory() as directory:
+            filepath = os.path.join(directory, 'test.map.json')
+            write_source_map(filepath, source_map)
+
+            assert read_source_map(filepath) == source_map
@@ -0,0 +1,142 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from asm import assemble, read_file_lines
+from parser import parse_asm_lines
+from sim import Machine
+from superopt import Snippet, Rule, RuleDatabase, SuperoptError, apply_rules, discover, live_inputs, \
+    rules_pipeline, superoptimise, verify
+
+
+def assert_apply(input_lines, expected_lines, rules):
+    actual = parse_asm_lines(input_lines)
+    apply_rules(actual, RuleDatabase(rules))
+
+    assert actual == parse_asm_lines(expected_lines)
+
+
+DOUBLE_DECREMENT = Rule(['LDBC 1', 'SUB', 'LDBC 1', 'SUB'], ['LDBC 2', 'SUB'], 'A')
+SELF_SUBTRACT = Rule(['LDAM $0', 'LDBM $0', 'SUB'], ['LDAC 0'], 'A')
+ADD_ZERO = Rule(['LDBC 0', 'ADD'], [], 'A')
+
+
+class Test(TestCase):
+    def test_snippet_slots(self):
+        snippet = Snippet.from_lines(['LDAM .x', 'LDBM .y', 'ADD', 'STAM .x'])
+
+        assert snippet.slots == ['.x', '.y']
+        assert snippet.to_lines() == ['LDAM $0', 'LDBM $1', 'ADD', 'STAM $0']
+
+    def test_unsupported_snippet(self):
+        with self.assertRaises(SuperoptError):
+            Snippet.from_lines(['BRZ .x'])
+
+    def test_live_inputs(self):
+        assert live_inputs([('LDBC', 1), ('SUB', None), ('STAM', 0), ('LDAM', 0)]) == ['A']
+        assert live_inputs([('LDAM', 0), ('LDBM', 1), ('ADD', None)]) == ['$0', '$1']
+
+    def test_discover_folds_constants(self):
+        assert discover(['LDBC 1', 'SUB', 'LDBC 1', 'SUB'], 'A') == DOUBLE_DECREMENT
+        assert discover(['LDAC 3', 'LDBC 4', 'ADD'], 'A').replacement == ['LDAC 7']
+
+    def test_discover_respects_live_registers(self):
+        assert discover(['LDAM .x', 'LDBM .x', 'SUB'], 'A') == SELF_SUBTRACT
+        assert discover(['LDAM .x', 'LDBM .x', 'SUB'], 'AB').replacement == ['LDAC 0', 'LDBM $0']
+
+    def test_nothing_shorter(self):
+        assert discover(['LDAM .x', 'LDBC 1', 'ADD', 'STAM .x']) is None
+
+    def test_verify_rejects_random_agreement(self):
+        target = [('LDBC', 0), ('SUB', None)]
+
+        assert verify(target, [], 0, 'A')
+        assert not verify(target, [], 0, 'AB')
+        assert not verify([('LDBC', 1), ('ADD', None)], [('LDBC', 1), ('SUB', None)], 0, 'A')
+
+    def test_superoptimise_empty_replacement(self):
+        assert superoptimise(Snippet.from_lines(['LDBC 1', 'ADD', 'LDBC 1', 'SUB']), 'A') == []
+
+    def test_database_round_trip(self):
+        database = RuleDatabase()
+
+        assert database.add(DOUBLE_DECREMENT)
+        assert not database.add(Rule(DOUBLE_DECREMENT.pattern, [], 'A'))
+
+        with tempfile.TemporaryDirectory() as directory:
+            filepath = os.path.join(directory, 'rules.json')
+            database.save(filepath)
+
+            assert RuleDatabase.load(filepath).rules == [DOUBLE_DECREMENT]
+
+    def test_apply_when_b_dead(self):
+        assert_apply(
+            ['LDAM .x', 'LDBC 1', 'SUB', 'LDBC 1', 'SUB', 'LDBC 3', 'ADD', 'HALT', '.x', 'DATA 9'],
+            ['LDAM .x', 'LDBC 2', 'SUB', 'LDBC 3', 'ADD', 'HALT', '.x', 'DATA 9'],
+            [DOUBLE_DECREMENT],
+        )
+
+    def test_apply_keeps_live_b(self):
+        input_lines = ['LDAM .x', 'LDBC 1', 'SUB', 'LDBC 1', 'SUB', 'STAM .x', 'BRB 0', '.x', 'DATA 9']
+
+        assert_apply(input_lines, input_lines, [DOUBLE_DECREMENT])
+
+    def test_apply_binds_slots(self):
+        assert_apply(
+            ['LDAM .x', 'LDBM .x', 'SUB', 'LDBC 0', 'STAM .y', 'HALT', '.x', 'DATA 9', '.y', 'DATA 0'],
+            ['LDAC 0', 'LDBC 0', 'STAM .y', 'HALT', '.x', 'DATA 9', '.y', 'DATA 0'],
+            [SELF_SUBTRACT],
+        )
+
+        input_lines = ['LDAM .x', 'LDBM .y', 'SUB', 'LDBC 0', 'HALT', '.x', 'DATA 9', '.y', 'DATA 0']
+        assert_apply(input_lines, input_lines, [SELF_SUBTRACT])
+
+    def test_apply_moves_label(self):
+        assert_apply(
+            ['LDAM .x', '.skip', 'LDBC 0', 'ADD', 'LDBC 1', 'STAM .x', 'BR .skip', '.x', 'DATA 9'],
+            ['LDAM .x', '.skip', 'LDBC 1', 'STAM .x', 'BR .skip', '.x', 'DATA 9'],
+            [ADD_ZERO],
+        )
+
+    def test_apply_skips_inner_label(self):
+        input_lines = ['LDBC 0', '.inner', 'ADD', 'LDBC 1', 'BR .inner']
+
+        assert_apply(input_lines, input_lines, [ADD_ZERO])
+
+    def test_pipeline_preserves_behaviour(self):
+        asm_code = [
+            '.loop',
+            'LDAM .a',
+            'LDBC 1',
+            'SUB',
+            'LDBC 1',
+            'SUB',
+            'STAM .a',
+            'LDBC 0',
+            'ADD',
+            'BRZ .end',
+            'BR .loop',
+            '.end',
+            'HALT',
+            '.a',
+            'DATA 8',
+        ]
+        database = RuleDatabase([DOUBLE_DECREMENT, ADD_ZERO])
+        original_code = assemble(asm_code)
+        optimised_code = assemble(asm_code, rules_pipeline(database))
+        original = Machine(original_code)
+        optimised = Machine(optimised_code)
+
+        original.run()
+        optimised.run()
+
+        assert len(optimised_code) == len(original_code) - 2
+        assert optimised.halted
+        assert optimised.memory[len(optimised_code) - 1] == original.memory[len(original_code) - 1] == 0
+        assert optimised.cycles < original.cycles
+
+    def test_programmes_unchanged(self):
+        for programme_name in ['bubble_sort', 'insertion_sort', 'multiplication']:
+            asm_code = read_file_lines(f'programmes/{programme_name}.s')
+
+            assert assemble(asm_code, rules_pipeline()) == assemble(asm_code)
@@ -0,0 +1,67 @@
+from unittest import TestCase
+
+from asm import assemble
+from parser import parse_asm_lines
+from symbol_table import SymbolTable, SymbolError
+
+
+class Test(TestCase):
+    def test_from_asm_lines(self):
+        asm_lines = parse_asm_lines([
+            '.start',
+            'LDAM .end',
+            'DATA 0',
+            '.end',
+            'DATA 1',
+        ])
+
+        symbol_table = SymbolTable.from_asm_lines(asm_lines)
+
+        assert symbol_table.index_of('.start') == 0
+        assert symbol_table.index_of('.end') == 2
+        assert len(symbol_table) == 2
+
+    def test_duplicate_labels(self):
+        asm_lines = parse_asm_lines([
+            '.start',
+            'DATA 0',
+            '.start',
+            'DATA 1',
+        ])
+
+        with self.assertRaises(SymbolError):
+            SymbolTable.from_asm_lines(asm_lines)
+
+    def test_undefined_label(self):
+        symbol_table = SymbolTable()
+
+        with self.assertRaises(SymbolError):
+            symbol_table.index_of('.missing')
+
+    def test_check_references(self):
+        asm_lines = parse_asm_lines([
+            'LDAM .missing',
+            'BR .start',
+        ])
+        symbol_table = SymbolTable.from_asm_lines(asm_lines)
+
+        with self.assertRaisesRegex(SymbolError, r'\.missing at line 1, \.start at line 2'):
+            symbol_table.check_references(asm_lines)
+
+    def test_remap(self):
+        asm_lines = parse_asm_lines([
+            '.start',
+            'DATA 0',
+            '.end',
+            'DATA 1',
+        ])
+        symbol_table = SymbolTable.from_asm_lines(asm_lines)
+
+        symbol_table.remap([0, 2])
+
+        assert symbol_table.index_of('.start') == 0
+        assert symbol_table.index_of('.end') == 2
+
+    def test_assemble_undefined_label(self):
+        with self.assertRaises(SymbolError):
+            assemble(['BR .nowhere'])
@@ -0,0 +1,54 @@
+from unittest import TestCase
+
+from asm import assemble
+from sim import load_image, Machine
+from timing import TimingModel, analyse, countdown_trip_count
+
+
+class Test(TestCase):
+    def test_instruction_classes(self):
+        model = TimingModel(alu=1, constant=2, memory=3, branch=4, taken_branch=5, pfix=10)
+        machine_code = assemble([
+            'ADD',
+            'LDAC 1',
+            'LDAM 2',
+            'BRZ .end',
+            '.end',
+            'HALT',
+        ])
+
+        result = analyse(machine_code, model)
+
+        assert [block.ticks for block in result.blocks] == [1 + 2 + 3 + 4, 10 + 4]
+        assert result.blocks[0].taken_ticks == 5
+
+    def test_model_from_dict(self):
+        model = TimingModel.from_dict({'memory': 12, 'pfix': 1})
+
+        assert model.memory == 12
+        assert TimingModel.from_dict(model.to_dict()).to_dict() == model.to_dict()
+
+    def test_countdown_trip_count(self):
+        assert countdown_trip_count(3, 1) == 3
+        assert countdown_trip_count(0, 1) == 256
+        assert countdown_trip_count(6, 2) == 3
+        assert countdown_trip_count(3, 2) is None
+        assert countdown_trip_count(1, 0) is None
+
+    def test_multiplication_bounded(self):
+        model = TimingModel(alu=1, constant=1, memory=1, branch=1, taken_branch=0, pfix=1)
+        machine_code = load_image('programmes/multiplication.s')
+        machine = Machine(machine_code)
+        machine.run()
+
+        result = analyse(machine_code, model)
+
+        assert list(result.trip_counts.values()) == [3]
+        assert result.worst_case_ticks() >= machine.cycles
+
+    def test_nested_loops_unbounded(self):
+        result = analyse(load_image('programmes/bubble_sort.s'), default_trip_count=4)
+
+        assert result.worst_case_ticks() is None
+        assert result.estimated_ticks() > 0
+        assert 'worst case: unbounded' in result.report()
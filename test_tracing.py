@@ -0,0 +1,86 @@
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+from asm import assemble, read_file_lines
+from tracing import TRACER, NULL_SPAN, span, count
+
+
+class Test(TestCase):
+    def setUp(self):
+        TRACER.clear()
+        TRACER.enable()
+
+    def tearDown(self):
+        TRACER.disable()
+        TRACER.clear()
+
+    def test_disabled(self):
+        TRACER.disable()
+
+        assert span('parse_asm_lines') is NULL_SPAN
+        with span('parse_asm_lines'):
+            count('lines', 3)
+        assemble(read_file_lines('programmes/bubble_sort.s'))
+
+        assert TRACER.events == []
+        assert TRACER.counters == {}
+
+    def test_span(self):
+        with span('outer', 'test', {'size': 1}):
+            with span('inner', 'test'):
+                pass
+
+        inner, outer = TRACER.events
+        assert (inner['name'], outer['name']) == ('inner', 'outer')
+        assert outer['args'] == {'size': 1}
+        assert outer['start'] <= inner['start']
+        assert outer['duration'] >= inner['duration']
+
+    def test_assemble(self):
+        assemble(read_file_lines('programmes/bubble_sort.s'))
+        spans = {event['name'] for event in TRACER.events if event['type'] == 'span'}
+
+        assert {'parse_asm_lines', 'relax_prefixes', 'fill_addresses', 'asm_lines_to_machine_code'} <= spans
+        assert TRACER.counters['lines'] > 0
+        assert 0 < TRACER.counters['labels'] <= TRACER.counters['lines']
+        assert 'pfix_inserted' in TRACER.counters
+
+    def test_rom_builder(self):
+        from schem import BCPURomBuilder
+
+        for _ in range(2):
+            BCPURomBuilder().write_byte(0x0F, 3)
+
+        names = [event['name'] for event in TRACER.events if event['type'] == 'span']
+
+        assert names.count('clone_template') == 2
+        assert names.count('write_byte') == 2
+        assert TRACER.counters['blocks_set'] == 8
+
+    def test_counter(self):
+        count('blocks_set', 2)
+        count('blocks_set', 3)
+
+        assert TRACER.counters == {'blocks_set': 5}
+        assert [event['value'] for event in TRACER.events] == [2, 5]
+
+    def test_write(self):
+        with span('outer'):
+            count('lines', 4)
+
+        with tempfile.TemporaryDirectory() as directory:
+            chrome_path = os.path.join(directory, 'trace.json')
+            lines_path = os.path.join(directory, 'trace.jsonl')
+            TRACER.write(chrome_path)
+            TRACER.write(lines_path)
+
+            with open(chrome_path) as file:
+                trace_events = json.load(file)['traceEvents']
+            with open(lines_path) as file:
+                events = [json.loads(line) for line in file]
+
+        assert [event['ph'] for event in trace_events] == ['C', 'X']
+        assert trace_events[0]['args'] == {'lines': 4}
+        assert events == TRACER.events
@@ -0,0 +1,89 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from asm import assemble, read_file_lines, write_file
+from parser import ParseError
+from util import parse_hex
+from watch import IncrementalAssembler, link_lines, parse_line, watch
+
+
+class Test(TestCase):
+    def test_parse_line(self):
+        assert parse_line('') is None
+        assert parse_line('# comment') is None
+        assert parse_line('.loop') == '.loop'
+        assert [repr(asm_line) for asm_line in parse_line('HALT')] == ['PFIX 15', 'BR 14']
+
+    def test_link_lines(self):
+        asm_lines = link_lines([parse_line(line) for line in ['.start', '', 'LDAC 1', 'BR .start']])
+
+        assert [repr(asm_line) for asm_line in asm_lines] == ['.start LDAC 1', 'BR .start']
+        assert [asm_line.source_line for asm_line in asm_lines] == [3, 4]
+
+    def test_update_matches_assemble(self):
+        assembler = IncrementalAssembler()
+
+        for programme_name in ['multiplication', 'bubble_sort', 'insertion_sort']:
+            asm_code = read_file_lines(f'programmes/{programme_name}.s')
+
+            assert assembler.update(asm_code) == bytes(assemble(asm_code))
+
+    def test_update_reparses_changed_lines(self):
+        asm_code = read_file_lines('programmes/multiplication.s')
+        assembler = IncrementalAssembler()
+        assembler.update(asm_code)
+
+        edited = list(asm_code)
+        edited[edited.index('DATA 3')] = 'DATA 4'
+        edited.insert(edited.index('.end'), 'LDAC 0')
+
+        assert assembler.update(edited) == bytes(assemble(edited))
+        assert assembler.reparsed == 2
+
+        assert assembler.update(asm_code) == bytes(assemble(asm_code))
+        assert assembler.reparsed == 0
+
+    def test_update_error_keeps_state(self):
+        assembler = IncrementalAssembler()
+        image = assembler.update(['LDAC 1', 'HALT'])
+
+        with self.assertRaises(ParseError):
+            assembler.update(['LDAC 1', 'JUMP', 'HALT'])
+
+        assert assembler.image == image
+        assert assembler.update(['LDAC 2', 'HALT']) == bytes(assemble(['LDAC 2', 'HALT']))
+
+    def test_watch_writes_output(self):
+        with tempfile.TemporaryDirectory() as directory:
+            source = os.path.join(directory, 'programme.s')
+            output = os.path.join(directory, 'out.txt')
+            write_file(source, ['LDAC 1', 'HALT'])
+
+            assembler = watch(source, output, interval=0, iterations=1)
+
+            with open(output) as file:
+                assert parse_hex(file.read()) == assemble(['LDAC 1', 'HALT'])
+
+            write_file(source, ['LDAC 2', 'HALT'])
+            os.utime(source, ns=(0, 1))
+            watch(source, output, interval=0, iterations=1, assembler=assembler)
+
+            with open(output) as file:
+                assert parse_hex(file.read()) == assemble(['LDAC 2', 'HALT'])
+
+    def test_watch_survives_missing_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            source = os.path.join(directory, 'programme.s')
+            output = os.path.join(directory, 'out.txt')
+
+            assembler = watch(source, output, interval=0, iterations=2)
+
+            assert assembler.image is None
+            assert not os.path.exists(output)
+
+            write_file(source, ['LDAC 3', 'HALT'])
+            watch(source, output, interval=0, iterations=1, assembler=assembler)
+
+            with open(output) as file:
+                assert parse_hex(file.read()) == assemble(['LDAC 3', 'HALT'])
@@ -0,0 +1,249 @@
+import argparse
+import json
+import sys
+from typing import List, Dict, Optional, Any
+
+import instructions
+from asm import write_lines
+from cfg import Instruction, BasicBlock, Loop, build_cfg, find_loops
+from sim import load_image
+
+GAME_TICKS_PER_SECOND = 20
+DEFAULT_TRIP_COUNT = 16
+
+COUNTDOWN = ('LDAM', 'LDBC', 'SUB', 'STAM', 'BRZ')
+
+
+class TimingModel:
+    alu: int
+    constant: int
+    memory: int
+    branch: int
+    taken_branch: int
+    pfix: int
+
+    def __init__(self, alu: int = 4, constant: int = 4, memory: int = 8, branch: int = 4, taken_branch: int = 2,
+                 pfix: int = 4):
+        self.alu = alu
+        self.constant = constant
+        self.memory = memory
+        self.branch = branch
+        self.taken_branch = taken_branch
+        self.pfix = pfix
+
+    @classmethod
+    def from_dict(cls, values: Dict[str, int]) -> 'TimingModel':
+        return cls(**values)
+
+    @classmethod
+    def from_file(cls, filepath: str) -> 'TimingModel':
+        with open(filepath) as model_file:
+            return cls.from_dict(json.load(model_file))
+
+    def to_dict(self) -> Dict[str, int]:
+        return {
+            'alu': self.alu,
+            'constant': self.constant,
+            'memory': self.memory,
+            'branch': self.branch,
+            'taken_branch': self.taken_branch,
+            'pfix': self.pfix,
+        }
+
+    def instruction_ticks(self, instruction: Instruction) -> int:
+        flags = instruction.flags
+
+        if flags & instructions.PREFIX:
+            return instruction.size * self.pfix
+
+        if flags & instructions.MEMORY:
+            ticks = self.memory
+        elif flags & instructions.BRANCH:
+            ticks = self.branch
+        elif flags & instructions.ABSOLUTE:
+            ticks = self.constant
+        else:
+            ticks = self.alu
+
+        return ticks + (instruction.size - 1) * self.pfix
+
+    def block_ticks(self, block: BasicBlock) -> int:
+        return sum(self.instruction_ticks(instruction) for instruction in block.instructions)
+
+
+class BlockTiming:
+    start: int
+    ticks: int
+    taken_ticks: int
+    estimated_count: int
+    worst_count: Optional[int]
+
+    def __init__(self, start: int, ticks: int, taken_ticks: int, estimated_count: int, worst_count: Optional[int]):
+        self.start = start
+        self.ticks = ticks
+        self.taken_ticks = taken_ticks
+        self.estimated_count = estimated_count
+        self.worst_count = worst_count
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'start': self.start,
+            'ticks': self.ticks,
+            'taken_ticks': self.taken_ticks,
+            'estimated_count': self.estimated_count,
+            'worst_count': self.worst_count,
+        }
+
+
+class TimingReport:
+    blocks: List[BlockTiming]
+    loops: List[Loop]
+    trip_counts: Dict[int, Optional[int]]
+
+    def __init__(self, blocks: List[BlockTiming], loops: List[Loop], trip_counts: Dict[int, Optional[int]]):
+        self.blocks = blocks
+        self.loops = loops
+        self.trip_counts = trip_counts
+
+    def estimated_ticks(self) -> int:
+        return sum(block.estimated_count * (block.ticks + block.taken_ticks // 2) for block in self.blocks)
+
+    def worst_case_ticks(self) -> Optional[int]:
+        total = 0
+
+        for block in self.blocks:
+            if block.worst_count is None:
+                return None
+            total += block.worst_count * (block.ticks + block.taken_ticks)
+
+        return total
+
+    def report(self) -> List[str]:
+        result = [f'{"block":>5} {"ticks":>6} {"taken":>6} {"est":>6} {"worst":>6}']
+
+        for block in self.blocks:
+            worst = '?' if block.worst_count is None else block.worst_count
+            result.append(f'{block.start:>5X} {block.ticks:>6} {block.taken_ticks:>6} {block.estimated_count:>6} {worst:>6}')
+
+        result.append('')
+
+        for loop in self.loops:
+            trip_count = self.trip_counts[loop.header]
+            bound = 'unbounded' if trip_count is None else f'{trip_count} iterations'
+            result.append(f'loop {loop.header:02X}: {len(loop.body)} blocks, {bound}')
+
+        estimated = self.estimated_ticks()
+        worst_case = self.worst_case_ticks()
+        result.append(f'estimated: {estimated} game ticks ({estimated / GAME_TICKS_PER_SECOND:.1f} s)')
+
+        if worst_case is None:
+            result.append('worst case: unbounded')
+        else:
+            result.append(f'worst case: {worst_case} game ticks ({worst_case / GAME_TICKS_PER_SECOND:.1f} s)')
+
+        return result
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'blocks': [block.to_dict() for block in self.blocks],
+            'loops': [
+                {'header': loop.header, 'body': sorted(loop.body), 'trip_count': self.trip_counts[loop.header]}
+                for loop in self.loops
+            ],
+            'estimated_ticks': self.estimated_ticks(),
+            'worst_case_ticks': self.worst_case_ticks(),
+        }
+
+
+def stored_addresses(blocks: Dict[int, BasicBlock]) -> Optional[List[int]]:
+    result = []
+
+    for block in blocks.values():
+        for instruction in block.instructions:
+            if instruction.mnemonic == 'STAI':
+                return None
+            if instruction.mnemonic == 'STAM':
+                result.append(instruction.operand)
+
+    return result
+
+
+def countdown_trip_count(value: int, step: int) -> Optional[int]:
+    for count in range(1, 257):
+        if (value - count * step) & 0xFF == 0:
+            return count
+    return None
+
+
+def find_trip_count(loop: Loop, loops: List[Loop], blocks: Dict[int, BasicBlock],
+                    machine_code: List[int]) -> Optional[int]:
+    if any(other is not loop and loop.header in other.body for other in loops):
+        return None
+
+    stores = stored_addresses(blocks)
+
+    if stores is None:
+        return None
+
+    for start in loop.body:
+        block = blocks[start]
+        window = block.instructions[-len(COUNTDOWN):]
+
+        if tuple(instruction.mnemonic for instruction in window) != COUNTDOWN:
+            continue
+
+        load, step, _, store, exit_branch = window
+
+        if load.operand != store.operand or stores.count(store.operand) != 1 or exit_branch.target() in loop.body:
+            continue
+
+        value = machine_code[load.operand] if load.operand < len(machine_code) else 0
+        return countdown_trip_count(value, step.operand)
+
+    return None
+
+
+def analyse(machine_code: List[int], model: Optional[TimingModel] = None,
+            default_trip_count: int = DEFAULT_TRIP_COUNT) -> TimingReport:
+    if model is None:
+        model = TimingModel()
+
+    blocks = build_cfg(machine_code)
+    loops = find_loops(blocks)
+    trip_counts = {loop.header: find_trip_count(loop, loops, blocks, machine_code) for loop in loops}
+    result = []
+
+    for start in sorted(blocks):
+        block = blocks[start]
+        taken_ticks = model.taken_branch if block.taken is not None else 0
+        estimated_count = 1
+        worst_count = 1
+
+        for loop in loops:
+            if start not in loop.body:
+                continue
+            trip_count = trip_counts[loop.header]
+            estimated_count *= default_trip_count if trip_count is None else trip_count
+            worst_count = None if trip_count is None or worst_count is None else worst_count * trip_count
+
+        result.append(BlockTiming(start, model.block_ticks(block), taken_ticks, estimated_count, worst_count))
+
+    return TimingReport(result, loops, trip_counts)
+
+
+if __name__ == '__main__':
+    argument_parser = argparse.ArgumentParser(description='Estimate the in-game run time of a BCPU programme.')
+    argument_parser.add_argument('source')
+    argument_parser.add_argument('--model', help='JSON file of tick costs per instruction class')
+    argument_parser.add_argument('--trip-count', type=int, default=DEFAULT_TRIP_COUNT,
+                                 help='iterations assumed for loops whose bound is unknown')
+    argument_parser.add_argument('--json', help='write the machine-readable estimate to this file')
+    arguments = argument_parser.parse_args()
+
+    model = None if arguments.model is None else TimingModel.from_file(arguments.model)
+    timing = analyse(load_image(arguments.source), model, arguments.trip_count)
+    write_lines(sys.stdout, timing.report())
+
+    if arguments.json is not None:
+        with open(arguments.json, 'w') as json_file:
+            json.dump(timing.to_dict(), json_file, indent=1)
@@ -0,0 +1,145 @@
+import atexit
+import json
+import os
+import threading
+import time
+from typing import List, Dict, Any, Optional
+
+TRACE_ENVIRONMENT = 'BCPU_TRACE'
+
+
+class Tracer:
+    enabled: bool
+    events: List[Dict[str, Any]]
+    counters: Dict[str, int]
+    origin: float
+
+    def __init__(self):
+        self.enabled = False
+        self.events = []
+        self.counters = {}
+        self.origin = time.perf_counter()
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def clear(self) -> None:
+        self.events = []
+        self.counters = {}
+        self.origin = time.perf_counter()
+
+    def take_events(self) -> List[Dict[str, Any]]:
+        events = self.events
+        self.events = []
+        return events
+
+    def merge(self, events: List[Dict[str, Any]]) -> None:
+        self.events.extend(events)
+
+    def timestamp(self, moment: float) -> float:
+        return (moment - self.origin) * 1_000_000
+
+    def add_span(self, name: str, category: str, start: float, end: float, args: Dict[str, Any]) -> None:
+        self.events.append({
+            'type': 'span',
+            'name': name,
+            'category': category,
+            'start': self.timestamp(start),
+            'duration': (end - start) * 1_000_000,
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+            'args': args,
+        })
+
+    def add_count(self, name: str, value: int) -> None:
+        self.counters[name] = self.counters.get(name, 0) + value
+        self.events.append({
+            'type': 'counter',
+            'name': name,
+            'start': self.timestamp(time.perf_counter()),
+            'pid': os.getpid(),
+            'value': self.counters[name],
+        })
+
+    def iter_json_lines(self):
+        for event in self.events:
+            yield json.dumps(event)
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        trace_events = []
+
+        for event in self.events:
+            if event['type'] == 'span':
+                trace_events.append({
+                    'name': event['name'], 'cat': event['category'], 'ph': 'X', 'ts': event['start'],
+                    'dur': event['duration'], 'pid': event['pid'], 'tid': event['tid'], 'args': event['args'],
+                })
+            else:
+                trace_events.append({
+                    'name': event['name'], 'ph': 'C', 'ts': event['start'], 'pid': event['pid'],
+                    'args': {event['name']: event['value']},
+                })
+
+        return {'traceEvents': trace_events, 'displayTimeUnit': 'ms'}
+
+    def write(self, filepath: str) -> None:
+        with open(filepath, 'w') as file:
+            if filepath.endswith('.jsonl'):
+                for line in self.iter_json_lines():
+                    file.write(f'{line}\n')
+            else:
+                json.dump(self.chrome_trace(), file)
+
+
+class Span:
+    __slots__ = ('name', 'category', 'args', 'start')
+
+    def __init__(self, name: str, category: str, args: Dict[str, Any]):
+        self.name = name
+        self.category = category
+        self.args = args
+        self.start = 0.0
+
+    def __enter__(self) -> 'Span':
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exception) -> None:
+        TRACER.add_span(self.name, self.category, self.start, time.perf_counter(), self.args)
+
+
+class NullSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> 'NullSpan':
+        return self
+
+    def __exit__(self, *exception) -> None:
+        pass
+
+
+TRACER = Tracer()
+NULL_SPAN = NullSpan()
+
+
+def span(name: str, category: str = 'bcpu', args: Optional[Dict[str, Any]] = None):
+    if not TRACER.enabled:
+        return NULL_SPAN
+    return Span(name, category, {} if args is None else args)
+
+
+def count(name: str, value: int = 1) -> None:
+    if TRACER.enabled:
+        TRACER.add_count(name, value)
+
+
+def trace_to(filepath: str) -> None:
+    TRACER.enable()
+    atexit.register(TRACER.write, filepath.replace('{pid}', str(os.getpid())))
+
+
+if os.environ.get(TRACE_ENVIRONMENT):
+    trace_to(os.environ[TRACE_ENVIRONMENT])
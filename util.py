@@ -23,3 +23,40 @@ def split_list(list_to_split: List[Any], group_size: int) -> List[Any]:
 
 def is_bit_set(byte: int, bit_address: int) -> bool:
     return (byte >> bit_address) % 2 == 1
+
+
+def parse_hex(text: str) -> List[int]:
+    return [int(byte, 16) for byte in text.split()]
+
+
+def parse_intel_hex(text: str) -> List[int]:
+    result = []
+
+    for line in text.split():
+        if not line.startswith(':'):
+            raise ValueError(f'Intel HEX record {line} does not start with a colon.')
+
+        fields = bytes.fromhex(line[1:])
+
+        if len(fields) < 5 or len(fields) != fields[0] + 5:
+            raise ValueError(f'Intel HEX record {line} has the wrong length.')
+
+        if sum(fields) & 0xFF != 0:
+            raise ValueError(f'Intel HEX record {line} has a bad checksum.')
+
+        address = (fields[1] << 8) | fields[2]
+        record_type = fields[3]
+        data = fields[4:-1]
+
+        if record_type == 0x01:
+            break
+
+        if record_type != 0x00:
+            continue
+
+        if len(result) < address + len(data):
+            result.extend([0] * (address + len(data) - len(result)))
+
+        result[address:address + len(data)] = data
+
+    return result
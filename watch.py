@@ -0,0 +1,161 @@
+import argparse
+import copy
+import difflib
+import os
+import sys
+import time
+from typing import List, Dict, Optional, Callable, Union
+
+from asm import default_pipeline, read_file_lines, write_output, write_lines, AssemblyError, OUTPUT_FORMATS
+from asm_line import AsmLine, asm_lines_to_machine_code
+from cache import BuildCache, cached_schem
+from parser import iter_numbered_asm_lines, is_label, ParseError
+from passes import PassManager, Program
+from symbol_table import SymbolError
+
+DEFAULT_INTERVAL = 0.2
+
+ParsedLine = Union[str, List[AsmLine], None]
+
+
+def parse_line(line: str) -> ParsedLine:
+    if line == '' or line.startswith('#'):
+        return None
+    if is_label(line):
+        return sys.intern(line)
+    return list(iter_numbered_asm_lines([(0, line)]))
+
+
+def copy_asm_line(asm_line: AsmLine) -> AsmLine:
+    result = copy.copy(asm_line)
+    result.argument = copy.copy(asm_line.argument)
+    return result
+
+
+def link_lines(parsed_lines: List[ParsedLine]) -> List[AsmLine]:
+    result = []
+    label = None
+
+    for line_number, parsed in enumerate(parsed_lines, 1):
+        if parsed is None:
+            continue
+
+        if isinstance(parsed, str):
+            label = parsed
+            continue
+
+        for i, template in enumerate(parsed):
+            asm_line = copy_asm_line(template)
+            asm_line.source_line = line_number
+            if i == 0 and label is not None:
+                asm_line.label = label
+            result.append(asm_line)
+
+        label = None
+
+    return result
+
+
+class IncrementalAssembler:
+    source: List[str]
+    parsed_lines: List[ParsedLine]
+    memo: Dict[str, ParsedLine]
+    asm_lines: List[AsmLine]
+    image: Optional[bytes]
+    reparsed: int
+    pipeline_factory: Callable[[], PassManager]
+
+    def __init__(self, pipeline_factory: Callable[[], PassManager] = default_pipeline):
+        self.source = []
+        self.parsed_lines = []
+        self.memo = {}
+        self.asm_lines = []
+        self.image = None
+        self.reparsed = 0
+        self.pipeline_factory = pipeline_factory
+
+    def parse(self, line: str) -> ParsedLine:
+        if line not in self.memo:
+            self.memo[line] = parse_line(line)
+            self.reparsed += 1
+        return self.memo[line]
+
+    def update(self, source: List[str]) -> bytes:
+        matcher = difflib.SequenceMatcher(None, self.source, source, autojunk=False)
+        parsed_lines = []
+        self.reparsed = 0
+
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == 'equal':
+                parsed_lines += self.parsed_lines[i1:i2]
+            else:
+                parsed_lines += [self.parse(line) for line in source[j1:j2]]
+
+        program = Program(link_lines(parsed_lines))
+        self.pipeline_factory().run(program)
+
+        self.source = list(source)
+        self.parsed_lines = parsed_lines
+        self.asm_lines = program.asm_lines
+        self.image = bytes(asm_lines_to_machine_code(program.asm_lines))
+        return self.image
+
+
+def watch(filepath: str, output: str, output_format: str = 'hex', schem: Optional[str] = None,
+          interval: float = DEFAULT_INTERVAL, iterations: Optional[int] = None,
+          assembler: Optional[IncrementalAssembler] = None) -> IncrementalAssembler:
+    if assembler is None:
+        assembler = IncrementalAssembler()
+
+    build_cache = BuildCache() if schem is not None else None
+    modified = None
+    count = 0
+
+    while iterations is None or count < iterations:
+        count += 1
+
+        try:
+            current = os.stat(filepath).st_mtime_ns
+        except OSError:
+            current = None
+
+        if current is not None and current != modified:
+            modified = current
+            previous = assembler.image
+            start = time.perf_counter()
+
+            try:
+                image = assembler.update(read_file_lines(filepath))
+            except OSError:
+                modified = None
+            except (ParseError, AssemblyError, SymbolError, ValueError) as error:
+                write_lines(sys.stderr, [f'{filepath}: {error}'])
+            else:
+                if image != previous:
+                    write_output(output, image, output_format)
+                    if schem is not None:
+                        cached_schem(image, schem, build_cache)
+
+                milliseconds = (time.perf_counter() - start) * 1000
+                write_lines(sys.stderr, [f'{filepath}: {len(image)} bytes, {assembler.reparsed} lines parsed, '
+                                         f'{milliseconds:.1f} ms'])
+
+        if iterations is None or count < iterations:
+            time.sleep(interval)
+
+    return assembler
+
+
+if __name__ == '__main__':
+    argument_parser = argparse.ArgumentParser(description='Reassemble a BCPU programme whenever it is saved.')
+    argument_parser.add_argument('source')
+    argument_parser.add_argument('output', nargs='?', default='out.txt')
+    argument_parser.add_argument('-f', '--format', choices=OUTPUT_FORMATS, default='hex')
+    argument_parser.add_argument('--schem', help='also rebuild the ROM schematic under this name')
+    argument_parser.add_argument('--interval', type=float, default=DEFAULT_INTERVAL, help='seconds between checks')
+    arguments = argument_parser.parse_args()
+
+    try:
+        watch(arguments.source, arguments.output, arguments.format, arguments.schem, arguments.interval)
+    except KeyboardInterrupt:
+        pass